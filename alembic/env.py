@@ -21,6 +21,8 @@ from app.models.shared.notification import (  # noqa: F401
     NotificationTemplate,
     UserNotificationPreference,
     DeviceToken,
+    NotificationDigestItem,
+    NotificationIdempotencyKey,
 )
 
 # TODO: Import all models here as they are implemented to ensure they are registered with SQLAlchemy
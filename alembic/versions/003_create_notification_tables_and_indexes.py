@@ -0,0 +1,154 @@
+"""create notification tables and hot-path indexes
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+
+def _timestamps():
+    return [
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), onupdate=sa.func.now()),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notification_templates",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("category", sa.String(length=50), nullable=False),
+        sa.Column("notification_type", sa.String(length=20), nullable=False),
+        sa.Column("subject_template", sa.String(length=200), nullable=True),
+        sa.Column("body_template", sa.Text, nullable=False),
+        sa.Column("variables", sa.JSON, nullable=True),
+        sa.Column("is_active", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        *_timestamps(),
+    )
+    op.create_index("ix_notification_templates_name", "notification_templates", ["name"], unique=True)
+
+    op.create_table(
+        "notifications",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("template_id", sa.Integer(), sa.ForeignKey("notification_templates.id"), nullable=True),
+        sa.Column("notification_type", sa.String(length=20), nullable=False),
+        sa.Column("category", sa.String(length=50), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default="pending"),
+        sa.Column("title", sa.String(length=200), nullable=False),
+        sa.Column("message", sa.Text, nullable=False),
+        sa.Column("data", sa.JSON, nullable=True),
+        sa.Column("recipient", sa.String(length=255), nullable=False),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+        sa.Column("delivered_at", sa.DateTime(), nullable=True),
+        sa.Column("read_at", sa.DateTime(), nullable=True),
+        sa.Column("error_message", sa.Text, nullable=True),
+        sa.Column("retry_count", sa.Integer(), nullable=False, server_default="0"),
+        *_timestamps(),
+    )
+    # Leading user_id also serves plain per-user lookups
+    op.create_index(
+        "ix_notifications_user_id_status_created_at",
+        "notifications",
+        ["user_id", "status", "created_at"],
+    )
+
+    op.create_table(
+        "user_notification_preferences",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("email_enabled", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("email_orders", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("email_products", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("email_account", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("email_marketing", sa.Boolean, nullable=False, server_default=sa.text("false")),
+        sa.Column("email_system", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("push_enabled", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("push_orders", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("push_products", sa.Boolean, nullable=False, server_default=sa.text("false")),
+        sa.Column("push_account", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("push_marketing", sa.Boolean, nullable=False, server_default=sa.text("false")),
+        sa.Column("push_system", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("in_app_enabled", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("in_app_orders", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("in_app_products", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("in_app_account", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("in_app_marketing", sa.Boolean, nullable=False, server_default=sa.text("false")),
+        sa.Column("in_app_system", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        sa.Column("quiet_hours_enabled", sa.Boolean, nullable=False, server_default=sa.text("false")),
+        sa.Column("quiet_hours_start", sa.String(length=5), nullable=True),
+        sa.Column("quiet_hours_end", sa.String(length=5), nullable=True),
+        *_timestamps(),
+    )
+    op.create_index(
+        "ix_user_notification_preferences_user_id",
+        "user_notification_preferences",
+        ["user_id"],
+        unique=True,
+    )
+
+    op.create_table(
+        "device_tokens",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("token", sa.String(length=500), nullable=False),
+        sa.Column("platform", sa.String(length=20), nullable=False),
+        sa.Column("is_active", sa.Boolean, nullable=False, server_default=sa.text("true")),
+        *_timestamps(),
+    )
+    op.create_index("ix_device_tokens_token", "device_tokens", ["token"], unique=True)
+    op.create_index("ix_device_tokens_user_id_is_active", "device_tokens", ["user_id", "is_active"])
+
+    # farmers is live: build its indexes without blocking writes.
+    # CONCURRENTLY cannot run inside a transaction.
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_farmers_location_id",
+            "farmers",
+            ["location_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_farmers_organic_certified_partial",
+            "farmers",
+            ["organic_certified"],
+            postgresql_where=sa.text("organic_certified = true"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_farmers_farm_name_trgm",
+            "farmers",
+            ["farm_name"],
+            postgresql_using="gin",
+            postgresql_ops={"farm_name": "gin_trgm_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in (
+            "ix_farmers_farm_name_trgm",
+            "ix_farmers_organic_certified_partial",
+            "ix_farmers_location_id",
+        ):
+            op.drop_index(name, table_name="farmers", postgresql_concurrently=True, if_exists=True)
+
+    op.drop_table("device_tokens")
+    op.drop_table("user_notification_preferences")
+    op.drop_table("notifications")
+    op.drop_table("notification_templates")
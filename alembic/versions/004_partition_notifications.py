@@ -0,0 +1,122 @@
+"""partition notifications by category and month
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19
+
+PostgreSQL only; other databases keep the plain table. The table becomes
+LIST-partitioned by category, each category RANGE-partitioned by month on
+created_at, so retention can drop whole partitions per category. Existing
+rows are copied into the new layout, which rewrites the table once.
+"""
+
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "004"
+down_revision = "003"
+branch_labels = None
+depends_on = None
+
+CATEGORIES = ("order", "product", "account", "marketing", "system")
+MONTHS_AHEAD = 3
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    op.execute("ALTER TABLE notifications RENAME TO notifications_unpartitioned")
+    op.execute(
+        "ALTER TABLE notifications_unpartitioned "
+        "RENAME CONSTRAINT notifications_pkey TO notifications_unpartitioned_pkey"
+    )
+    op.execute(
+        "ALTER INDEX ix_notifications_user_id_status_created_at "
+        "RENAME TO ix_notifications_unpartitioned_user_id_status_created_at"
+    )
+    op.execute("UPDATE notifications_unpartitioned SET created_at = now() WHERE created_at IS NULL")
+
+    # The partition keys must be part of the primary key
+    op.execute(
+        "CREATE TABLE notifications ("
+        "LIKE notifications_unpartitioned INCLUDING DEFAULTS, "
+        "CONSTRAINT notifications_pkey PRIMARY KEY (id, category, created_at)"
+        ") PARTITION BY LIST (category)"
+    )
+    op.create_foreign_key(None, "notifications", "users", ["user_id"], ["id"])
+    op.create_foreign_key(None, "notifications", "notification_templates", ["template_id"], ["id"])
+
+    oldest = None
+    if not op.get_context().as_sql:
+        oldest = bind.execute(sa.text("SELECT min(created_at) FROM notifications_unpartitioned")).scalar()
+    current = datetime.utcnow().date().replace(day=1)
+    month = oldest.date().replace(day=1) if oldest else current
+    months = []
+    while month <= _add_months(current, MONTHS_AHEAD):
+        months.append(month)
+        month = _add_months(month, 1)
+
+    for category in CATEGORIES:
+        op.execute(
+            f"CREATE TABLE notifications_{category} PARTITION OF notifications "
+            f"FOR VALUES IN ('{category}') PARTITION BY RANGE (created_at)"
+        )
+        for start in months:
+            op.execute(
+                f"CREATE TABLE notifications_{category}_{start:%Y_%m} "
+                f"PARTITION OF notifications_{category} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{_add_months(start, 1).isoformat()}')"
+            )
+        op.execute(
+            f"CREATE TABLE notifications_{category}_default "
+            f"PARTITION OF notifications_{category} DEFAULT"
+        )
+    op.execute("CREATE TABLE notifications_other PARTITION OF notifications DEFAULT")
+
+    op.create_index(
+        "ix_notifications_user_id_status_created_at",
+        "notifications",
+        ["user_id", "status", "created_at"],
+    )
+
+    op.execute("INSERT INTO notifications SELECT * FROM notifications_unpartitioned")
+    # Keep the id sequence alive when the old table goes away
+    op.execute("ALTER SEQUENCE notifications_id_seq OWNED BY notifications.id")
+    op.drop_table("notifications_unpartitioned")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    op.execute(
+        "CREATE TABLE notifications_unpartitioned ("
+        "LIKE notifications INCLUDING DEFAULTS, "
+        "CONSTRAINT notifications_unpartitioned_pkey PRIMARY KEY (id))"
+    )
+    op.execute("INSERT INTO notifications_unpartitioned SELECT * FROM notifications")
+    op.execute("ALTER SEQUENCE notifications_id_seq OWNED BY notifications_unpartitioned.id")
+    op.execute("DROP TABLE notifications CASCADE")
+
+    op.execute("ALTER TABLE notifications_unpartitioned RENAME TO notifications")
+    op.execute(
+        "ALTER TABLE notifications "
+        "RENAME CONSTRAINT notifications_unpartitioned_pkey TO notifications_pkey"
+    )
+    op.create_foreign_key(None, "notifications", "users", ["user_id"], ["id"])
+    op.create_foreign_key(None, "notifications", "notification_templates", ["template_id"], ["id"])
+    op.create_index(
+        "ix_notifications_user_id_status_created_at",
+        "notifications",
+        ["user_id", "status", "created_at"],
+    )
@@ -0,0 +1,33 @@
+"""add partial index for the notification outbox
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19
+
+Workers claim the oldest PENDING rows; the partial index keeps that scan
+proportional to the backlog, not the table. It is built without
+CONCURRENTLY because PostgreSQL does not support that on partitioned
+tables, so writes to notifications block while it builds.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "005"
+down_revision = "004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_notifications_pending",
+        "notifications",
+        ["created_at"],
+        postgresql_where=sa.text("status = 'pending'"),
+        sqlite_where=sa.text("status = 'pending'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_notifications_pending", table_name="notifications")
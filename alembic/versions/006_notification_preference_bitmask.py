@@ -0,0 +1,63 @@
+"""store notification preferences as a bitmask
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19
+
+The 18 per-type/per-category boolean columns become one integer,
+``preference_mask``: one byte per type (email, push, in_app), bit 0 the
+type's master switch and bits 1-5 order, product, account, marketing and
+system. The layout is frozen here so later model changes cannot alter
+what this migration writes.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "006"
+down_revision = "005"
+branch_labels = None
+depends_on = None
+
+_TYPES = {"email": 0, "push": 8, "in_app": 16}
+_FLAGS = {"enabled": 0, "orders": 1, "products": 2, "account": 3, "marketing": 4, "system": 5}
+_DEFAULTS_OFF = {"email_marketing", "push_products", "push_marketing", "in_app_marketing"}
+
+_COLUMNS = {
+    f"{notification_type}_{flag}": 1 << (shift + bit)
+    for notification_type, shift in _TYPES.items()
+    for flag, bit in _FLAGS.items()
+}
+DEFAULT_MASK = sum(bit for column, bit in _COLUMNS.items() if column not in _DEFAULTS_OFF)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user_notification_preferences",
+        sa.Column(
+            "preference_mask",
+            sa.Integer(),
+            nullable=False,
+            server_default=sa.text(str(DEFAULT_MASK)),
+        ),
+    )
+    mask = " + ".join(
+        f"(CASE WHEN {column} THEN {bit} ELSE 0 END)" for column, bit in _COLUMNS.items()
+    )
+    op.execute(f"UPDATE user_notification_preferences SET preference_mask = {mask}")
+    for column in _COLUMNS:
+        op.drop_column("user_notification_preferences", column)
+
+
+def downgrade() -> None:
+    for column in _COLUMNS:
+        default = "false" if column in _DEFAULTS_OFF else "true"
+        op.add_column(
+            "user_notification_preferences",
+            sa.Column(column, sa.Boolean(), nullable=False, server_default=sa.text(default)),
+        )
+    assignments = ", ".join(
+        f"{column} = (preference_mask & {bit}) <> 0" for column, bit in _COLUMNS.items()
+    )
+    op.execute(f"UPDATE user_notification_preferences SET {assignments}")
+    op.drop_column("user_notification_preferences", "preference_mask")
@@ -0,0 +1,45 @@
+"""defer notifications until quiet hours end
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19
+
+Email and push notifications created during a user's quiet hours are
+stored as 'deferred' with ``deliver_after`` set to the end of the window
+in UTC. The partial index serves the release UPDATE and the scheduler's
+resync of distinct release times. Like 005 it is built without
+CONCURRENTLY because notifications is partitioned. Quiet hours are
+interpreted in the new ``timezone`` preference (an IANA name), and users
+who have not set one are treated as UTC.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "007"
+down_revision = "006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("notifications", sa.Column("deliver_after", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_notifications_deferred",
+        "notifications",
+        ["deliver_after"],
+        postgresql_where=sa.text("status = 'deferred'"),
+        sqlite_where=sa.text("status = 'deferred'"),
+    )
+    op.add_column(
+        "user_notification_preferences",
+        sa.Column("timezone", sa.String(length=64), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    # Deferred rows would be stranded without the scheduler; send them now
+    op.execute("UPDATE notifications SET status = 'pending' WHERE status = 'deferred'")
+    op.drop_column("user_notification_preferences", "timezone")
+    op.drop_index("ix_notifications_deferred", table_name="notifications")
+    op.drop_column("notifications", "deliver_after")
@@ -0,0 +1,34 @@
+"""schedule notification retries
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19
+
+Failed deliveries with attempts left become 'retrying' with
+``next_attempt_at`` set by exponential backoff. Outbox workers claim due
+retries through the ``(status, next_attempt_at)`` index. Like 005 it is
+built without CONCURRENTLY because notifications is partitioned.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "008"
+down_revision = "007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("notifications", sa.Column("next_attempt_at", sa.DateTime(), nullable=True))
+    op.create_index(
+        "ix_notifications_status_next_attempt_at",
+        "notifications",
+        ["status", "next_attempt_at"],
+    )
+
+
+def downgrade() -> None:
+    op.execute("UPDATE notifications SET status = 'failed' WHERE status = 'retrying'")
+    op.drop_index("ix_notifications_status_next_attempt_at", table_name="notifications")
+    op.drop_column("notifications", "next_attempt_at")
@@ -0,0 +1,52 @@
+"""buffer notifications for digests
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19
+
+Email and push notifications that arrive while a user's coalescing
+window for their category is open are stored as 'digested', and one row
+per notification is added here. When ``flush_after`` passes, the window's
+notifications are sent as a single digest and the rows are deleted. The
+table is the durable buffer, so a restart does not lose held items.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "009"
+down_revision = "008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notification_digest_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("notification_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("notification_type", sa.String(length=20), nullable=False),
+        sa.Column("category", sa.String(length=50), nullable=False),
+        sa.Column("flush_after", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), onupdate=sa.func.now()),
+    )
+    op.create_index(
+        "ix_notification_digest_items_flush_after", "notification_digest_items", ["flush_after"]
+    )
+    op.create_index(
+        "ix_notification_digest_items_window",
+        "notification_digest_items",
+        ["user_id", "notification_type", "category"],
+    )
+
+
+def downgrade() -> None:
+    # Send whatever is still held individually
+    op.execute(
+        "UPDATE notifications SET status = 'pending' WHERE id IN "
+        "(SELECT notification_id FROM notification_digest_items)"
+    )
+    op.drop_table("notification_digest_items")
@@ -0,0 +1,51 @@
+"""record notification idempotency keys
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-19
+
+POST /api/notifications/ and /bulk accept an idempotency key. The first
+request with a key stores it here with the ids of the notifications it
+created. The unique (requester_id, key) index makes a retried or
+concurrent request fail to insert, so it returns the original
+notifications instead of creating duplicates. Notifications are
+partitioned and cannot carry a global unique index, which is why the keys
+have their own table.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "010"
+down_revision = "009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "notification_idempotency_keys",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("requester_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("key", sa.String(length=255), nullable=False),
+        sa.Column("fingerprint", sa.String(length=64), nullable=False),
+        sa.Column("notification_ids", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), onupdate=sa.func.now()),
+    )
+    op.create_index(
+        "ix_notification_idempotency_keys_requester_id_key",
+        "notification_idempotency_keys",
+        ["requester_id", "key"],
+        unique=True,
+    )
+    op.create_index(
+        "ix_notification_idempotency_keys_created_at",
+        "notification_idempotency_keys",
+        ["created_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("notification_idempotency_keys")
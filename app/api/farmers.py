@@ -11,7 +11,7 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.dependencies import get_current_active_user, CurrentUser
 from app.schemas.farmer import FarmerCreate, FarmerUpdate, FarmerResponse
 from app.services.farmer_service import FarmerService
@@ -23,7 +23,7 @@ router = APIRouter()
 async def list_farmers(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of records to return"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> List[FarmerResponse]:
     """
     Get list of all farmers with pagination.
@@ -45,7 +45,7 @@ async def list_farmers(
 @router.get("/{farmer_id}", response_model=FarmerResponse)
 async def get_farmer(
     farmer_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> FarmerResponse:
     """
     Get a specific farmer by ID.
@@ -187,7 +187,7 @@ async def search_farmers_by_location(
     lat: float = Query(..., description="Latitude of search center"),
     lng: float = Query(..., description="Longitude of search center"),
     radius: float = Query(50.0, ge=0.1, le=500.0, description="Search radius in kilometers"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> List[FarmerResponse]:
     """
     Search for farmers within a specified radius of given coordinates.
@@ -208,7 +208,7 @@ async def search_farmers_by_location(
 @router.get("/search/name/", response_model=List[FarmerResponse])
 async def search_farmers_by_name(
     farm_name: str = Query(..., min_length=1, description="Farm name to search for"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> List[FarmerResponse]:
     """
     Search for farmers by farm name (case-insensitive partial match).
@@ -226,7 +226,7 @@ async def search_farmers_by_name(
 
 @router.get("/organic/", response_model=List[FarmerResponse])
 async def get_organic_farmers(
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> List[FarmerResponse]:
     """
     Get all organic certified farmers.
@@ -243,7 +243,7 @@ async def get_organic_farmers(
 
 @router.get("/me/profile", response_model=FarmerResponse)
 async def get_my_farmer_profile(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: CurrentUser = Depends(get_current_active_user)
 ) -> FarmerResponse:
     """
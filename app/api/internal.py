@@ -0,0 +1,125 @@
+"""
+Internal diagnostics endpoints.
+
+Exposes per-worker runtime state (connection pool, query statistics, ...)
+for capacity planning. Mounted under ``/internal`` only when
+``internal_api_enabled`` is set (off by default), and every endpoint
+requires an admin bearer token. Keep it off the public network anyway.
+"""
+
+from typing import Annotated, Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_db, get_engine, get_replica_engines
+from app.core.db_pool import get_pool_status, pool_metrics
+from app.core.query_stats import RouteStatsRegistry, route_stats
+from app.core.slow_queries import slow_query_log
+from app.models.users.user import User, UserType
+from app.services.auth_service import auth_service
+from app.services.notification_lanes import get_lane_backlog
+from app.services.notification_outbox import notification_workers
+from app.services.notification_retry import get_retry_queue_status
+from app.services.notification_service import notification_service
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+
+
+async def require_admin(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """Allow only admins: these endpoints expose SQL, plans and resets."""
+    current_user = await auth_service.get_current_user_from_token(db, token)
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required"
+        )
+    return current_user
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/db/pool")
+async def get_db_pool_status() -> Dict[str, Any]:
+    """Current connection pool usage and wait-time histograms."""
+    status = get_pool_status(get_engine())
+    status["replicas"] = [
+        get_pool_status(replica) for replica in get_replica_engines()
+    ]
+    return status
+
+
+@router.post("/db/pool/reset")
+async def reset_db_pool_metrics() -> Dict[str, str]:
+    """Reset pool counters and histograms, e.g. before a load test."""
+    pool_metrics.reset()
+    return {"status": "reset"}
+
+
+@router.get("/db/queries")
+async def get_route_query_stats(
+    sort_by: str = Query("avg_db_time_ms"),
+    limit: int = Query(20, ge=1, le=200),
+) -> List[Dict[str, Any]]:
+    """Routes with the most database work per request, worst first."""
+    if sort_by not in RouteStatsRegistry.SORT_KEYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sort_by must be one of {', '.join(RouteStatsRegistry.SORT_KEYS)}",
+        )
+    return route_stats.worst(sort_by=sort_by, limit=limit)
+
+
+@router.post("/db/queries/reset")
+async def reset_route_query_stats() -> Dict[str, str]:
+    """Reset per-route query statistics."""
+    route_stats.reset()
+    return {"status": "reset"}
+
+
+@router.get("/db/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=500)
+) -> Dict[str, Any]:
+    """Most recent slow statements with sampled EXPLAIN plans."""
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "explain_sample_rate": slow_query_log.explain_sample_rate,
+        "entries": slow_query_log.entries(limit),
+    }
+
+
+@router.delete("/db/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+async def clear_slow_queries() -> None:
+    """Empty the slow-query ring buffer."""
+    slow_query_log.clear()
+
+
+@router.get("/notifications/retries")
+async def get_notification_retry_queue(
+    db: AsyncSession = Depends(get_db),
+) -> Dict[str, Any]:
+    """Retry queue depth, due count and age of the oldest waiting notification."""
+    return await get_retry_queue_status(db)
+
+
+@router.get("/notifications/providers")
+async def get_notification_provider_limits() -> Dict[str, Any]:
+    """Send rate, in-flight and queued requests and circuit state per delivery provider."""
+    return notification_service.delivery_limits()
+
+
+@router.get("/notifications/lanes")
+async def get_notification_lanes(
+    db: AsyncSession = Depends(get_db),
+) -> Dict[str, Any]:
+    """Backlog, worker budget and queue-latency SLO attainment per priority lane."""
+    backlog = await get_lane_backlog(db, notification_workers.lanes)
+    return {
+        name: {**status, **backlog[name]}
+        for name, status in notification_workers.lane_status().items()
+    }
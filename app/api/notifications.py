@@ -7,19 +7,19 @@ Provides endpoints for managing notifications, preferences, and real-time update
 from typing import List, Optional
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.models.shared.notification import (
     Notification,
     NotificationCategory,
     NotificationStatus,
     NotificationType,
 )
-from app.models.users.user import User
+from app.models.users.user import User, UserType
 from app.schemas.notification import (
     DeviceTokenCreate,
     DeviceTokenResponse,
@@ -30,6 +30,8 @@ from app.schemas.notification import (
     NotificationPreferencesResponse,
     NotificationPreferencesUpdate,
     NotificationResponse,
+    NotificationSegmentCreate,
+    NotificationSegmentResponse,
     NotificationStatsResponse,
     NotificationTemplateCreate,
     NotificationTemplateResponse,
@@ -37,7 +39,9 @@ from app.schemas.notification import (
     WebSocketNotification,
 )
 from app.services.auth_service import auth_service
+from app.services.notification_idempotency import first_replayed, notification_idempotency
 from app.services.notification_service import notification_service
+from app.services.template_registry import template_registry
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
@@ -87,10 +91,24 @@ manager = ConnectionManager()
 @router.post("/", response_model=NotificationResponse, status_code=status.HTTP_201_CREATED)
 async def create_notification(
     notification_data: NotificationCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Create a new notification."""
+    """
+    Create a new notification.
+
+    A repeat with the same ``Idempotency-Key`` header (or ``idempotency_key``
+    field) returns the original notification instead of creating another.
+    """
+    key = notification_idempotency.key_for(
+        current_user.id, idempotency_key or notification_data.idempotency_key, notification_data
+    )
+    if key:
+        replayed = await notification_idempotency.replay(db, key)
+        if replayed is not None:
+            return NotificationResponse.model_validate(first_replayed(replayed))
+    
     try:
         notification = await notification_service.send_notification(
             db=db,
@@ -102,7 +120,8 @@ async def create_notification(
             template_name=notification_data.template_name,
             template_data=notification_data.template_data,
             data=notification_data.data,
-            recipient_override=notification_data.recipient_override
+            recipient_override=notification_data.recipient_override,
+            idempotency_key=key
         )
         
         # Send real-time notification if it's in-app
@@ -118,6 +137,9 @@ async def create_notification(
         
         return NotificationResponse.model_validate(notification)
     
+    except HTTPException:
+        # e.g. 422 from a concurrent request that claimed the key with another body
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -128,10 +150,19 @@ async def create_notification(
 @router.post("/bulk", response_model=List[NotificationResponse])
 async def create_bulk_notifications(
     notification_data: NotificationBulkCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Create notifications for multiple users."""
+    """Create notifications for multiple users; idempotent like ``create_notification``."""
+    key = notification_idempotency.key_for(
+        current_user.id, idempotency_key or notification_data.idempotency_key, notification_data
+    )
+    if key:
+        replayed = await notification_idempotency.replay(db, key)
+        if replayed is not None:
+            return [NotificationResponse.model_validate(n) for n in replayed]
+    
     try:
         notifications = await notification_service.send_bulk_notification(
             db=db,
@@ -142,23 +173,31 @@ async def create_bulk_notifications(
             message=notification_data.message,
             template_name=notification_data.template_name,
             template_data=notification_data.template_data,
-            data=notification_data.data
+            data=notification_data.data,
+            idempotency_key=key
         )
         
         # Send real-time notifications for in-app notifications
         if notification_data.notification_type == NotificationType.IN_APP:
-            for notification in notifications:
-                unread_count = await notification_service.get_unread_count(db, notification.user_id)
+            connected = [
+                n for n in notifications if n.user_id in manager.active_connections
+            ]
+            unread_counts = await notification_service.get_unread_counts(
+                db, [n.user_id for n in connected]
+            )
+            for notification in connected:
                 await manager.send_personal_message(
                     WebSocketNotification(
                         notification=NotificationResponse.model_validate(notification),
-                        unread_count=unread_count
+                        unread_count=unread_counts[notification.user_id]
                     ).model_dump(),
                     notification.user_id
                 )
         
         return [NotificationResponse.model_validate(n) for n in notifications]
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -166,6 +205,50 @@ async def create_bulk_notifications(
         )
 
 
+@router.post(
+    "/segment",
+    response_model=NotificationSegmentResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def create_segment_notifications(
+    notification_data: NotificationSegmentCreate,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Notify every user in a segment (admin only).
+
+    Recipients are selected and streamed in the database, so callers do not
+    send ids. The notifications are queued for the outbox workers.
+    """
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required"
+        )
+    
+    try:
+        result = await notification_service.send_segment_notification(
+            db=db,
+            read_db=read_db,
+            segment=notification_data.segment,
+            notification_type=notification_data.notification_type,
+            category=notification_data.category,
+            title=notification_data.title,
+            message=notification_data.message,
+            template_name=notification_data.template_name,
+            template_data=notification_data.template_data,
+            data=notification_data.data
+        )
+        return NotificationSegmentResponse(**result)
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to send segment notifications: {str(e)}"
+        )
+
+
 @router.get("/", response_model=NotificationListResponse)
 async def get_notifications(
     notification_type: Optional[NotificationType] = Query(None),
@@ -173,7 +256,7 @@ async def get_notifications(
     unread_only: bool = Query(False),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get user's notifications with pagination."""
@@ -214,7 +297,7 @@ async def get_notifications(
 
 @router.get("/unread-count", response_model=dict)
 async def get_unread_count(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get count of unread notifications."""
@@ -224,7 +307,7 @@ async def get_unread_count(
 
 @router.get("/stats", response_model=NotificationStatsResponse)
 async def get_notification_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get notification statistics for the user."""
@@ -426,6 +509,8 @@ async def create_notification_template(
     db.add(template)
     await db.commit()
     await db.refresh(template)
+    # Other workers pick the change up on their next version poll
+    await template_registry.refresh()
     
     return NotificationTemplateResponse.model_validate(template)
 
@@ -472,7 +557,10 @@ async def update_notification_template(
         setattr(template, field, value)
     
     await db.commit()
+    notification_service.template_renderer.invalidate(template.id)
     await db.refresh(template)
+    # Other workers pick the change up on their next version poll
+    await template_registry.refresh()
     
     return NotificationTemplateResponse.model_validate(template)
 
@@ -8,9 +8,17 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
-from app.models.users.user import User
-from app.schemas.user import Token, UserCreate, UserLogin, UserResponse
+from app.core.database import get_db, get_read_db
+from app.models.users.user import User, UserType
+from app.schemas.user import (
+    Token,
+    UserBulkCreate,
+    UserBulkCreateResponse,
+    UserBulkStatus,
+    UserCreate,
+    UserLogin,
+    UserResponse,
+)
 from app.services.auth_service import auth_service
 
 router = APIRouter()
@@ -36,6 +44,28 @@ async def register_user(
         )
 
 
+@router.post("/bulk", response_model=UserBulkCreateResponse)
+async def bulk_create_users(
+    bulk_create: UserBulkCreate,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: AsyncSession = Depends(get_db),
+) -> UserBulkCreateResponse:
+    """Provision many users at once (admin only)."""
+    current_user = await auth_service.get_current_user_from_token(db, token)
+    if current_user.user_type != UserType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required"
+        )
+
+    results = await auth_service.bulk_create_users(db, bulk_create.users)
+    return UserBulkCreateResponse(
+        created=sum(r.status == UserBulkStatus.CREATED for r in results),
+        duplicates=sum(r.status == UserBulkStatus.DUPLICATE for r in results),
+        failed=sum(r.status == UserBulkStatus.FAILED for r in results),
+        results=results,
+    )
+
+
 @router.post("/login", response_model=Token)
 async def login_user(
     user_login: UserLogin, db: AsyncSession = Depends(get_db)
@@ -76,7 +106,7 @@ async def get_current_user(
 
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
-    skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)
+    skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_read_db)
 ) -> List[UserResponse]:
     """Get list of users with pagination."""
     from sqlalchemy import select
@@ -89,7 +119,9 @@ async def get_users(
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: str, db: AsyncSession = Depends(get_db)) -> UserResponse:
+async def get_user(
+    user_id: str, db: AsyncSession = Depends(get_read_db)
+) -> UserResponse:
     """Get user by ID."""
     from uuid import UUID
 
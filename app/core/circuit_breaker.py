@@ -0,0 +1,175 @@
+"""
+Circuit breaker for outbound providers.
+
+A breaker watches the failure rate of calls to one provider over a
+sliding time window. When enough calls have been made and too many of
+them failed, it opens. While open, callers are refused at once and do
+not wait on a provider that is down. After ``open_seconds`` it is half
+open and lets up to ``half_open_probes`` calls through at a time. That
+many successes close it again. Any failing probe reopens it for another
+``open_seconds``.
+
+Callers ask ``allow()`` before each call, or wrap it in ``guarded()``,
+and report every allowed call exactly once through ``record()``.
+"""
+
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any, AsyncContextManager, AsyncIterator, Deque, Dict, List, Tuple
+
+# Delivery error for calls refused by an open breaker
+CIRCUIT_OPEN = "CircuitOpen"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open."""
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker with half-open probing."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        window: float = 30.0,
+        min_calls: int = 20,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 5,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        # [second, calls, failures] per second of the window
+        self._buckets: Deque[List[int]] = deque()
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if (
+            self._state == CircuitState.OPEN
+            and time.monotonic() >= self._opened_at + self.open_seconds
+        ):
+            self._state = CircuitState.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until an open breaker starts probing; 0 if not open."""
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def refuse(self) -> bool:
+        """Cheap pre-check before queueing: true (and counted) while open."""
+        if self.state == CircuitState.OPEN:
+            self.rejected += 1
+            return True
+        return False
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now."""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+            self._probes_in_flight += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool) -> None:
+        """Report the outcome of an allowed call."""
+        state = self.state
+        if state == CircuitState.HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if not success:
+                self._open()
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._state = CircuitState.CLOSED
+                    self._buckets.clear()
+        elif state == CircuitState.CLOSED:
+            calls, failures = self._count(success)
+            if calls >= self.min_calls and failures >= calls * self.failure_rate:
+                self._open()
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+
+    def _count(self, success: bool) -> Tuple[int, int]:
+        second = int(time.monotonic())
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        self._buckets[-1][1] += 1
+        self._buckets[-1][2] += not success
+        return (
+            sum(bucket[1] for bucket in self._buckets),
+            sum(bucket[2] for bucket in self._buckets),
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State, recent failure rate and rejection counts."""
+        state = self.state
+        calls = sum(bucket[1] for bucket in self._buckets)
+        failures = sum(bucket[2] for bucket in self._buckets)
+        return {
+            "state": state.value,
+            "window_calls": calls,
+            "window_failure_rate": round(failures / calls, 3) if calls else 0.0,
+            "retry_after": round(self.retry_after, 1),
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+@asynccontextmanager
+async def guarded(breaker: CircuitBreaker, gate: AsyncContextManager) -> AsyncIterator[None]:
+    """
+    Pass ``gate`` (e.g. a rate limiter) and then ``breaker``.
+
+    Raises ``CircuitOpenError`` without waiting if the breaker is open, and
+    again after the wait if it opened meanwhile, so callers queued behind
+    a failing provider are released at once. The caller records the outcome.
+    """
+    if breaker.refuse():
+        raise CircuitOpenError(f"{breaker.name} circuit open")
+    async with gate:
+        if not breaker.allow():
+            raise CircuitOpenError(f"{breaker.name} circuit open")
+        yield
+
+
+def breaker_from_settings(name: str, settings: Any) -> CircuitBreaker:
+    """Breaker for provider ``name`` from the ``notification_breaker_*`` settings."""
+    return CircuitBreaker(
+        name,
+        failure_rate=getattr(settings, "notification_breaker_failure_rate", 0.5),
+        window=getattr(settings, "notification_breaker_window", 30.0),
+        min_calls=getattr(settings, "notification_breaker_min_calls", 20),
+        open_seconds=getattr(settings, "notification_breaker_open_seconds", 30.0),
+        half_open_probes=getattr(settings, "notification_breaker_half_open_probes", 5),
+    )
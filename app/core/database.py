@@ -2,7 +2,9 @@
 Database connection and session management.
 """
 
-from typing import AsyncGenerator, Optional
+import contextvars
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Dict, Iterator, List, Optional
 
 from loguru import logger
 from sqlalchemy.ext.asyncio import (
@@ -13,7 +15,10 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.orm import declarative_base
 
-from app.core.config import get_settings
+from app.core.config import Settings, get_settings
+from app.core.db_pool import InstrumentedAsyncQueuePool, instrument_pool
+from app.core.query_stats import instrument_engine
+from app.core.slow_queries import slow_query_log
 
 # Base class for SQLAlchemy models
 Base = declarative_base()
@@ -22,6 +27,33 @@ Base = declarative_base()
 engine: Optional[AsyncEngine] = None
 SessionLocal: Optional[async_sessionmaker[AsyncSession]] = None
 
+# Read replicas, used round-robin by get_read_db()
+replica_engines: List[AsyncEngine] = []
+ReplicaSessionLocals: List[async_sessionmaker[AsyncSession]] = []
+_replica_counter = 0
+
+# Set for the current request/task when reads must see its own writes
+_read_from_primary: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "read_from_primary", default=False
+)
+
+
+def engine_options(settings: Settings, url: str) -> Dict[str, Any]:
+    """Build ``create_async_engine`` keyword arguments for ``url``."""
+    options: Dict[str, Any] = {"echo": settings.database_echo, "future": True}
+
+    # SQLite (tests, local tooling) manages its own pool
+    if not url.startswith("sqlite"):
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=settings.db_pool_pre_ping,
+        )
+    return options
+
 
 async def init_db() -> None:
     """Initialize database connection."""
@@ -32,9 +64,19 @@ async def init_db() -> None:
     # Create async engine
     engine = create_async_engine(
         settings.database_url,
-        echo=settings.is_development,
-        future=True,
+        **engine_options(settings, settings.database_url),
+    )
+    instrument_pool(engine.pool)
+    slow_query_log.configure(
+        threshold_ms=settings.slow_query_threshold_ms,
+        explain_sample_rate=settings.slow_query_explain_sample_rate,
+        max_entries=settings.slow_query_log_size,
     )
+    instrument_statements = (
+        settings.sql_instrumentation_enabled or slow_query_log.enabled
+    )
+    if instrument_statements:
+        instrument_engine(engine.sync_engine)
 
     # Create session factory
     SessionLocal = async_sessionmaker(
@@ -43,7 +85,36 @@ async def init_db() -> None:
         expire_on_commit=False,
     )
 
-    logger.info("Database connection initialized")
+    # Create read replica engines, if configured
+    replica_engines.clear()
+    ReplicaSessionLocals.clear()
+    for url in settings.database_replica_urls:
+        replica = create_async_engine(url, **engine_options(settings, url))
+        if instrument_statements:
+            instrument_engine(replica.sync_engine)
+        replica_engines.append(replica)
+        ReplicaSessionLocals.append(
+            async_sessionmaker(replica, class_=AsyncSession, expire_on_commit=False)
+        )
+
+    logger.info(
+        f"Database connection initialized ({len(replica_engines)} read replicas)"
+    )
+
+
+async def close_db() -> None:
+    """Dispose of the primary and replica engines."""
+    global engine, SessionLocal
+
+    for replica in replica_engines:
+        await replica.dispose()
+    replica_engines.clear()
+    ReplicaSessionLocals.clear()
+
+    if engine is not None:
+        await engine.dispose()
+    engine = None
+    SessionLocal = None
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -57,6 +128,60 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+def _next_read_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """Pick the session factory for a read-only unit of work."""
+    global _replica_counter
+
+    if SessionLocal is None:
+        raise RuntimeError("Database not initialized. Call init_db() first.")
+    if not ReplicaSessionLocals or _read_from_primary.get():
+        return SessionLocal
+
+    factory = ReplicaSessionLocals[_replica_counter % len(ReplicaSessionLocals)]
+    _replica_counter += 1
+    return factory
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Get a database session for read-only work.
+
+    Sessions come from the read replicas in round-robin order, or from the
+    primary when no replicas are configured or the caller asked to read its
+    own writes (see :func:`read_from_primary`).
+    """
+    async with _next_read_sessionmaker()() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+@contextmanager
+def read_from_primary() -> Iterator[None]:
+    """Route get_read_db() to the primary inside this block."""
+    token = _read_from_primary.set(True)
+    try:
+        yield
+    finally:
+        _read_from_primary.reset(token)
+
+
+def pin_reads_to_primary() -> None:
+    """Route get_read_db() to the primary for the rest of this request/task."""
+    _read_from_primary.set(True)
+
+
 def get_engine() -> Optional[AsyncEngine]:
     """Get database engine."""
     return engine
+
+
+def get_session_factory() -> Optional[async_sessionmaker[AsyncSession]]:
+    """Get the primary session factory, for work outside a request."""
+    return SessionLocal
+
+
+def get_replica_engines() -> List[AsyncEngine]:
+    """Get read replica engines."""
+    return list(replica_engines)
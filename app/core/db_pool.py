@@ -0,0 +1,117 @@
+"""
+Instrumented connection pool and pool statistics.
+
+Wraps SQLAlchemy's async queue pool so that the time spent waiting for a
+connection is recorded, which is what tells us whether ``pool_size`` and
+``max_overflow`` are right for a worker under load.
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+from app.core.metrics import Histogram
+
+
+class PoolMetrics:
+    """Counters and histograms collected from pool events."""
+
+    def __init__(self) -> None:
+        self.wait_time_ms = Histogram()
+        self.hold_time_ms = Histogram()
+        self.reset()
+
+    def reset(self) -> None:
+        """Zero all counters and histograms."""
+        self.wait_time_ms.reset()
+        self.hold_time_ms.reset()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records how long callers wait for a connection."""
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.wait_time_ms.observe((time.perf_counter() - start) * 1000)
+
+
+def instrument_pool(pool: Pool) -> None:
+    """Attach event listeners that feed :data:`pool_metrics`."""
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        pool_metrics.connects += 1
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(
+        dbapi_connection: Any, connection_record: Any, connection_proxy: Any
+    ) -> None:
+        pool_metrics.checkouts += 1
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_connection: Any, connection_record: Any) -> None:
+        started = connection_record.info.pop("checked_out_at", None)
+        if started is not None:
+            pool_metrics.hold_time_ms.observe((time.perf_counter() - started) * 1000)
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(
+        dbapi_connection: Any, connection_record: Any, exception: Any
+    ) -> None:
+        pool_metrics.invalidations += 1
+
+
+def get_pool_status(engine: Optional[AsyncEngine]) -> Dict[str, Any]:
+    """Describe the current state of ``engine``'s pool."""
+    if engine is None:
+        return {"initialized": False}
+
+    pool = engine.pool
+    status: Dict[str, Any] = {
+        "initialized": True,
+        "pool_class": type(pool).__name__,
+    }
+
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        checked_out = pool.checkedout()
+        capacity = pool.size() + max(pool._max_overflow, 0)
+        status.update(
+            {
+                "size": pool.size(),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+                "checked_out": checked_out,
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "utilization": round(checked_out / capacity, 3) if capacity else 0.0,
+            }
+        )
+
+    status.update(
+        {
+            "checkouts": pool_metrics.checkouts,
+            "connects": pool_metrics.connects,
+            "invalidations": pool_metrics.invalidations,
+            "timeouts": pool_metrics.timeouts,
+            "wait_time_ms": pool_metrics.wait_time_ms.snapshot(),
+            "hold_time_ms": pool_metrics.hold_time_ms.snapshot(),
+        }
+    )
+    return status
@@ -0,0 +1,375 @@
+"""
+Index advisor for recorded query shapes.
+
+Takes normalized statements (as recorded by the slow-query log and the
+per-route query statistics), works out which columns each one filters and
+sorts on, and proposes B-tree, partial and trigram indexes that the current
+schema does not already provide. Proposals can be rendered as an Alembic
+migration that builds the indexes with ``CREATE INDEX CONCURRENTLY``.
+
+The parser understands the flat ``SELECT/UPDATE/DELETE ... WHERE a AND b
+ORDER BY c`` statements SQLAlchemy emits; anything with ``OR`` or
+subqueries in the predicate is skipped rather than guessed at.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import MetaData
+
+_TABLE = re.compile(r"\b(?:FROM|UPDATE|JOIN)\s+(\w+)", re.IGNORECASE)
+_WHERE = re.compile(
+    r"\bWHERE\b(.*?)(?=\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|\bOFFSET\b"
+    r"|\bFOR UPDATE\b|\bRETURNING\b|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+_ORDER_BY = re.compile(
+    r"\bORDER BY\b(.*?)(?=\bLIMIT\b|\bOFFSET\b|\bFOR UPDATE\b|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+_PREDICATE = re.compile(
+    r"^\(?\s*(\w+)\.(\w+)\s*"
+    r"(=|!=|<>|<=|>=|<|>|NOT IN|IN|NOT ILIKE|ILIKE|NOT LIKE|LIKE|IS NOT|IS)\s*"
+    r"(.+?)\)?$",
+    re.IGNORECASE,
+)
+_ORDER_TERM = re.compile(r"^(\w+)\.(\w+)(?:\s+(ASC|DESC))?", re.IGNORECASE)
+_BOOLEAN_LITERAL = {"true", "false"}
+
+
+@dataclass
+class StatementShape:
+    """Columns a statement uses, grouped by how an index can serve them."""
+
+    table: str
+    equality: List[str] = field(default_factory=list)
+    inequality: List[str] = field(default_factory=list)
+    range: List[str] = field(default_factory=list)
+    order_by: List[str] = field(default_factory=list)
+    constant: Dict[str, str] = field(default_factory=dict)  # col -> literal
+    pattern: List[str] = field(default_factory=list)  # LIKE/ILIKE columns
+
+
+@dataclass
+class IndexProposal:
+    """A suggested index and why it was suggested."""
+
+    table: str
+    columns: Tuple[str, ...]
+    where: Optional[str] = None
+    using: str = "btree"
+    weight: float = 0.0
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        suffix = "_trgm" if self.using == "gin" else ("_partial" if self.where else "")
+        return f"ix_{self.table}_{'_'.join(self.columns)}{suffix}"[:63]
+
+
+def _split_conjuncts(clause: str) -> Optional[List[str]]:
+    """Split a WHERE clause on top-level AND; None if it has OR/subqueries."""
+    if re.search(r"\bOR\b|\bSELECT\b", clause, re.IGNORECASE):
+        return None
+    parts = re.split(r"\bAND\b", clause, flags=re.IGNORECASE)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def parse_statement(sql: str) -> Optional[StatementShape]:
+    """Extract the indexable shape of ``sql`` for its main table."""
+    table_match = _TABLE.search(sql)
+    if not table_match:
+        return None
+    shape = StatementShape(table=table_match.group(1))
+
+    where_match = _WHERE.search(sql)
+    if where_match:
+        conjuncts = _split_conjuncts(where_match.group(1))
+        if conjuncts is None:
+            return None
+        for conjunct in conjuncts:
+            predicate = _PREDICATE.match(conjunct)
+            if not predicate:
+                continue
+            table, column, operator, value = predicate.groups()
+            if table != shape.table:
+                continue
+            operator = operator.upper()
+            value = value.strip().lower()
+            if operator in ("=", "IS") and value in _BOOLEAN_LITERAL:
+                shape.constant[column] = value
+            elif operator in ("=", "IN"):
+                shape.equality.append(column)
+            elif operator in ("<", "<=", ">", ">="):
+                shape.range.append(column)
+            elif operator in ("ILIKE", "LIKE"):
+                shape.pattern.append(column)
+            elif operator in ("!=", "<>", "NOT IN", "IS NOT"):
+                shape.inequality.append(column)
+
+    order_match = _ORDER_BY.search(sql)
+    if order_match:
+        for term in order_match.group(1).split(","):
+            order = _ORDER_TERM.match(term.strip())
+            if order and order.group(1) == shape.table:
+                shape.order_by.append(order.group(2))
+
+    return shape
+
+
+def _dedupe(columns: Iterable[str]) -> Tuple[str, ...]:
+    seen: List[str] = []
+    for column in columns:
+        if column not in seen:
+            seen.append(column)
+    return tuple(seen)
+
+
+def propose_for_shape(shape: StatementShape, weight: float = 1.0) -> List[IndexProposal]:
+    """Index proposals that would serve ``shape``."""
+    proposals: List[IndexProposal] = []
+    where = (
+        " AND ".join(f"{col} = {value}" for col, value in sorted(shape.constant.items()))
+        or None
+    )
+
+    # Equality first, then filtered and range columns, then sort order
+    columns = _dedupe(
+        shape.equality + shape.inequality + shape.range + shape.order_by
+    )
+    if columns:
+        proposals.append(
+            IndexProposal(shape.table, columns, where=where, weight=weight)
+        )
+    elif where:
+        # Only constant predicates: a partial index on the flag itself
+        proposals.append(
+            IndexProposal(
+                shape.table, tuple(sorted(shape.constant)), where=where, weight=weight
+            )
+        )
+
+    for column in shape.pattern:
+        proposals.append(
+            IndexProposal(shape.table, (column,), using="gin", weight=weight)
+        )
+    return proposals
+
+
+def existing_indexes(metadata: MetaData) -> Dict[str, List[Tuple[str, ...]]]:
+    """Column tuples already indexed per table (indexes, PKs, uniques)."""
+    indexed: Dict[str, List[Tuple[str, ...]]] = {}
+    for table in metadata.tables.values():
+        entries = indexed.setdefault(table.name, [])
+        entries.append(tuple(c.name for c in table.primary_key.columns))
+        for index in table.indexes:
+            if index.dialect_options["postgresql"].get("using") in (None, False, "btree"):
+                entries.append(tuple(c.name for c in index.columns))
+        for constraint in table.constraints:
+            columns = getattr(constraint, "columns", None)
+            if columns is not None and constraint.__class__.__name__ == "UniqueConstraint":
+                entries.append(tuple(c.name for c in columns))
+        for column in table.columns:
+            if column.unique:
+                entries.append((column.name,))
+    return indexed
+
+
+def _is_covered(proposal: IndexProposal, indexed: Sequence[Tuple[str, ...]]) -> bool:
+    if proposal.using != "btree" or proposal.where:
+        return False
+    return any(
+        existing[: len(proposal.columns)] == proposal.columns for existing in indexed
+    )
+
+
+def advise(
+    statements: Iterable[Tuple[str, float]],
+    metadata: Optional[MetaData] = None,
+    known_indexes: Optional[Dict[str, List[Tuple[str, ...]]]] = None,
+) -> List[IndexProposal]:
+    """
+    Propose indexes for weighted ``(sql, weight)`` statements.
+
+    Proposals already served by an existing index (same leading columns)
+    are dropped, and a proposal whose columns are a prefix of another on
+    the same table is folded into the wider one. Results are ordered by
+    total weight, heaviest first.
+    """
+    indexed = dict(known_indexes or {})
+    names = set()
+    if metadata is not None:
+        for table, entries in existing_indexes(metadata).items():
+            indexed.setdefault(table, []).extend(entries)
+        # Partial and GIN indexes are matched by their advisor-style name
+        names = {
+            index.name for table in metadata.tables.values() for index in table.indexes
+        }
+
+    merged: Dict[Tuple[str, Tuple[str, ...], Optional[str], str], IndexProposal] = {}
+    for sql, weight in statements:
+        shape = parse_statement(sql)
+        if shape is None:
+            continue
+        for proposal in propose_for_shape(shape, weight):
+            if proposal.name in names or _is_covered(
+                proposal, indexed.get(proposal.table, [])
+            ):
+                continue
+            key = (proposal.table, proposal.columns, proposal.where, proposal.using)
+            if key in merged:
+                merged[key].weight += weight
+            else:
+                merged[key] = proposal
+            merged[key].reasons.append(sql[:200])
+
+    proposals = list(merged.values())
+    wider = [
+        p for p in proposals
+        if not any(
+            other is not p
+            and other.table == p.table
+            and other.using == p.using
+            and other.where == p.where
+            and len(other.columns) > len(p.columns)
+            and other.columns[: len(p.columns)] == p.columns
+            for other in proposals
+        )
+    ]
+    for proposal in wider:
+        for other in proposals:
+            if (
+                other not in wider
+                and other.table == proposal.table
+                and other.using == proposal.using
+                and other.where == proposal.where
+                and proposal.columns[: len(other.columns)] == other.columns
+            ):
+                proposal.weight += other.weight
+    return sorted(wider, key=lambda p: p.weight, reverse=True)
+
+
+def recorded_statements(payload: Any) -> List[Tuple[str, float]]:
+    """
+    Weighted statements from recorded query statistics.
+
+    Accepts the ``/internal/db/slow-queries`` response (weighted by
+    duration) and the ``/internal/db/queries`` rows (weighted by how often
+    the shape repeated within a request).
+    """
+    statements: List[Tuple[str, float]] = []
+    if isinstance(payload, dict):
+        payload = payload.get("entries", [])
+    for item in payload or []:
+        if "last_repeated" in item:
+            for repeated in item["last_repeated"] or []:
+                statements.append((repeated["sql"], float(repeated["count"])))
+        elif "sql" in item:
+            statements.append((item["sql"], float(item.get("duration_ms", 1.0))))
+    return statements
+
+
+def generic_plan_sql(shape: str) -> str:
+    """
+    ``EXPLAIN (GENERIC_PLAN)`` for a normalized shape (PostgreSQL 16+).
+
+    Normalized placeholders are numbered so the statement can be planned
+    without any real parameter values.
+    """
+    counter = iter(range(1, 10_000))
+    numbered = re.sub(r"\(\?\.\.\.\)", "(?)", shape)
+    numbered = re.sub(r"\?", lambda _: f"${next(counter)}", numbered)
+    return f"EXPLAIN (GENERIC_PLAN, FORMAT JSON) {numbered}"
+
+
+def seq_scanned_tables(plan: Any) -> List[str]:
+    """Relations read with a sequential scan anywhere in ``plan``."""
+    tables: List[str] = []
+    nodes = list(plan) if isinstance(plan, list) else [plan]
+    while nodes:
+        node = nodes.pop()
+        if not isinstance(node, dict):
+            continue
+        if node.get("Node Type") == "Seq Scan" and node.get("Relation Name"):
+            tables.append(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+        if "Plan" in node:
+            nodes.append(node["Plan"])
+    return tables
+
+
+def render_migration(
+    proposals: Sequence[IndexProposal],
+    revision: str,
+    down_revision: Optional[str],
+    create_date: str,
+) -> str:
+    """Render an Alembic migration creating ``proposals`` concurrently."""
+    needs_trgm = any(p.using == "gin" for p in proposals)
+    upgrade: List[str] = []
+    downgrade: List[str] = []
+
+    if needs_trgm:
+        upgrade.append('    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")')
+    upgrade.append("    # CONCURRENTLY cannot run inside a transaction")
+    upgrade.append("    with op.get_context().autocommit_block():")
+    downgrade.append("    with op.get_context().autocommit_block():")
+
+    for proposal in proposals:
+        options = ["postgresql_concurrently=True"]
+        if proposal.where:
+            options.append(f'postgresql_where=sa.text("{proposal.where}")')
+        if proposal.using == "gin":
+            options.append('postgresql_using="gin"')
+            options.append(f'postgresql_ops={{"{proposal.columns[0]}": "gin_trgm_ops"}}')
+        columns = ", ".join(f'"{c}"' for c in proposal.columns)
+        upgrade.append(f"        # weight {proposal.weight:g}: {proposal.reasons[0][:80]}")
+        upgrade.append("        op.create_index(")
+        upgrade.append(f'            "{proposal.name}",')
+        upgrade.append(f'            "{proposal.table}",')
+        upgrade.append(f"            [{columns}],")
+        for option in options:
+            upgrade.append(f"            {option},")
+        upgrade.append("            if_not_exists=True,")
+        upgrade.append("        )")
+        downgrade.append("        op.drop_index(")
+        downgrade.append(f'            "{proposal.name}",')
+        downgrade.append(f'            table_name="{proposal.table}",')
+        downgrade.append("            postgresql_concurrently=True,")
+        downgrade.append("            if_exists=True,")
+        downgrade.append("        )")
+
+    if not proposals:
+        upgrade = ["    pass"]
+        downgrade = ["    pass"]
+
+    down = f"'{down_revision}'" if down_revision else "None"
+    return "\n".join(
+        [
+            '"""Add indexes proposed by the index advisor',
+            "",
+            f"Revision ID: {revision}",
+            f"Revises: {down_revision or ''}",
+            f"Create Date: {create_date}",
+            "",
+            '"""',
+            "from alembic import op",
+            "import sqlalchemy as sa",
+            "",
+            "# revision identifiers, used by Alembic.",
+            f"revision = '{revision}'",
+            f"down_revision = {down}",
+            "branch_labels = None",
+            "depends_on = None",
+            "",
+            "",
+            "def upgrade() -> None:",
+            *upgrade,
+            "",
+            "",
+            "def downgrade() -> None:",
+            *downgrade,
+            "",
+        ]
+    )
@@ -0,0 +1,68 @@
+"""
+Lightweight in-process metrics primitives.
+
+These back the ``/internal`` diagnostics endpoints. Values are per worker
+process; nothing is exported to an external system.
+"""
+
+import bisect
+import threading
+from typing import Dict, List, Sequence
+
+# Default latency buckets in milliseconds
+DEFAULT_BUCKETS_MS: Sequence[float] = (
+    1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000
+)
+
+
+class Histogram:
+    """Cumulative histogram with fixed upper bounds."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets: List[float] = sorted(buckets)
+        self._counts: List[int] = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record a single observation."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def reset(self) -> None:
+        """Drop all observations."""
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._sum = 0.0
+            self._max = 0.0
+
+    def snapshot(self) -> Dict[str, object]:
+        """Return count, sum, max and cumulative bucket counts."""
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+            maximum = self._max
+
+        cumulative: Dict[str, int] = {}
+        running = 0
+        for bound, n in zip(self.buckets, counts):
+            running += n
+            cumulative[f"le_{bound:g}"] = running
+        cumulative["le_inf"] = running + counts[-1]
+
+        count = cumulative["le_inf"]
+        return {
+            "count": count,
+            "sum": round(total_sum, 3),
+            "avg": round(total_sum / count, 3) if count else 0.0,
+            "max": round(maximum, 3),
+            "buckets": cumulative,
+        }
@@ -1,12 +1,21 @@
 """
-Authentication middleware for FastAPI.
+Authentication and request-processing middleware for FastAPI.
 """
-from typing import Callable, List
+import hashlib
+import hmac
+import time
+from contextlib import nullcontext
+from typing import Callable, List, Optional
 
 from fastapi import Request, Response, HTTPException, status
 from fastapi.security import HTTPBearer
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from loguru import logger
+
+from app.core.config import get_settings
+from app.core.database import pin_reads_to_primary, read_from_primary
+from app.core.query_stats import route_stats, track_queries
 from app.core.security import verify_token
 
 
@@ -143,3 +152,136 @@ def create_auth_middleware(
             )
     
     return ConfiguredAuthMiddleware
+
+
+def mark_primary_write(request: Request) -> None:
+    """
+    Record a write made through an exempt path, such as a GraphQL mutation.
+
+    The rest of the request reads from the primary, and the response sets
+    the read-your-writes pin as a REST write would.
+    """
+    request.state.primary_write = True
+    pin_reads_to_primary()
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """
+    Keep a client's reads on the primary database right after it writes.
+
+    Successful unsafe requests (POST/PUT/PATCH/DELETE) get a
+    ``read_primary_until`` cookie and an ``X-Read-Primary-Until`` header.
+    While either is presented and unexpired, ``get_read_db`` serves that
+    client from the primary instead of a possibly lagging replica.
+
+    GraphQL sends queries as POST too, so ``exempt_paths`` do not set the pin
+    by method; GraphQL mutations call ``mark_primary_write`` instead.
+
+    The pin is ``<expiry>:<hmac>``, signed with the app secret, so clients
+    cannot mint their own; expiries beyond one window are clamped anyway.
+    """
+
+    COOKIE_NAME = "read_primary_until"
+    HEADER_NAME = "X-Read-Primary-Until"
+    UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+    def __init__(
+        self,
+        app,
+        window_seconds: int = 5,
+        exempt_paths: List[str] = None,
+        secret_key: Optional[str] = None,
+    ):
+        super().__init__(app)
+        self.window_seconds = window_seconds
+        self.exempt_paths = exempt_paths if exempt_paths is not None else ["/graphql"]
+        self._secret = (secret_key or get_settings().secret_key).encode()
+
+    def _sign(self, until: str) -> str:
+        return hmac.new(self._secret, until.encode(), hashlib.sha256).hexdigest()
+
+    def _pin(self, until: float) -> str:
+        value = f"{until:.3f}"
+        return f"{value}:{self._sign(value)}"
+
+    def _pinned_until(self, request: Request) -> float:
+        """Return the pin expiry presented by the client, or 0 if unsigned."""
+        pin = request.headers.get(self.HEADER_NAME) or request.cookies.get(
+            self.COOKIE_NAME
+        )
+        value, _, signature = (pin or "").partition(":")
+        if not value or not hmac.compare_digest(signature, self._sign(value)):
+            return 0.0
+        try:
+            return min(float(value), time.time() + self.window_seconds)
+        except ValueError:
+            return 0.0
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        """Pin reads to the primary for clients that recently wrote."""
+        if self.window_seconds <= 0:
+            return await call_next(request)
+
+        pinned = self._pinned_until(request) > time.time()
+        with read_from_primary() if pinned else nullcontext():
+            response = await call_next(request)
+
+        wrote = getattr(request.state, "primary_write", False) or (
+            request.method in self.UNSAFE_METHODS
+            and not any(request.url.path.startswith(p) for p in self.exempt_paths)
+        )
+        if wrote and response.status_code < 400:
+            pin = self._pin(time.time() + self.window_seconds)
+            response.headers[self.HEADER_NAME] = pin
+            response.set_cookie(
+                self.COOKIE_NAME,
+                pin,
+                max_age=self.window_seconds,
+                httponly=True,
+                samesite="lax",
+            )
+        return response
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    """
+    Attribute SQL statements to the request that issued them.
+
+    Adds a ``Server-Timing`` header with the request's query count and
+    database time, feeds the per-route aggregates behind
+    ``/internal/db/queries`` and logs a warning when one statement shape runs
+    more than ``n_plus_one_threshold`` times in a single request.
+    """
+
+    def __init__(self, app, n_plus_one_threshold: int = 10):
+        super().__init__(app)
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        """Track queries for the duration of the request."""
+        with track_queries(
+            request.method, request.url.path, request.scope
+        ) as stats:
+            response = await call_next(request)
+
+        route_name = stats.route
+        repeated = stats.repeated_shapes(self.n_plus_one_threshold)
+        route_stats.record(route_name, stats, repeated)
+
+        timing = (
+            f'db;dur={stats.db_time_ms:.2f};desc="{stats.query_count} queries"'
+        )
+        existing = response.headers.get("Server-Timing")
+        response.headers["Server-Timing"] = (
+            f"{existing}, {timing}" if existing else timing
+        )
+
+        logger.debug(
+            f"{route_name} queries={stats.query_count} db={stats.db_time_ms:.1f}ms"
+        )
+        for shape in repeated:
+            logger.warning(
+                f"Possible N+1 on {route_name}: statement {shape['fingerprint']} "
+                f"ran {shape['count']} times: {shape['sql'][:200]}"
+            )
+        return response
@@ -0,0 +1,220 @@
+"""
+Per-request SQL instrumentation.
+
+SQLAlchemy cursor events attribute every statement to the request that is
+currently running (tracked in a contextvar), so we can report query count,
+database time and repeated statement shapes per request and per route, and
+flag N+1 patterns.
+"""
+
+import contextvars
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.slow_queries import slow_query_log
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_POSITIONAL_PARAM = re.compile(r"\$\d+|%\(\w+\)s|%s|:\w+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """Reduce a statement to its shape: literals and parameters become ``?``."""
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _POSITIONAL_PARAM.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("(?...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def _shape_id(shape: str) -> str:
+    return hashlib.sha1(shape.encode("utf-8")).hexdigest()[:12]
+
+
+def fingerprint(statement: str) -> str:
+    """Short stable identifier for a statement shape."""
+    return _shape_id(normalize_sql(statement))
+
+
+@dataclass
+class RequestQueryStats:
+    """Statements executed while serving one request."""
+
+    method: str = ""
+    path: str = ""
+    scope: Optional[Dict[str, Any]] = None
+    query_count: int = 0
+    db_time_ms: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+    @property
+    def route(self) -> str:
+        """Route template once routing has happened, else the raw path."""
+        route = (self.scope or {}).get("route")
+        return f"{self.method} {getattr(route, 'path', self.path)}".strip()
+
+    def record(self, shape: str, duration_ms: float) -> None:
+        self.query_count += 1
+        self.db_time_ms += duration_ms
+        self.shapes[shape] += 1
+
+    def repeated_shapes(self, threshold: int) -> List[Dict[str, Any]]:
+        """Statement shapes executed more than ``threshold`` times."""
+        return [
+            {"fingerprint": _shape_id(shape), "count": count, "sql": shape[:500]}
+            for shape, count in self.shapes.most_common()
+            if count > threshold
+        ]
+
+
+_current_stats: contextvars.ContextVar[Optional[RequestQueryStats]] = (
+    contextvars.ContextVar("request_query_stats", default=None)
+)
+
+
+@contextmanager
+def track_queries(
+    method: str = "", path: str = "", scope: Optional[Dict[str, Any]] = None
+) -> Iterator[RequestQueryStats]:
+    """Collect statements executed by this task (and tasks it spawns)."""
+    stats = RequestQueryStats(method=method, path=path, scope=scope)
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def get_request_stats() -> Optional[RequestQueryStats]:
+    """Stats for the current request, if one is being tracked."""
+    return _current_stats.get()
+
+
+def _before_cursor_execute(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    # Kept on the execution context, which is discarded with the statement, so
+    # a statement that fails before after_cursor_execute leaves nothing behind
+    if context is not None:
+        context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(
+    conn: Any,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    started = getattr(context, "_query_start_time", None)
+    if started is None:
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    stats = _current_stats.get()
+    slow = slow_query_log.is_slow(duration_ms)
+    if stats is None and not slow:
+        return
+
+    shape = normalize_sql(statement)
+    if stats is not None:
+        stats.record(shape, duration_ms)
+    if slow:
+        slow_query_log.record(
+            conn.engine,
+            statement,
+            parameters,
+            duration_ms,
+            shape=shape,
+            shape_id=_shape_id(shape),
+            route=stats.route if stats is not None else None,
+        )
+
+
+def instrument_engine(sync_engine: Engine) -> None:
+    """Attach cursor event hooks to ``sync_engine`` (idempotent)."""
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@dataclass
+class RouteQueryStats:
+    """Aggregated query statistics for one route."""
+
+    requests: int = 0
+    total_queries: int = 0
+    total_db_time_ms: float = 0.0
+    max_queries: int = 0
+    max_db_time_ms: float = 0.0
+    n_plus_one_requests: int = 0
+    last_repeated: List[Dict[str, Any]] = field(default_factory=list)
+
+    def as_dict(self, route: str) -> Dict[str, Any]:
+        return {
+            "route": route,
+            "requests": self.requests,
+            "avg_queries": round(self.total_queries / self.requests, 2),
+            "max_queries": self.max_queries,
+            "avg_db_time_ms": round(self.total_db_time_ms / self.requests, 3),
+            "max_db_time_ms": round(self.max_db_time_ms, 3),
+            "n_plus_one_requests": self.n_plus_one_requests,
+            "last_repeated": self.last_repeated,
+        }
+
+
+class RouteStatsRegistry:
+    """Per-route aggregates for the current worker."""
+
+    SORT_KEYS = ("avg_queries", "max_queries", "avg_db_time_ms", "max_db_time_ms")
+
+    def __init__(self) -> None:
+        self._routes: Dict[str, RouteQueryStats] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self, route: str, stats: RequestQueryStats, repeated: List[Dict[str, Any]]
+    ) -> None:
+        with self._lock:
+            entry = self._routes.setdefault(route, RouteQueryStats())
+            entry.requests += 1
+            entry.total_queries += stats.query_count
+            entry.total_db_time_ms += stats.db_time_ms
+            entry.max_queries = max(entry.max_queries, stats.query_count)
+            entry.max_db_time_ms = max(entry.max_db_time_ms, stats.db_time_ms)
+            if repeated:
+                entry.n_plus_one_requests += 1
+                entry.last_repeated = repeated
+
+    def worst(
+        self, sort_by: str = "avg_db_time_ms", limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """Routes ordered by ``sort_by``, worst first."""
+        with self._lock:
+            rows = [entry.as_dict(route) for route, entry in self._routes.items()]
+        rows.sort(key=lambda row: row[sort_by], reverse=True)
+        return rows[:limit]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+route_stats = RouteStatsRegistry()
@@ -0,0 +1,137 @@
+"""
+Adaptive rate limiting for outbound providers.
+
+``AdaptiveRateLimiter`` combines a token bucket, which bounds requests
+per second, with a semaphore, which bounds requests in flight. Callers
+over the limit wait their turn rather than fail. When the provider
+throttles us (HTTP 429, SMTP 421) the rate is cut multiplicatively. It
+then grows back additively for as long as no throttling is seen (AIMD,
+as in TCP congestion control), so the limiter settles just under
+whatever the provider will accept.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+
+class AdaptiveRateLimiter:
+    """Token bucket plus concurrency cap with AIMD rate adjustment."""
+
+    def __init__(
+        self,
+        name: str,
+        rate: float = 0.0,
+        burst: Optional[float] = None,
+        concurrency: int = 0,
+        decrease: float = 0.5,
+        recovery: float = 0.05,
+        min_rate: Optional[float] = None,
+    ):
+        """
+        ``rate`` is requests per second (0 for unlimited), ``burst`` the
+        bucket size and ``concurrency`` the in-flight cap (0 for none).
+        On throttling the rate is multiplied by ``decrease``. Each second
+        without throttling it grows back by ``recovery`` times the
+        configured rate. It never drops below ``min_rate``, which defaults
+        to 1% of the configured rate.
+        """
+        self.name = name
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.concurrency = concurrency
+        self.decrease = decrease
+        self.recovery = recovery
+        self.min_rate = min_rate if min_rate is not None else rate / 100
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._adjusted_at = self._refilled_at
+        self._cut_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+        self.waiting = 0
+        self.in_flight = 0
+        self.acquired = 0
+        self.throttled = 0
+
+    async def __aenter__(self) -> "AdaptiveRateLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.release()
+
+    async def acquire(self) -> None:
+        """Wait for a token and a concurrency slot."""
+        self.waiting += 1
+        try:
+            if self.max_rate > 0:
+                # The lock queues waiters in arrival order
+                async with self._lock:
+                    while True:
+                        self._refill()
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            break
+                        await asyncio.sleep((1 - self._tokens) / self.rate)
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.acquired += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def throttle(self) -> None:
+        """The provider pushed back: cut the rate and drain the bucket."""
+        self.throttled += 1
+        if self.max_rate <= 0:
+            return
+        now = time.monotonic()
+        # Requests already in flight get rejected too; count them as one signal
+        if now - self._cut_at < 1.0:
+            return
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self._tokens = min(self._tokens, 0.0)
+        self._cut_at = self._adjusted_at = now
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate < self.max_rate:
+            recovered = self.max_rate * self.recovery * (now - self._adjusted_at)
+            if recovered > 0:
+                self.rate = min(self.max_rate, self.rate + recovered)
+                self._adjusted_at = now
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current rate, configured limits and queue depth."""
+        return {
+            "rate": round(self.rate, 3),
+            "max_rate": self.max_rate,
+            "burst": self.burst,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+        }
+
+
+def limiter_from_settings(name: str, settings: Any) -> AdaptiveRateLimiter:
+    """Limiter for provider ``name`` from ``notification_provider_limits``."""
+    limits = getattr(settings, "notification_provider_limits", {}).get(name, {})
+    return AdaptiveRateLimiter(
+        name,
+        rate=limits.get("rate", 0.0),
+        burst=limits.get("burst"),
+        concurrency=limits.get("concurrency", 0),
+        decrease=getattr(settings, "notification_rate_decrease", 0.5),
+        recovery=getattr(settings, "notification_rate_recovery", 0.05),
+    )
@@ -0,0 +1,213 @@
+"""
+Slow-query log with sampled EXPLAIN capture.
+
+Statements slower than ``slow_query_threshold_ms`` are logged with their
+normalized SQL, bind-parameter shapes and calling route, and kept in a
+bounded in-memory ring buffer served by ``/internal/db/slow-queries``.
+A sample of them is re-planned on a separate connection so the plan is
+captured without extra tooling: plain ``SELECT`` statements with
+``EXPLAIN (ANALYZE, BUFFERS)``, everything else with plain ``EXPLAIN``.
+"""
+
+import asyncio
+import contextvars
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Set inside EXPLAIN capture tasks so their own statements are never captured
+_capturing: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "slow_query_capturing", default=False
+)
+
+# Clauses that make a SELECT lock rows or write when EXPLAIN ANALYZE runs it
+_UNSAFE_TO_ANALYZE = re.compile(
+    r"\bfor\s+(?:no\s+key\s+)?(?:update|share)\b|\bfor\s+key\s+share\b|\binto\b",
+    re.IGNORECASE,
+)
+
+
+def is_safe_to_analyze(statement: str) -> bool:
+    """
+    Whether ``EXPLAIN ANALYZE`` may execute ``statement`` a second time.
+
+    Only a plain ``SELECT`` qualifies: a ``WITH`` may hold a data-modifying
+    CTE, and ``FOR UPDATE``/``FOR SHARE`` would take real row locks while
+    the original transaction (e.g. an outbox claim) is still running.
+    """
+    sql = statement.lstrip()
+    return sql[:6].lower() == "select" and not _UNSAFE_TO_ANALYZE.search(sql)
+
+
+def parameter_shapes(parameters: Any) -> Any:
+    """Describe bind parameters by type only, never by value."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: describe the first row and the row count
+            return {"rows": len(parameters), "row": parameter_shapes(parameters[0])}
+        if len(parameters) > 20:
+            types = sorted({type(value).__name__ for value in parameters})
+            return {"count": len(parameters), "types": types}
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__ if parameters is not None else None
+
+
+class SlowQueryLog:
+    """Bounded ring buffer of slow statements for the current worker."""
+
+    def __init__(
+        self,
+        threshold_ms: float = 500.0,
+        explain_sample_rate: float = 0.1,
+        max_entries: int = 200,
+        max_concurrent_explains: int = 2,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.max_concurrent_explains = max_concurrent_explains
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+        self._explains_in_flight = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    def configure(
+        self,
+        threshold_ms: float,
+        explain_sample_rate: float,
+        max_entries: int,
+    ) -> None:
+        """Apply settings; resizing keeps the newest entries."""
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        with self._lock:
+            self._entries = deque(self._entries, maxlen=max_entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def is_slow(self, duration_ms: float) -> bool:
+        """Whether a statement of this duration should be recorded."""
+        return (
+            self.enabled and duration_ms >= self.threshold_ms and not _capturing.get()
+        )
+
+    def record(
+        self,
+        sync_engine: Engine,
+        statement: str,
+        parameters: Any,
+        duration_ms: float,
+        shape: str,
+        shape_id: str,
+        route: Optional[str],
+    ) -> None:
+        """Log a slow statement and maybe capture its plan."""
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "fingerprint": shape_id,
+            "sql": shape,
+            "parameters": parameter_shapes(parameters),
+            "route": route,
+            "plan": None,
+        }
+        with self._lock:
+            self._entries.append(entry)
+
+        logger.warning(
+            f"Slow query ({duration_ms:.1f}ms) on {route or 'background'}: "
+            f"{entry['sql'][:300]}"
+        )
+
+        executemany = (
+            isinstance(parameters, (list, tuple))
+            and bool(parameters)
+            and isinstance(parameters[0], (dict, list, tuple))
+        )
+        if (
+            sync_engine.dialect.name == "postgresql"
+            and not executemany
+            and self._should_explain()
+        ):
+            self._schedule_explain(sync_engine, statement, parameters, entry)
+
+    def _should_explain(self) -> bool:
+        return (
+            self._explains_in_flight < self.max_concurrent_explains
+            and random.random() < self.explain_sample_rate
+        )
+
+    def _schedule_explain(
+        self,
+        sync_engine: Engine,
+        statement: str,
+        parameters: Any,
+        entry: Dict[str, Any],
+    ) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        self._explains_in_flight += 1
+        # A fresh context: the EXPLAIN is not attributed to the calling request
+        task = loop.create_task(
+            self._capture_plan(AsyncEngine(sync_engine), statement, parameters, entry),
+            context=contextvars.Context(),
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _capture_plan(
+        self,
+        engine: AsyncEngine,
+        statement: str,
+        parameters: Any,
+        entry: Dict[str, Any],
+    ) -> None:
+        """Run EXPLAIN for ``statement`` on its own connection."""
+        _capturing.set(True)
+        # ANALYZE executes the statement; only do that for plain reads
+        analyze = is_safe_to_analyze(statement)
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        started = time.perf_counter()
+        try:
+            async with engine.connect() as conn:
+                result = await conn.exec_driver_sql(
+                    f"EXPLAIN ({options}) {statement}", parameters or ()
+                )
+                plan = result.scalar()
+                # Leave the transaction uncommitted; it is rolled back on close
+            entry["plan"] = json.loads(plan) if isinstance(plan, str) else plan
+            entry["plan_capture_ms"] = round(
+                (time.perf_counter() - started) * 1000, 3
+            )
+        except Exception as e:
+            logger.warning(f"EXPLAIN capture failed: {str(e)}")
+            entry["plan_error"] = str(e)
+        finally:
+            self._explains_in_flight -= 1
+
+    def entries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent slow statements, newest first."""
+        with self._lock:
+            return list(reversed(self._entries))[:limit]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog()
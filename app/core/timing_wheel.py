@@ -0,0 +1,84 @@
+"""
+Hierarchical timing wheel (Varghese & Lauck).
+
+Timers are hashed into ``levels`` wheels of ``slots`` buckets. Level ``L``
+buckets cover ``slots ** L`` ticks each. Scheduling is O(1). Each tick
+expires one bottom-level bucket, and when a lower wheel wraps the next
+bucket of the level above is re-hashed into it (cascading). The cost of a
+tick therefore does not depend on how many timers are pending, only on
+how many expire. Timers beyond the top level wait in an overflow list
+that is re-hashed once per top-level revolution.
+"""
+
+import math
+from typing import Generic, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class TimingWheel(Generic[T]):
+    """Hashed hierarchical timing wheel over a monotonically advancing clock."""
+
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 4, start: float = 0.0):
+        if slots < 2 or levels < 1:
+            raise ValueError("A timing wheel needs at least 2 slots and 1 level")
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._wheels: List[List[List[Tuple[int, T]]]] = [
+            [[] for _ in range(slots)] for _ in range(levels)
+        ]
+        self._overflow: List[Tuple[int, T]] = []
+        self._current = math.floor(start / tick)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def now(self) -> float:
+        """Time up to which the wheel has been advanced."""
+        return self._current * self.tick
+
+    def schedule(self, due: float, item: T) -> None:
+        """Fire ``item`` on the first ``advance`` to a time at or after ``due``."""
+        self._count += 1
+        # Already due: the next tick releases it
+        self._place(max(math.ceil(due / self.tick), self._current + 1), item)
+
+    def advance(self, now: float) -> List[T]:
+        """Move the clock to ``now`` and return the items that became due, in order."""
+        target = math.floor(now / self.tick)
+        expired: List[T] = []
+        while self._current < target:
+            self._current += 1
+            # Higher wheels cascade first so their timers land in lower slots in time
+            for level in range(self.levels - 1, 0, -1):
+                span = self.slots ** level
+                if self._current % span == 0:
+                    self._cascade(level, (self._current // span) % self.slots)
+            if self._current % self.slots ** self.levels == 0 and self._overflow:
+                overflow, self._overflow = self._overflow, []
+                for due_tick, item in overflow:
+                    self._place(due_tick, item)
+
+            bucket = self._wheels[0][self._current % self.slots]
+            if bucket:
+                self._wheels[0][self._current % self.slots] = []
+                expired.extend(item for _, item in bucket)
+        self._count -= len(expired)
+        return expired
+
+    def _place(self, due_tick: int, item: T) -> None:
+        delta = due_tick - self._current
+        for level in range(self.levels):
+            if delta < self.slots ** (level + 1):
+                slot = (due_tick // self.slots ** level) % self.slots
+                self._wheels[level][slot].append((due_tick, item))
+                return
+        self._overflow.append((due_tick, item))
+
+    def _cascade(self, level: int, slot: int) -> None:
+        bucket, self._wheels[level][slot] = self._wheels[level][slot], []
+        for due_tick, item in bucket:
+            self._place(due_tick, item)
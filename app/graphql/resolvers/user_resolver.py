@@ -10,7 +10,7 @@ from fastapi import HTTPException
 from sqlalchemy import select
 from strawberry.exceptions import StrawberryGraphQLError
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.graphql.types.user_type import User, UserInput
 from app.models.users.user import User as UserModel
 from app.models.users.user import UserType as UserTypeEnum
@@ -24,7 +24,7 @@ class UserQuery:
     @strawberry.field
     async def user(self, id: UUID) -> Optional[User]:
         """Get user by ID."""
-        async for db in get_db():
+        async for db in get_read_db():
             query = select(UserModel).where(UserModel.id == id)
             result = await db.execute(query)
             user_model = result.scalar_one_or_none()
@@ -38,7 +38,7 @@ class UserQuery:
     @strawberry.field
     async def users(self, skip: int = 0, limit: int = 100) -> list[User]:
         """Get list of users with pagination."""
-        async for db in get_db():
+        async for db in get_read_db():
             query = select(UserModel).offset(skip).limit(limit)
             result = await db.execute(query)
             user_models = result.scalars().all()
@@ -49,7 +49,7 @@ class UserQuery:
     @strawberry.field
     async def current_user(self, token: str) -> Optional[User]:
         """Get current authenticated user."""
-        async for db in get_db():
+        async for db in get_read_db():
             try:
                 user_model = await auth_service.get_current_user_from_token(db, token)
                 return User.from_model(user_model)
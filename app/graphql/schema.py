@@ -2,15 +2,34 @@
 GraphQL schema for Farmers Marketplace.
 """
 
-from typing import Any
+from typing import Any, Iterator
 
 import strawberry
+from strawberry.extensions import SchemaExtension
 from strawberry.fastapi import GraphQLRouter
 from strawberry.schema.schema import Schema
+from strawberry.types.graphql import OperationType
 
+from app.core.middleware import mark_primary_write
 from app.graphql.resolvers.user_resolver import UserMutation, UserQuery
 
 
+class ReadYourWritesExtension(SchemaExtension):
+    """
+    Pin the client's reads to the primary after a mutation.
+
+    ReadYourWritesMiddleware exempts ``/graphql`` because queries are POSTs
+    too, so mutations are detected here instead.
+    """
+
+    def on_execute(self) -> Iterator[None]:
+        context = self.execution_context.context
+        request = context.get("request") if isinstance(context, dict) else None
+        if request is not None and self.execution_context.operation_type == OperationType.MUTATION:
+            mark_primary_write(request)
+        yield
+
+
 @strawberry.type
 class Query(UserQuery):
     """
@@ -36,7 +55,7 @@ class Mutation(UserMutation):
 
 
 # Create the schema
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(query=Query, mutation=Mutation, extensions=[ReadYourWritesExtension])
 
 # Create GraphQL router for FastAPI
 graphql_router: GraphQLRouter[Schema, Any] = GraphQLRouter(schema)
@@ -21,10 +21,21 @@ from loguru import logger
 from app.api.auth import router as auth_router
 from app.api.users import router as users_router
 from app.api.farmers import router as farmers_router
+from app.api.internal import router as internal_router
 from app.api.notifications import router as notifications_router
 from app.core.config import get_settings
-from app.core.database import init_db
+from app.core.database import close_db, get_engine, get_session_factory, init_db
+from app.core.middleware import QueryStatsMiddleware, ReadYourWritesMiddleware
 from app.graphql.schema import graphql_router
+from app.services.auth_service import auth_service
+from app.services.notification_deferral import notification_deferrals
+from app.services.notification_digest import notification_digests
+from app.services.notification_idempotency import notification_idempotency
+from app.services.notification_lanes import lanes_from_settings
+from app.services.notification_outbox import notification_workers
+from app.services.notification_partitions import notification_partitions
+from app.services.notification_service import notification_service
+from app.services.template_registry import template_registry
 # from app.core.middleware import AuthenticationMiddleware
 
 
@@ -34,8 +45,53 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up...")
     await init_db()
     logger.info("Database initialized")
+    settings = get_settings()
+    notification_partitions.configure(
+        months_ahead=settings.notification_partition_months_ahead,
+        retention_months=settings.notification_retention_months,
+        retention_mode=settings.notification_retention_mode,
+    )
+    notification_partitions.start(
+        get_engine(), settings.notification_partition_maintenance_interval
+    )
+    notification_workers.configure(
+        concurrency=settings.notification_workers,
+        batch_size=settings.notification_batch_size,
+        poll_interval=settings.notification_poll_interval,
+        lanes=lanes_from_settings(settings),
+    )
+    await template_registry.start(
+        get_session_factory(), settings.notification_template_refresh_interval
+    )
+    await notification_service.start()
+    notification_workers.start(get_session_factory(), notification_service)
+    notification_deferrals.configure(
+        tick_seconds=settings.notification_deferral_tick,
+        batch_size=settings.notification_deferral_batch_size,
+        resync_interval=settings.notification_deferral_resync_interval,
+    )
+    notification_deferrals.start(get_session_factory())
+    notification_digests.configure(
+        window=settings.notification_digest_window,
+        categories=settings.notification_digest_categories,
+        batch_size=settings.notification_digest_batch_size,
+        flush_interval=settings.notification_digest_flush_interval,
+    )
+    notification_digests.start(get_session_factory(), notification_service)
+    notification_idempotency.configure(
+        ttl=settings.notification_idempotency_ttl,
+        cache_size=settings.notification_idempotency_cache_size,
+    )
     yield
     logger.info("Shutting down...")
+    await notification_digests.stop()
+    await notification_deferrals.stop()
+    await notification_workers.stop()
+    await notification_service.close()
+    await template_registry.stop()
+    await notification_partitions.stop()
+    auth_service.shutdown()
+    await close_db()
 
 
 # Initialize FastAPI application
@@ -58,6 +114,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Keep clients that just wrote on the primary while replicas catch up
+if settings.database_replica_urls:
+    app.add_middleware(
+        ReadYourWritesMiddleware,
+        window_seconds=settings.read_your_writes_seconds,
+        secret_key=settings.secret_key,
+    )
+
+# Per-request query count, DB time and N+1 detection
+if settings.sql_instrumentation_enabled:
+    app.add_middleware(
+        QueryStatsMiddleware,
+        n_plus_one_threshold=settings.n_plus_one_threshold,
+    )
+
 # Optional: Add authentication middleware for automatic route protection
 # Uncomment the lines below to enable automatic authentication for protected paths
 # app.add_middleware(
@@ -76,6 +147,9 @@ app.include_router(users_router, prefix="/api/users", tags=["users"])
 app.include_router(farmers_router, prefix="/api/farmers", tags=["farmers"])
 app.include_router(notifications_router, prefix="/api/notifications", tags=["notifications"])
 
+if settings.internal_api_enabled:
+    app.include_router(internal_router, prefix="/internal", tags=["internal"])
+
 
 # Basic root endpoint
 @app.get("/", tags=["root"])
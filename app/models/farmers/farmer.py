@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Float, ForeignKey, String, Text
+from sqlalchemy import Boolean, Column, Float, ForeignKey, Index, String, Text, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from uuid import UUID
 from typing import TYPE_CHECKING
@@ -12,6 +12,22 @@ if TYPE_CHECKING:
 
 class Farmer(Base):
     __tablename__ = "farmers"
+    __table_args__ = (
+        Index("ix_farmers_location_id", "location_id"),
+        # Only certified farms are ever looked up by the flag
+        Index(
+            "ix_farmers_organic_certified_partial",
+            "organic_certified",
+            postgresql_where=text("organic_certified = true"),
+        ),
+        # Substring search on farm_name (ILIKE '%...%')
+        Index(
+            "ix_farmers_farm_name_trgm",
+            "farm_name",
+            postgresql_using="gin",
+            postgresql_ops={"farm_name": "gin_trgm_ops"},
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), unique=True, nullable=False)
@@ -15,6 +15,8 @@ from .notification import (
     NotificationTemplate,
     UserNotificationPreference,
     DeviceToken,
+    NotificationDigestItem,
+    NotificationIdempotencyKey,
     NotificationType,
     NotificationCategory,
     NotificationStatus,
@@ -28,6 +30,8 @@ __all__: List[str] = [
     "NotificationTemplate", 
     "UserNotificationPreference",
     "DeviceToken",
+    "NotificationDigestItem",
+    "NotificationIdempotencyKey",
     "NotificationType",
     "NotificationCategory",
     "NotificationStatus",
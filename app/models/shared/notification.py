@@ -6,9 +6,10 @@ Supports email, push, and in-app notifications with templates and user preferenc
 
 from datetime import datetime
 from enum import Enum
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
-from sqlalchemy import JSON, Boolean, ForeignKey, String, Text
+from sqlalchemy import JSON, Boolean, ForeignKey, Index, Integer, String, Text, func, text
+from sqlalchemy.ext.hybrid import hybrid_method
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -38,6 +39,9 @@ class NotificationStatus(str, Enum):
     """Status of notification delivery."""
     
     PENDING = "pending"
+    DEFERRED = "deferred"  # Held until ``deliver_after`` (quiet hours)
+    RETRYING = "retrying"  # Failed; tried again at ``next_attempt_at``
+    DIGESTED = "digested"  # Held for, then merged into, a digest
     SENT = "sent"
     DELIVERED = "delivered"
     FAILED = "failed"
@@ -68,12 +72,42 @@ class NotificationTemplate(BaseModel):
 
 
 class Notification(BaseModel):
-    """Individual notification record."""
+    """
+    Individual notification record.
+
+    On PostgreSQL the table is partitioned by category and month (see
+    ``app.services.notification_partitions``); elsewhere it is a plain table.
+    """
     
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Serves the per-user list, unread count and stats queries
+        Index(
+            "ix_notifications_user_id_status_created_at",
+            "user_id",
+            "status",
+            "created_at",
+        ),
+        # Outbox claim: oldest pending rows first
+        Index(
+            "ix_notifications_pending",
+            "created_at",
+            postgresql_where=text("status = 'pending'"),
+            sqlite_where=text("status = 'pending'"),
+        ),
+        # Quiet-hours release: distinct due times of deferred rows
+        Index(
+            "ix_notifications_deferred",
+            "deliver_after",
+            postgresql_where=text("status = 'deferred'"),
+            sqlite_where=text("status = 'deferred'"),
+        ),
+        # Retry claim: due RETRYING rows, earliest first
+        Index("ix_notifications_status_next_attempt_at", "status", "next_attempt_at"),
+    )
     
     # Basic info
-    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"), index=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
     template_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("notification_templates.id")
     )
@@ -92,6 +126,7 @@ class Notification(BaseModel):
     
     # Delivery details
     recipient: Mapped[str] = mapped_column(String(255))  # Email, device token, etc.
+    deliver_after: Mapped[Optional[datetime]] = mapped_column()  # UTC end of quiet hours
     sent_at: Mapped[Optional[datetime]] = mapped_column()
     delivered_at: Mapped[Optional[datetime]] = mapped_column()
     read_at: Mapped[Optional[datetime]] = mapped_column()
@@ -99,6 +134,7 @@ class Notification(BaseModel):
     # Error handling
     error_message: Mapped[Optional[str]] = mapped_column(Text)
     retry_count: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column()
     
     # Relationships
     template: Mapped[Optional[NotificationTemplate]] = relationship(
@@ -107,8 +143,79 @@ class Notification(BaseModel):
     user: Mapped["User"] = relationship("User", back_populates="notifications")
 
 
+# Preference bitmask layout: one byte per notification type, bit 0 is the
+# type's master switch and bits 1-5 its categories. Stored data depends on
+# these positions, so they must never be reordered.
+_PREFERENCE_TYPE_SHIFT = {
+    NotificationType.EMAIL: 0,
+    NotificationType.PUSH: 8,
+    NotificationType.IN_APP: 16,
+}
+_PREFERENCE_CATEGORY_BIT = {
+    NotificationCategory.ORDER: 1,
+    NotificationCategory.PRODUCT: 2,
+    NotificationCategory.ACCOUNT: 3,
+    NotificationCategory.MARKETING: 4,
+    NotificationCategory.SYSTEM: 5,
+}
+# Attribute suffix per category, as exposed by the preferences API
+PREFERENCE_CATEGORY_NAMES = {
+    NotificationCategory.ORDER: "orders",
+    NotificationCategory.PRODUCT: "products",
+    NotificationCategory.ACCOUNT: "account",
+    NotificationCategory.MARKETING: "marketing",
+    NotificationCategory.SYSTEM: "system",
+}
+
+
+def preference_bit(
+    notification_type: NotificationType, category: Optional[NotificationCategory] = None
+) -> int:
+    """Bit for a type's master switch, or for one of its categories."""
+    slot = _PREFERENCE_CATEGORY_BIT[category] if category is not None else 0
+    return 1 << (_PREFERENCE_TYPE_SHIFT[notification_type] + slot)
+
+
+def required_preference_bits(
+    notification_type: NotificationType, category: NotificationCategory
+) -> int:
+    """Bits that must all be set for a notification to be sent."""
+    return preference_bit(notification_type) | preference_bit(notification_type, category)
+
+
+# Every flag on except products on push and marketing everywhere
+DEFAULT_PREFERENCE_MASK = sum(
+    preference_bit(notification_type, category)
+    for notification_type in _PREFERENCE_TYPE_SHIFT
+    for category in (None, *_PREFERENCE_CATEGORY_BIT)
+    if category != NotificationCategory.MARKETING
+    and not (notification_type == NotificationType.PUSH and category == NotificationCategory.PRODUCT)
+)
+
+
+def _preference_flag(
+    notification_type: NotificationType, category: Optional[NotificationCategory] = None
+) -> property:
+    bit = preference_bit(notification_type, category)
+
+    def get(self: "UserNotificationPreference") -> bool:
+        return bool(self.mask & bit)
+
+    def set(self: "UserNotificationPreference", value: bool) -> None:
+        self.preference_mask = self.mask | bit if value else self.mask & ~bit
+
+    return property(get, set)
+
+
 class UserNotificationPreference(BaseModel):
-    """User preferences for notifications."""
+    """
+    User preferences for notifications.
+
+    The per-type and per-category switches are stored as one integer,
+    ``preference_mask``, so gating a notification is a single bitwise AND
+    in Python (``allows``) and in SQL (``UserNotificationPreference.allows``
+    as a predicate). The boolean attributes are views over the mask.
+    """
     
     __tablename__ = "user_notification_preferences"
     
@@ -116,45 +223,123 @@ class UserNotificationPreference(BaseModel):
         ForeignKey("users.id"), unique=True, index=True
     )
     
+    preference_mask: Mapped[int] = mapped_column(
+        Integer, default=DEFAULT_PREFERENCE_MASK, server_default=str(DEFAULT_PREFERENCE_MASK)
+    )
+    
     # Email preferences
-    email_enabled: Mapped[bool] = mapped_column(Boolean, default=True)
-    email_orders: Mapped[bool] = mapped_column(Boolean, default=True)
-    email_products: Mapped[bool] = mapped_column(Boolean, default=True)
-    email_account: Mapped[bool] = mapped_column(Boolean, default=True)
-    email_marketing: Mapped[bool] = mapped_column(Boolean, default=False)
-    email_system: Mapped[bool] = mapped_column(Boolean, default=True)
+    email_enabled = _preference_flag(NotificationType.EMAIL)
+    email_orders = _preference_flag(NotificationType.EMAIL, NotificationCategory.ORDER)
+    email_products = _preference_flag(NotificationType.EMAIL, NotificationCategory.PRODUCT)
+    email_account = _preference_flag(NotificationType.EMAIL, NotificationCategory.ACCOUNT)
+    email_marketing = _preference_flag(NotificationType.EMAIL, NotificationCategory.MARKETING)
+    email_system = _preference_flag(NotificationType.EMAIL, NotificationCategory.SYSTEM)
     
     # Push preferences
-    push_enabled: Mapped[bool] = mapped_column(Boolean, default=True)
-    push_orders: Mapped[bool] = mapped_column(Boolean, default=True)
-    push_products: Mapped[bool] = mapped_column(Boolean, default=False)
-    push_account: Mapped[bool] = mapped_column(Boolean, default=True)
-    push_marketing: Mapped[bool] = mapped_column(Boolean, default=False)
-    push_system: Mapped[bool] = mapped_column(Boolean, default=True)
+    push_enabled = _preference_flag(NotificationType.PUSH)
+    push_orders = _preference_flag(NotificationType.PUSH, NotificationCategory.ORDER)
+    push_products = _preference_flag(NotificationType.PUSH, NotificationCategory.PRODUCT)
+    push_account = _preference_flag(NotificationType.PUSH, NotificationCategory.ACCOUNT)
+    push_marketing = _preference_flag(NotificationType.PUSH, NotificationCategory.MARKETING)
+    push_system = _preference_flag(NotificationType.PUSH, NotificationCategory.SYSTEM)
     
     # In-app preferences
-    in_app_enabled: Mapped[bool] = mapped_column(Boolean, default=True)
-    in_app_orders: Mapped[bool] = mapped_column(Boolean, default=True)
-    in_app_products: Mapped[bool] = mapped_column(Boolean, default=True)
-    in_app_account: Mapped[bool] = mapped_column(Boolean, default=True)
-    in_app_marketing: Mapped[bool] = mapped_column(Boolean, default=False)
-    in_app_system: Mapped[bool] = mapped_column(Boolean, default=True)
+    in_app_enabled = _preference_flag(NotificationType.IN_APP)
+    in_app_orders = _preference_flag(NotificationType.IN_APP, NotificationCategory.ORDER)
+    in_app_products = _preference_flag(NotificationType.IN_APP, NotificationCategory.PRODUCT)
+    in_app_account = _preference_flag(NotificationType.IN_APP, NotificationCategory.ACCOUNT)
+    in_app_marketing = _preference_flag(NotificationType.IN_APP, NotificationCategory.MARKETING)
+    in_app_system = _preference_flag(NotificationType.IN_APP, NotificationCategory.SYSTEM)
     
     # Quiet hours
     quiet_hours_enabled: Mapped[bool] = mapped_column(Boolean, default=False)
     quiet_hours_start: Mapped[Optional[str]] = mapped_column(String(5))  # "22:00"
     quiet_hours_end: Mapped[Optional[str]] = mapped_column(String(5))    # "08:00"
+    timezone: Mapped[Optional[str]] = mapped_column(String(64))  # IANA name; UTC if unset
     
     # Relationships
     user: Mapped["User"] = relationship("User", back_populates="notification_preferences")
+    
+    @property
+    def mask(self) -> int:
+        # Unflushed rows have no column default applied yet
+        return DEFAULT_PREFERENCE_MASK if self.preference_mask is None else self.preference_mask
+    
+    @hybrid_method
+    def allows(self, notification_type: NotificationType, category: NotificationCategory) -> bool:
+        required = required_preference_bits(notification_type, category)
+        return self.mask & required == required
+    
+    @allows.expression
+    def allows(cls, notification_type: NotificationType, category: NotificationCategory):
+        required = required_preference_bits(notification_type, category)
+        return cls.preference_mask.bitwise_and(required) == required
+
+
+class NotificationDigestItem(BaseModel):
+    """
+    A notification held for a digest.
+
+    Rows are the durable buffer of open coalescing windows, one window per
+    user, type and category. When a window's ``flush_after`` passes, its
+    held notifications are sent as one digest and the rows are deleted.
+    The notifications table is partitioned on PostgreSQL, so
+    ``notification_id`` is a plain reference rather than a foreign key.
+    """
+    
+    __tablename__ = "notification_digest_items"
+    __table_args__ = (
+        Index(
+            "ix_notification_digest_items_window",
+            "user_id",
+            "notification_type",
+            "category",
+        ),
+    )
+    
+    notification_id: Mapped[int] = mapped_column(Integer)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
+    notification_type: Mapped[NotificationType] = mapped_column(String(20))
+    category: Mapped[NotificationCategory] = mapped_column(String(50))
+    flush_after: Mapped[datetime] = mapped_column(index=True)
+
+
+class NotificationIdempotencyKey(BaseModel):
+    """
+    An idempotency key and the notifications its first request created.
+
+    Keys are scoped to the requesting user. The unique index makes a
+    retried or concurrent request with the same key fail instead of
+    creating a second notification. Notifications are partitioned, so this
+    lives in its own table and ``notification_ids`` is a plain list.
+    """
+    
+    __tablename__ = "notification_idempotency_keys"
+    __table_args__ = (
+        Index(
+            "ix_notification_idempotency_keys_requester_id_key",
+            "requester_id",
+            "key",
+            unique=True,
+        ),
+    )
+    
+    requester_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
+    key: Mapped[str] = mapped_column(String(255))
+    fingerprint: Mapped[str] = mapped_column(String(64))  # SHA-256 of the request body
+    notification_ids: Mapped[List[int]] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(default=func.now(), index=True)
 
 
 class DeviceToken(BaseModel):
     """Device tokens for push notifications."""
     
     __tablename__ = "device_tokens"
+    __table_args__ = (
+        Index("ix_device_tokens_user_id_is_active", "user_id", "is_active"),
+    )
     
-    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"), index=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
     token: Mapped[str] = mapped_column(String(500), unique=True, index=True)
     platform: Mapped[str] = mapped_column(String(20))  # "ios", "android", "web"
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
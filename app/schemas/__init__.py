@@ -13,7 +13,16 @@ TODO: Contributors should implement DTOs/schemas for:
 # from .product import ProductCreate, ProductResponse
 
 from .farmer import FarmerCreate, FarmerResponse, FarmerUpdate
-from .user import Token, TokenData, UserCreate, UserInDB, UserLogin, UserResponse
+from .user import (
+    Token,
+    TokenData,
+    UserBulkCreate,
+    UserBulkCreateResponse,
+    UserCreate,
+    UserInDB,
+    UserLogin,
+    UserResponse,
+)
 from .notification import (
     NotificationCreate,
     NotificationResponse,
@@ -31,6 +40,8 @@ __all__ = [
     "Token",
     "TokenData",
     "UserInDB",
+    "UserBulkCreate",
+    "UserBulkCreateResponse",
     # Farmer schemas
     "FarmerCreate",
     "FarmerResponse", 
@@ -5,14 +5,16 @@ Pydantic schemas for notification system.
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 import uuid
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 from app.models.shared.notification import (
     NotificationCategory,
     NotificationStatus,
     NotificationType,
 )
+from app.models.users.user import UserType
 
 
 class NotificationBase(BaseModel):
@@ -32,6 +34,7 @@ class NotificationCreate(NotificationBase):
     template_name: Optional[str] = None
     template_data: Optional[Dict[str, Any]] = None
     recipient_override: Optional[str] = None
+    idempotency_key: Optional[str] = Field(None, max_length=255)  # or the Idempotency-Key header
 
 
 class NotificationBulkCreate(BaseModel):
@@ -45,6 +48,46 @@ class NotificationBulkCreate(BaseModel):
     template_name: Optional[str] = None
     template_data: Optional[Dict[str, Any]] = None
     data: Optional[Dict[str, Any]] = None
+    idempotency_key: Optional[str] = Field(None, max_length=255)  # or the Idempotency-Key header
+
+
+class NotificationSegment(BaseModel):
+    """
+    Recipients chosen by attribute rather than by id.
+
+    Criteria are combined with AND; unset criteria match everyone. Only
+    active accounts are included. Any farmer criterion limits the segment
+    to farmers.
+    """
+    
+    user_types: Optional[List[UserType]] = None
+    is_verified: Optional[bool] = None
+    joined_after: Optional[datetime] = None
+    joined_before: Optional[datetime] = None
+    farmer_country: Optional[str] = Field(None, max_length=100)
+    farmer_state: Optional[str] = Field(None, max_length=100)
+    farmer_city: Optional[str] = Field(None, max_length=100)
+    organic_certified: Optional[bool] = None
+
+
+class NotificationSegmentCreate(BaseModel):
+    """Schema for sending a notification to a segment."""
+    
+    segment: NotificationSegment
+    notification_type: NotificationType
+    title: str = Field(..., max_length=200)
+    message: str
+    category: NotificationCategory
+    template_name: Optional[str] = None
+    template_data: Optional[Dict[str, Any]] = None
+    data: Optional[Dict[str, Any]] = None
+
+
+class NotificationSegmentResponse(BaseModel):
+    """Schema for segment send results."""
+    
+    queued: int  # notifications written, including deferred ones
+    deferred: int  # held until the recipient's quiet hours end
 
 
 class NotificationResponse(NotificationBase):
@@ -112,6 +155,17 @@ class NotificationPreferencesBase(BaseModel):
     quiet_hours_enabled: bool = False
     quiet_hours_start: Optional[str] = Field(None, pattern=r"^([01]?[0-9]|2[0-3]):[0-5][0-9]$")
     quiet_hours_end: Optional[str] = Field(None, pattern=r"^([01]?[0-9]|2[0-3]):[0-5][0-9]$")
+    timezone: Optional[str] = Field(None, max_length=64)  # IANA name, e.g. "Europe/Madrid"
+
+    @field_validator("timezone")
+    @classmethod
+    def _known_timezone(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            try:
+                ZoneInfo(value)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"Unknown timezone: {value}")
+        return value
 
 
 class NotificationPreferencesUpdate(NotificationPreferencesBase):
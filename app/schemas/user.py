@@ -3,7 +3,8 @@ User-related Pydantic schemas for API requests and responses.
 """
 
 from datetime import datetime
-from typing import Optional
+from enum import Enum
+from typing import List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
@@ -52,6 +53,39 @@ class UserInDB(UserResponse):
     password_hash: str
 
 
+class UserBulkCreate(BaseModel):
+    """Schema for bulk user provisioning."""
+
+    users: List[UserCreate] = Field(..., min_length=1)
+
+
+class UserBulkStatus(str, Enum):
+    """Outcome of a single row in a bulk provisioning request."""
+
+    CREATED = "created"
+    DUPLICATE = "duplicate"
+    FAILED = "failed"
+
+
+class UserBulkRowResult(BaseModel):
+    """Per-row report for bulk user provisioning."""
+
+    index: int
+    email: EmailStr
+    status: UserBulkStatus
+    id: Optional[UUID] = None
+    detail: Optional[str] = None
+
+
+class UserBulkCreateResponse(BaseModel):
+    """Schema for bulk user provisioning response."""
+
+    created: int
+    duplicates: int
+    failed: int
+    results: List[UserBulkRowResult]
+
+
 class Token(BaseModel):
     """Token response schema."""
 
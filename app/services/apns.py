@@ -0,0 +1,174 @@
+"""
+HTTP/2 client for the Apple Push Notification service.
+
+APNs only speaks HTTP/2, and it is built for many concurrent streams over a
+few long-lived connections rather than a connection per push. The client
+keeps ``max_connections`` connections open and lets up to ``concurrency``
+requests be in flight across them.
+
+Requests authenticate with a provider token: an ES256-signed JWT that
+Apple expects to be reused and refreshed every 20 to 60 minutes. Signing
+per request is slow and gets the provider throttled
+(``TooManyProviderTokenUpdates``), so the token is cached until
+``token_refresh`` seconds have passed.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+from jose import jwt
+from loguru import logger
+
+PRODUCTION_URL = "https://api.push.apple.com"
+SANDBOX_URL = "https://api.sandbox.push.apple.com"
+
+# Reasons meaning the device token will never be accepted again
+INVALID_TOKEN_REASONS = frozenset({"BadDeviceToken", "Unregistered", "DeviceTokenNotForTopic"})
+
+
+@dataclass
+class APNsResponse:
+    """Outcome of one push; ``reason`` is Apple's error code on failure."""
+
+    status: int
+    reason: Optional[str] = None
+    apns_id: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200
+
+
+class ProviderToken:
+    """ES256 provider JWT, signed once and reused until it is due for refresh."""
+
+    def __init__(self, key_id: str, team_id: str, private_key: str, refresh_after: float = 3000):
+        self.key_id = key_id
+        self.team_id = team_id
+        self.private_key = private_key
+        self.refresh_after = refresh_after
+        self._token: Optional[str] = None
+        self._issued_at = 0.0
+        self.signed = 0
+
+    def get(self) -> str:
+        now = time.time()
+        if self._token is None or now - self._issued_at >= self.refresh_after:
+            self._token = jwt.encode(
+                {"iss": self.team_id, "iat": int(now)},
+                self.private_key,
+                algorithm="ES256",
+                headers={"kid": self.key_id},
+            )
+            self._issued_at = now
+            self.signed += 1
+        return self._token
+
+    def invalidate(self, token: str) -> None:
+        """Force a new signature if ``token`` is still the cached one."""
+        if token == self._token:
+            self._token = None
+
+
+class APNsClient:
+    """Multiplexed HTTP/2 connection pool to APNs for one app (topic)."""
+
+    def __init__(
+        self,
+        key_id: str,
+        team_id: str,
+        bundle_id: str,
+        private_key: str,
+        use_sandbox: bool = False,
+        max_connections: int = 2,
+        concurrency: int = 200,
+        timeout: float = 10.0,
+        token_refresh: float = 3000,
+        base_url: Optional[str] = None,
+        http2: bool = True,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.bundle_id = bundle_id
+        self.base_url = base_url or (SANDBOX_URL if use_sandbox else PRODUCTION_URL)
+        self.max_connections = max_connections
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.http2 = http2
+        self.token = ProviderToken(key_id, team_id, private_key, token_refresh)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._streams: Optional[asyncio.Semaphore] = None
+
+    async def start(self) -> None:
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            # HTTP/2 only: ALPN offers just h2 over TLS, prior knowledge otherwise
+            http1=not self.http2,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+            ),
+            timeout=self.timeout,
+            transport=self._transport,
+        )
+        self._streams = asyncio.Semaphore(self.concurrency)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def send(
+        self,
+        device_token: str,
+        payload: Dict[str, Any],
+        push_type: str = "alert",
+        priority: int = 10,
+        collapse_id: Optional[str] = None,
+    ) -> APNsResponse:
+        """Send one notification; waits for a free stream when at the concurrency limit."""
+        await self.start()
+        headers = {
+            "apns-topic": self.bundle_id,
+            "apns-push-type": push_type,
+            "apns-priority": str(priority),
+        }
+        if collapse_id:
+            headers["apns-collapse-id"] = collapse_id
+
+        async with self._streams:
+            response = await self._post(device_token, payload, headers)
+            if response.reason == "ExpiredProviderToken":
+                # Clock skew or a token that outlived Apple's window: re-sign once
+                response = await self._post(device_token, payload, headers)
+        return response
+
+    async def _post(
+        self, device_token: str, payload: Dict[str, Any], headers: Dict[str, str]
+    ) -> APNsResponse:
+        token = self.token.get()
+        response = await self._client.post(
+            f"/3/device/{device_token}",
+            json=payload,
+            headers={**headers, "authorization": f"bearer {token}"},
+        )
+        apns_id = response.headers.get("apns-id")
+        if response.status_code == 200:
+            return APNsResponse(200, apns_id=apns_id)
+
+        try:
+            reason = response.json().get("reason")
+        except ValueError:
+            reason = None
+        reason = reason or f"HTTP {response.status_code}"
+        if reason == "ExpiredProviderToken":
+            self.token.invalidate(token)
+        else:
+            logger.debug(f"APNs rejected {device_token[:8]}...: {reason}")
+        return APNsResponse(response.status_code, reason, apns_id)
@@ -2,18 +2,38 @@
 Authentication service for user registration, login, and password management.
 """
 
+import asyncio
+import os
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import bcrypt
 from fastapi import HTTPException, status
 from jose import JWTError, jwt
-from sqlalchemy import select
+from loguru import logger
+from sqlalchemy import or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import get_settings
 from app.models.users.user import User
-from app.schemas.user import TokenData, UserCreate
+from app.schemas.user import (
+    TokenData,
+    UserBulkRowResult,
+    UserBulkStatus,
+    UserCreate,
+)
+
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash a chunk of passwords; runs inside a worker process."""
+    return [
+        bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        for password in passwords
+    ]
 
 
 class AuthService:
@@ -21,6 +41,7 @@ class AuthService:
 
     def __init__(self) -> None:
         self.settings = get_settings()
+        self._hash_executor: Optional[Executor] = None
 
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """Verify a plain password against its hash."""
@@ -79,6 +100,171 @@ class AuthService:
         await db.refresh(db_user)
         return db_user
 
+    def _get_hash_executor(self) -> Executor:
+        """Lazily create the process pool used for bulk password hashing."""
+        if self._hash_executor is None:
+            workers = self.settings.password_hash_workers or os.cpu_count() or 1
+            self._hash_executor = ProcessPoolExecutor(max_workers=workers)
+        return self._hash_executor
+
+    def shutdown(self) -> None:
+        """Release the password hashing pool."""
+        if self._hash_executor is not None:
+            self._hash_executor.shutdown(wait=False, cancel_futures=True)
+            self._hash_executor = None
+
+    async def hash_passwords(
+        self, passwords: List[str], executor: Optional[Executor] = None
+    ) -> List[str]:
+        """Hash many passwords in parallel without blocking the event loop."""
+        if not passwords:
+            return []
+        executor = executor or self._get_hash_executor()
+        workers = self.settings.password_hash_workers or os.cpu_count() or 1
+        chunk_size = max(1, -(-len(passwords) // workers))
+        chunks = [
+            passwords[i : i + chunk_size]
+            for i in range(0, len(passwords), chunk_size)
+        ]
+
+        loop = asyncio.get_running_loop()
+        hashed_chunks = await asyncio.gather(
+            *(loop.run_in_executor(executor, _hash_passwords, c) for c in chunks)
+        )
+        return [hashed for chunk in hashed_chunks for hashed in chunk]
+
+    async def bulk_create_users(
+        self,
+        db: AsyncSession,
+        users: List[UserCreate],
+        batch_size: Optional[int] = None,
+        executor: Optional[Executor] = None,
+    ) -> List[UserBulkRowResult]:
+        """
+        Provision many users at once.
+
+        Rows are inserted in batches with ``ON CONFLICT DO NOTHING``, so a
+        row that collides with an existing email or username is skipped by
+        the unique indexes instead of rejecting its batch. Skipped rows are
+        classified with one lookup per batch. Returns one result per input
+        row, in input order.
+        """
+        batch_size = batch_size or self.settings.bulk_user_batch_size
+        results: List[Optional[UserBulkRowResult]] = [None] * len(users)
+
+        # Duplicates inside the payload never reach the database
+        pending: List[int] = []
+        seen_emails: set[str] = set()
+        seen_usernames: set[str] = set()
+        for index, user_create in enumerate(users):
+            email = user_create.email.lower()
+            if email in seen_emails:
+                detail = "Email repeated in request"
+            elif user_create.username in seen_usernames:
+                detail = "Username repeated in request"
+            else:
+                seen_emails.add(email)
+                seen_usernames.add(user_create.username)
+                pending.append(index)
+                continue
+            results[index] = UserBulkRowResult(
+                index=index,
+                email=user_create.email,
+                status=UserBulkStatus.DUPLICATE,
+                detail=detail,
+            )
+
+        insert = (
+            postgresql.insert
+            if db.bind.dialect.name == "postgresql"
+            else sqlite.insert
+        )
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+            hashes = await self.hash_passwords(
+                [users[i].password for i in batch], executor=executor
+            )
+            rows: List[Dict[str, Any]] = [
+                {
+                    "id": uuid.uuid4(),
+                    "username": users[i].username,
+                    "email": users[i].email,
+                    "password_hash": password_hash,
+                    "user_type": users[i].user_type,
+                    "is_active": True,
+                    "is_verified": False,
+                }
+                for i, password_hash in zip(batch, hashes)
+            ]
+            statement = (
+                insert(User)
+                .values(rows)
+                .on_conflict_do_nothing()
+                .returning(User.id, User.email)
+            )
+
+            try:
+                result = await db.execute(statement)
+                inserted = {email: user_id for user_id, email in result.all()}
+                skipped = [i for i in batch if users[i].email not in inserted]
+                taken_emails, taken_usernames = await self._existing_identities(
+                    db, [users[i] for i in skipped]
+                )
+                await db.commit()
+            except IntegrityError as e:
+                # Constraints other than the unique indexes; the batch is rolled back
+                await db.rollback()
+                logger.error(f"Bulk user batch failed: {str(e.orig)}")
+                for i in batch:
+                    results[i] = UserBulkRowResult(
+                        index=i,
+                        email=users[i].email,
+                        status=UserBulkStatus.FAILED,
+                        detail="Batch rejected by database constraint",
+                    )
+                continue
+
+            for i in batch:
+                user_id = inserted.get(users[i].email)
+                if user_id is not None:
+                    detail = None
+                elif users[i].email.lower() in taken_emails:
+                    detail = "Email already registered"
+                elif users[i].username in taken_usernames:
+                    detail = "Username already taken"
+                else:
+                    detail = "Conflicts with an existing user"
+                results[i] = UserBulkRowResult(
+                    index=i,
+                    email=users[i].email,
+                    status=(
+                        UserBulkStatus.CREATED
+                        if user_id is not None
+                        else UserBulkStatus.DUPLICATE
+                    ),
+                    id=user_id,
+                    detail=detail,
+                )
+
+        return [r for r in results if r is not None]
+
+    async def _existing_identities(
+        self, db: AsyncSession, users: List[UserCreate]
+    ) -> Tuple[set[str], set[str]]:
+        """Lower-cased emails and usernames of ``users`` already registered."""
+        if not users:
+            return set(), set()
+        emails = [user.email for user in users]
+        usernames = [user.username for user in users]
+        result = await db.execute(
+            select(User.email, User.username).where(
+                or_(User.email.in_(emails), User.username.in_(usernames))
+            )
+        )
+        rows = result.all()
+        return {email.lower() for email, _ in rows}, {username for _, username in rows}
+
     def create_access_token(
         self, data: Dict[str, str], expires_delta: Optional[timedelta]
     ) -> str:
@@ -0,0 +1,204 @@
+"""
+Quiet-hours deferral for notifications.
+
+An email or push notification created inside the recipient's quiet hours
+is stored as ``DEFERRED`` with ``deliver_after`` set to the end of the
+window, in the user's own timezone. The database row is the durable
+record, and an in-process timing wheel holds the distinct release
+instants.
+
+Many users share the same window end, so the wheel holds release times,
+not rows. When an instant comes due, one worker moves every deferred row
+that is due back to ``PENDING`` in batches and wakes the outbox. Each
+tick costs the same however many messages are deferred. On startup and
+every ``resync_interval`` the wheel is rebuilt from the distinct
+``deliver_after`` values in the database, through a partial index. Times
+scheduled by other processes and anything missed while down are
+released too.
+"""
+
+import asyncio
+import time as clock
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional, Set
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from loguru import logger
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.timing_wheel import TimingWheel
+from app.models.shared.notification import Notification, NotificationStatus, NotificationType
+from app.services.notification_outbox import notification_workers
+
+# In-app notifications are silent, so quiet hours never hold them back
+DEFERRABLE_TYPES = frozenset({NotificationType.EMAIL, NotificationType.PUSH})
+
+
+def user_timezone(name: Optional[str]) -> ZoneInfo:
+    """The user's IANA timezone; unknown or missing names fall back to UTC."""
+    try:
+        return ZoneInfo(name) if name else ZoneInfo("UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+def _clock(value: str) -> time:
+    """Parse "HH:MM"; the preferences schema also allows a one-digit hour."""
+    hours, minutes = value.split(":")
+    return time(int(hours), int(minutes))
+
+
+def quiet_hours_end(
+    enabled: bool,
+    start: Optional[str],
+    end: Optional[str],
+    timezone_name: Optional[str],
+    now: Optional[datetime] = None,
+) -> Optional[datetime]:
+    """
+    When the quiet window containing ``now`` ends, as naive UTC.
+
+    ``None`` when quiet hours are off or ``now`` is outside the window.
+    ``now`` is naive UTC, like the timestamps stored on notifications.
+    """
+    if not enabled or not start or not end:
+        return None
+    tz = user_timezone(timezone_name)
+    local_now = (now or datetime.utcnow()).replace(tzinfo=timezone.utc).astimezone(tz)
+    start_time, end_time = _clock(start), _clock(end)
+    current = local_now.time().replace(tzinfo=None)
+
+    if start_time <= end_time:
+        if not start_time <= current < end_time:
+            return None
+        end_date = local_now.date()
+    else:  # Quiet hours span midnight
+        if end_time <= current < start_time:
+            return None
+        end_date = local_now.date() + timedelta(days=1 if current >= start_time else 0)
+
+    # Wall-clock end in the user's zone; a time skipped by DST maps past the gap
+    local_end = datetime.combine(end_date, end_time, tzinfo=tz)
+    return local_end.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class NotificationDeferralScheduler:
+    """Releases deferred notifications when their quiet windows end."""
+
+    def __init__(
+        self,
+        tick_seconds: float = 1.0,
+        batch_size: int = 1000,
+        resync_interval: float = 300.0,
+    ):
+        self.configure(tick_seconds, batch_size, resync_interval)
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.released = 0
+
+    def configure(self, tick_seconds: float, batch_size: int, resync_interval: float) -> None:
+        """Set the tick and batching; resets the wheel, which ``start`` refills."""
+        self.tick_seconds = tick_seconds
+        self.batch_size = batch_size
+        self.resync_interval = resync_interval
+        self._wheel: TimingWheel[datetime] = TimingWheel(tick_seconds, start=clock.time())
+        self._scheduled: Set[datetime] = set()
+
+    @property
+    def pending_releases(self) -> int:
+        """Distinct release instants waiting on the wheel."""
+        return len(self._wheel)
+
+    def schedule(self, deliver_after: datetime) -> None:
+        """Track a release instant (naive UTC); duplicates are ignored."""
+        if deliver_after in self._scheduled:
+            return
+        self._scheduled.add(deliver_after)
+        due = deliver_after.replace(tzinfo=timezone.utc).timestamp()
+        self._wheel.schedule(due, deliver_after)
+
+    def due(self, now: Optional[float] = None) -> bool:
+        """Advance the wheel; true if any release instant came due."""
+        expired = self._wheel.advance(clock.time() if now is None else now)
+        self._scheduled.difference_update(expired)
+        return bool(expired)
+
+    async def release_due(self, db: AsyncSession, now: Optional[datetime] = None) -> int:
+        """Move due deferred rows to PENDING in batches; returns how many."""
+        now = now or datetime.utcnow()
+        released = 0
+        while True:
+            batch = (
+                select(Notification.id)
+                .where(
+                    Notification.status == NotificationStatus.DEFERRED,
+                    Notification.deliver_after <= now,
+                )
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                update(Notification)
+                .where(Notification.id.in_(batch))
+                .values(status=NotificationStatus.PENDING)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            released += result.rowcount
+            if result.rowcount < self.batch_size:
+                break
+        if released:
+            self.released += released
+            notification_workers.wake()
+        return released
+
+    async def resync(self, db: AsyncSession) -> int:
+        """Schedule every distinct pending release instant found in the database."""
+        result = await db.execute(
+            select(Notification.deliver_after)
+            .where(Notification.status == NotificationStatus.DEFERRED)
+            .distinct()
+        )
+        instants = [instant for instant in result.scalars() if instant is not None]
+        for instant in instants:
+            self.schedule(instant)
+        await db.rollback()
+        return len(instants)
+
+    def start(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        if self._task is not None:
+            return
+        self._session_factory = session_factory
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run_forever(self) -> None:
+        next_resync = 0.0
+        while True:
+            try:
+                if clock.monotonic() >= next_resync:
+                    async with self._session_factory() as db:
+                        await self.resync(db)
+                    next_resync = clock.monotonic() + self.resync_interval
+                if self.due():
+                    async with self._session_factory() as db:
+                        released = await self.release_due(db)
+                    if released:
+                        logger.info(f"Released {released} notifications deferred by quiet hours")
+            except Exception as e:
+                logger.error(f"Notification deferral tick failed: {str(e)}")
+            await asyncio.sleep(self.tick_seconds)
+
+
+notification_deferrals = NotificationDeferralScheduler()
@@ -0,0 +1,254 @@
+"""
+Digest coalescing for notifications.
+
+Busy users, farmers above all, can get many order and product
+notifications an hour. Each email or push in a coalescing category opens
+a window of ``window`` seconds for its user, type and category. The first
+notification is sent as usual. Any that arrive while the window is open
+are stored as ``DIGESTED`` and buffered in ``notification_digest_items``
+until the window ends. Then they go out as one digest notification
+rendered from the digest template. A window that holds only one item
+sends that notification unchanged. The digest counts as the next send,
+so a steady stream produces at most one message per window.
+
+The buffer table is the durable state. A flusher polls it through the
+``flush_after`` index and locks due items with ``SKIP LOCKED``, so items
+held before a restart are still flushed and several processes can share
+the work.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+import uuid
+
+from loguru import logger
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.shared.notification import (
+    Notification,
+    NotificationCategory,
+    NotificationDigestItem,
+    NotificationStatus,
+    NotificationType,
+)
+from app.services.notification_outbox import notification_workers
+
+if TYPE_CHECKING:
+    from app.services.notification_service import NotificationService
+
+# Only messages that interrupt the user are worth coalescing
+DIGESTIBLE_TYPES = frozenset({NotificationType.EMAIL, NotificationType.PUSH})
+
+DigestKey = Tuple[uuid.UUID, str, str]
+
+
+class NotificationDigestBuffer:
+    """Buffers notifications per user and category, and flushes them as digests."""
+
+    def __init__(
+        self,
+        window: float = 300.0,
+        categories: Iterable[str] = (NotificationCategory.ORDER, NotificationCategory.PRODUCT),
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+    ):
+        self.configure(window, categories, batch_size, flush_interval)
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._service: Optional["NotificationService"] = None
+        self._task: Optional[asyncio.Task] = None
+        self.held = 0
+        self.digests = 0
+
+    def configure(
+        self, window: float, categories: Iterable[str], batch_size: int, flush_interval: float
+    ) -> None:
+        """Set the window and coalescing categories; a window of 0 turns coalescing off."""
+        self.window = window
+        self.categories = frozenset(NotificationCategory(category) for category in categories)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+    def applies(self, notification_type: NotificationType, category: NotificationCategory) -> bool:
+        return (
+            self.window > 0
+            and notification_type in DIGESTIBLE_TYPES
+            and category in self.categories
+        )
+
+    async def hold_until(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        notification_type: NotificationType,
+        category: NotificationCategory,
+        deliver_after: Optional[datetime] = None,
+        now: Optional[datetime] = None,
+    ) -> Optional[datetime]:
+        """
+        When a new notification should be flushed, or ``None`` to send it now.
+
+        Joins the key's open buffer if there is one. Otherwise the window
+        runs from the last notification sent for the key. Call it before
+        adding the new notification to the session.
+        """
+        if not self.applies(notification_type, category):
+            return None
+        now = now or datetime.utcnow()
+        key = (
+            NotificationDigestItem.user_id == user_id,
+            NotificationDigestItem.notification_type == notification_type,
+            NotificationDigestItem.category == category,
+        )
+        flush_after = await db.scalar(select(func.min(NotificationDigestItem.flush_after)).where(*key))
+        if flush_after is None:
+            last_sent = await db.scalar(
+                select(func.max(Notification.created_at)).where(
+                    Notification.user_id == user_id,
+                    Notification.created_at >= now - timedelta(seconds=self.window),
+                    Notification.notification_type == notification_type,
+                    Notification.category == category,
+                )
+            )
+            if last_sent is None:
+                return None
+            flush_after = last_sent + timedelta(seconds=self.window)
+        return max(flush_after, deliver_after) if deliver_after else flush_after
+
+    async def flush_due(
+        self,
+        db: AsyncSession,
+        service: "NotificationService",
+        now: Optional[datetime] = None,
+    ) -> int:
+        """Send every buffered window that has ended; returns notifications queued."""
+        now = now or datetime.utcnow()
+        queued = 0
+        while True:
+            users = (
+                await db.scalars(
+                    select(NotificationDigestItem.user_id)
+                    .where(NotificationDigestItem.flush_after <= now)
+                    .distinct()
+                    .limit(self.batch_size)
+                )
+            ).all()
+            if not users:
+                break
+            items = (
+                await db.scalars(
+                    select(NotificationDigestItem)
+                    .where(
+                        NotificationDigestItem.user_id.in_(users),
+                        NotificationDigestItem.flush_after <= now,
+                    )
+                    .order_by(NotificationDigestItem.id)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            if not items:  # another process is flushing these
+                await db.rollback()
+                break
+            queued += await self._flush(db, service, items)
+            await db.commit()
+            if len(users) < self.batch_size:
+                break
+        if queued:
+            notification_workers.wake()
+        return queued
+
+    async def _flush(
+        self,
+        db: AsyncSession,
+        service: "NotificationService",
+        items: List[NotificationDigestItem],
+    ) -> int:
+        """Queue one notification per key and drop the buffered items."""
+        windows: Dict[DigestKey, List[int]] = {}
+        for item in items:
+            key = (item.user_id, item.notification_type, item.category)
+            windows.setdefault(key, []).append(item.notification_id)
+        held = (
+            await db.scalars(
+                select(Notification)
+                .where(Notification.id.in_([item.notification_id for item in items]))
+            )
+        ).all()
+        by_id = {notification.id: notification for notification in held}
+
+        singles: List[int] = []
+        digests = []
+        for (user_id, notification_type, category), ids in windows.items():
+            notifications = [by_id[i] for i in ids if i in by_id]
+            if len(notifications) == 1:
+                singles.append(notifications[0].id)
+            elif notifications:
+                notification_type = NotificationType(notification_type)
+                category = NotificationCategory(category)
+                template, title, message = await service.render_digest(
+                    db, notification_type, category, notifications
+                )
+                digests.append({
+                    "user_id": user_id,
+                    "template_id": template.id if template else None,
+                    "notification_type": notification_type,
+                    "category": category,
+                    "status": NotificationStatus.PENDING,
+                    "title": title,
+                    "message": message,
+                    "data": {"digest_of": [notification.id for notification in notifications]},
+                    "recipient": notifications[-1].recipient,
+                })
+
+        if singles:
+            await db.execute(
+                update(Notification)
+                .where(Notification.id.in_(singles))
+                .values(status=NotificationStatus.PENDING)
+                .execution_options(synchronize_session=False)
+            )
+        if digests:
+            await db.execute(insert(Notification), digests)
+        await db.execute(
+            delete(NotificationDigestItem)
+            .where(NotificationDigestItem.id.in_([item.id for item in items]))
+            .execution_options(synchronize_session=False)
+        )
+        self.digests += len(digests)
+        return len(singles) + len(digests)
+
+    def start(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        service: "NotificationService",
+    ) -> None:
+        if self._task is not None:
+            return
+        self._session_factory = session_factory
+        self._service = service
+        self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                async with self._session_factory() as db:
+                    queued = await self.flush_due(db, self._service)
+                if queued:
+                    logger.info(f"Flushed {queued} notification digest windows")
+            except Exception as e:
+                logger.error(f"Notification digest flush failed: {str(e)}")
+            await asyncio.sleep(self.flush_interval)
+
+
+notification_digests = NotificationDigestBuffer()
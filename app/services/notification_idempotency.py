@@ -0,0 +1,163 @@
+"""
+Idempotency keys for notification creation.
+
+Webhooks retry and services double-send, so the create endpoints accept a
+key. The first request with a key writes it in the same transaction as
+its notifications, with the ids it created and a fingerprint of the body.
+A repeat returns those notifications instead of creating new ones. A
+repeat with a different body is rejected.
+
+Repeats are usually seconds apart and reach the same process, so recent
+keys are kept in an LRU. A cache hit only reads the original rows back;
+nothing is written. Other processes and restarts fall back to the
+``notification_idempotency_keys`` table. Its unique index settles
+concurrent first requests: the loser's insert fails, its transaction rolls
+back, and it returns the winner's notifications.
+
+Keys expire after ``ttl`` seconds. An expired key is replaced when it is
+reused, and expired rows are purged at most once per ``purge_interval``.
+A replay can be empty when the original notifications were deleted since;
+that is still a replay, never a reason to send again.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import uuid
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.shared.notification import Notification, NotificationIdempotencyKey
+
+
+@dataclass(frozen=True)
+class IdempotencyKey:
+    """A request's key, scoped to its requester, and its body fingerprint."""
+
+    requester_id: uuid.UUID
+    key: str
+    fingerprint: str
+
+
+class NotificationIdempotency:
+    """Recent-key cache in front of the idempotency key table."""
+
+    def __init__(
+        self, ttl: float = 86400.0, cache_size: int = 10000, purge_interval: float = 3600.0
+    ):
+        self.configure(ttl, cache_size, purge_interval)
+        self.hits = 0
+        self.replays = 0
+
+    def configure(self, ttl: float, cache_size: int, purge_interval: float = 3600.0) -> None:
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.purge_interval = purge_interval
+        # (requester_id, key) -> (fingerprint, notification ids, monotonic expiry)
+        self._recent: OrderedDict = OrderedDict()
+        self._next_purge = 0.0
+
+    @staticmethod
+    def key_for(
+        requester_id: uuid.UUID, key: Optional[str], payload: BaseModel
+    ) -> Optional[IdempotencyKey]:
+        """Scope ``key`` to the requester and fingerprint the body; ``None`` without a key."""
+        if not key:
+            return None
+        body = payload.model_dump_json(exclude={"idempotency_key"})
+        return IdempotencyKey(requester_id, key, hashlib.sha256(body.encode()).hexdigest())
+
+    async def replay(
+        self, db: AsyncSession, key: IdempotencyKey
+    ) -> Optional[List[Notification]]:
+        """The notifications created by an earlier request with ``key``, if any."""
+        cached = self._cached(key)
+        if cached is not None:
+            self.hits += 1
+            fingerprint, ids = cached
+        else:
+            record = await db.scalar(
+                select(NotificationIdempotencyKey).where(
+                    NotificationIdempotencyKey.requester_id == key.requester_id,
+                    NotificationIdempotencyKey.key == key.key,
+                )
+            )
+            if record is None:
+                return None
+            if record.created_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+                # Expired: free the key for this request
+                await db.delete(record)
+                await db.flush()
+                return None
+            fingerprint, ids = record.fingerprint, record.notification_ids
+            self.remember(key, ids, fingerprint)
+
+        if fingerprint != key.fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency key was already used with a different request"
+            )
+        self.replays += 1
+        result = await db.scalars(
+            select(Notification).where(Notification.id.in_(ids)).order_by(Notification.id)
+        )
+        return list(result.all())
+
+    async def claim(self, db: AsyncSession, key: IdempotencyKey, notification_ids: List[int]) -> None:
+        """Add the key row to the caller's transaction, before it commits."""
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.purge_interval
+            await db.execute(
+                delete(NotificationIdempotencyKey).where(
+                    NotificationIdempotencyKey.created_at
+                    < datetime.utcnow() - timedelta(seconds=self.ttl)
+                )
+            )
+        db.add(NotificationIdempotencyKey(
+            requester_id=key.requester_id,
+            key=key.key,
+            fingerprint=key.fingerprint,
+            notification_ids=notification_ids,
+        ))
+
+    def remember(
+        self, key: IdempotencyKey, notification_ids: List[int], fingerprint: Optional[str] = None
+    ) -> None:
+        """Cache a committed key."""
+        scope = (key.requester_id, key.key)
+        self._recent[scope] = (
+            fingerprint or key.fingerprint, notification_ids, time.monotonic() + self.ttl
+        )
+        self._recent.move_to_end(scope)
+        while len(self._recent) > self.cache_size:
+            self._recent.popitem(last=False)
+
+    def _cached(self, key: IdempotencyKey) -> Optional[Tuple[str, List[int]]]:
+        scope = (key.requester_id, key.key)
+        entry = self._recent.get(scope)
+        if entry is None:
+            return None
+        if entry[2] <= time.monotonic():
+            del self._recent[scope]
+            return None
+        self._recent.move_to_end(scope)
+        return entry[0], entry[1]
+
+
+def first_replayed(replayed: List[Notification]) -> Notification:
+    """The notification a single create replays; 410 if it has been deleted since."""
+    if not replayed:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="The notification created with this idempotency key no longer exists"
+        )
+    return replayed[0]
+
+
+notification_idempotency = NotificationIdempotency()
@@ -0,0 +1,223 @@
+"""
+Transactional outbox delivery for notifications.
+
+A notification row in ``PENDING`` status is the delivery job: it is written
+in the same transaction as the request that created it, so nothing is lost
+if the process dies before delivery. A pool of async workers claims
+batches with ``SELECT ... FOR UPDATE SKIP LOCKED``, delivers them and
+writes every status back with one bulk UPDATE before committing.
+
+The row locks are held while a batch is delivered. If a worker dies
+mid-batch its transaction rolls back and the rows become claimable again.
+``SKIP LOCKED`` lets any number of workers, processes and nodes share the
+queue without blocking one another.
+
+Failed deliveries wait as ``RETRYING`` rows until ``next_attempt_at``
+(see ``app.services.notification_retry``). Whenever a claim finds fewer
+pending rows than a full batch, the rest of the batch is filled with due
+retries, so fresh notifications go first and retries use the spare
+capacity.
+
+Workers claim per priority lane (see ``app.services.notification_lanes``),
+so transactional mail never waits behind a marketing send.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import Select, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.shared.notification import Notification, NotificationStatus
+from app.services.notification_lanes import (
+    DEFAULT_LANES,
+    DeliveryLane,
+    build_lanes,
+    pick_lane,
+)
+
+if TYPE_CHECKING:
+    from app.services.notification_service import NotificationService
+
+
+class NotificationWorkerPool:
+    """Pool of async workers draining the notification outbox."""
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        lanes: Optional[List[DeliveryLane]] = None,
+    ):
+        self.configure(concurrency, batch_size, poll_interval, lanes)
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._service: Optional["NotificationService"] = None
+
+    def configure(
+        self,
+        concurrency: int,
+        batch_size: int,
+        poll_interval: float,
+        lanes: Optional[List[DeliveryLane]] = None,
+    ) -> None:
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lanes = lanes or build_lanes(DEFAULT_LANES)
+        self._lane_by_category: Dict[str, DeliveryLane] = {
+            category: lane for lane in self.lanes for category in lane.categories
+        }
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def claim_statement(self, lane: Optional[DeliveryLane] = None) -> Select:
+        """Oldest pending rows (in ``lane``, if given) not already locked by another worker."""
+        statement = (
+            select(Notification)
+            .where(Notification.status == NotificationStatus.PENDING)
+            .order_by(Notification.created_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        return self._in_lane(statement, lane)
+
+    def retry_claim_statement(
+        self, limit: int, now: datetime, lane: Optional[DeliveryLane] = None
+    ) -> Select:
+        """Due retries, earliest first, via the (status, next_attempt_at) index."""
+        statement = (
+            select(Notification)
+            .where(
+                Notification.status == NotificationStatus.RETRYING,
+                Notification.next_attempt_at <= now,
+            )
+            .order_by(Notification.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return self._in_lane(statement, lane)
+
+    @staticmethod
+    def _in_lane(statement: Select, lane: Optional[DeliveryLane]) -> Select:
+        if lane is None:
+            return statement
+        # A constant category list lets PostgreSQL prune to the lane's partitions
+        return statement.where(Notification.category.in_(sorted(lane.categories)))
+
+    async def claim_and_deliver(
+        self,
+        db: AsyncSession,
+        service: "NotificationService",
+        lane: Optional[DeliveryLane] = None,
+    ) -> int:
+        """Claim one batch, deliver it and record the outcomes; returns its size."""
+        result = await db.execute(self.claim_statement(lane))
+        batch = list(result.scalars().all())
+        if len(batch) < self.batch_size:
+            result = await db.execute(
+                self.retry_claim_statement(self.batch_size - len(batch), datetime.utcnow(), lane)
+            )
+            batch.extend(result.scalars().all())
+        if not batch:
+            await db.rollback()
+            return 0
+
+        # When each row became due, read before the status write-back
+        due_at = {
+            n.id: max(filter(None, (n.created_at, n.deliver_after, n.next_attempt_at)))
+            for n in batch
+        }
+        updates = await service.deliver_batch(db, batch)
+        await db.execute(update(Notification), updates)
+        await db.commit()
+
+        sent_at = datetime.utcnow()
+        categories = {n.id: n.category for n in batch}
+        for outcome in updates:
+            if outcome["status"] == NotificationStatus.SENT:
+                self._lane_by_category[categories[outcome["id"]]].observe(
+                    max(0.0, (sent_at - due_at[outcome["id"]]).total_seconds())
+                )
+        return len(batch)
+
+    def lane_status(self) -> Dict[str, Dict[str, object]]:
+        """Budget, load and latency SLO attainment per lane."""
+        return {lane.name: lane.snapshot() for lane in self.lanes}
+
+    def start(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        service: "NotificationService",
+    ) -> None:
+        """Start ``concurrency`` workers on the running loop."""
+        if self.running or self.concurrency <= 0:
+            return
+        self._session_factory = session_factory
+        self._service = service
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(n), name=f"notification-worker-{n}")
+            for n in range(self.concurrency)
+        ]
+        logger.info(
+            f"Started {self.concurrency} notification workers "
+            f"(batch size {self.batch_size})"
+        )
+
+    async def stop(self) -> None:
+        """Let workers finish their current batch, then stop them."""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self) -> None:
+        """Signal that new notifications are pending."""
+        for lane in self.lanes:
+            lane.idle = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _worker(self, index: int) -> None:
+        while not self._stopping:
+            lane = pick_lane(self.lanes)
+            if lane is None:
+                # Every lane is empty or at its budget: wait for work or a free slot
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    for idle_lane in self.lanes:
+                        idle_lane.idle = False
+                if not self._stopping:
+                    self._wakeup.clear()
+                continue
+
+            processed = 0
+            lane.in_flight += 1
+            try:
+                async with self._session_factory() as db:
+                    processed = await self.claim_and_deliver(db, self._service, lane)
+            except Exception as e:
+                logger.error(f"Notification worker {index} failed on lane {lane.name}: {str(e)}")
+            finally:
+                lane.in_flight -= 1
+            lane.batches += bool(processed)
+            # A short batch means the lane is drained until the next wake
+            if processed < self.batch_size:
+                lane.idle = True
+            # A slot freed up; let a waiting worker look again
+            self._wakeup.set()
+
+
+notification_workers = NotificationWorkerPool()
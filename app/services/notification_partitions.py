@@ -0,0 +1,245 @@
+"""
+Partition maintenance and retention for the notifications table.
+
+On PostgreSQL, migration 004 makes ``notifications`` LIST-partitioned by
+category, with each category RANGE-partitioned by month on ``created_at``::
+
+    notifications
+      notifications_order              FOR VALUES IN ('order')
+        notifications_order_2026_10    October 2026
+        notifications_order_default
+      ...
+      notifications_other              DEFAULT
+
+Monthly partitions are created ahead of time, and retention removes whole
+expired partitions per category (``DETACH`` then optionally ``DROP``)
+instead of deleting rows. On other databases (SQLite in development and
+tests) ``notifications`` stays a plain table and retention falls back to a
+single ``DELETE`` per category.
+"""
+
+import asyncio
+import re
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.models.shared.notification import NotificationCategory
+
+_MONTH_SUFFIX = re.compile(r"_(\d{4})_(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month ``months`` after ``month``."""
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def category_table(category: str) -> str:
+    return f"notifications_{category}"
+
+
+def partition_name(category: str, month: date) -> str:
+    return f"{category_table(category)}_{month:%Y_%m}"
+
+
+def planned_partitions(today: date, months_ahead: int) -> List[Tuple[str, str, date, date]]:
+    """``(category, name, start, end)`` for the current and upcoming months."""
+    current = month_start(today)
+    planned = []
+    for category in NotificationCategory:
+        for offset in range(months_ahead + 1):
+            start = add_months(current, offset)
+            planned.append(
+                (
+                    category.value,
+                    partition_name(category.value, start),
+                    start,
+                    add_months(start, 1),
+                )
+            )
+    return planned
+
+
+def expired_partitions(
+    names: List[str], retention_months: int, today: date
+) -> List[str]:
+    """
+    Partitions entirely older than the retention window.
+
+    ``retention_months`` full months before the current one are kept, so a
+    partition only expires once every row in it is past retention.
+    """
+    cutoff = add_months(month_start(today), -retention_months)
+    expired = []
+    for name in names:
+        match = _MONTH_SUFFIX.search(name)
+        if match and date(int(match.group(1)), int(match.group(2)), 1) < cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+class NotificationPartitionManager:
+    """Creates upcoming partitions and applies per-category retention."""
+
+    def __init__(
+        self,
+        months_ahead: int = 3,
+        retention_months: Optional[Dict[str, int]] = None,
+        retention_mode: str = "detach",
+    ):
+        self.configure(months_ahead, retention_months or {}, retention_mode)
+        self._task: Optional[asyncio.Task] = None
+
+    def configure(
+        self,
+        months_ahead: int,
+        retention_months: Dict[str, int],
+        retention_mode: str,
+    ) -> None:
+        if retention_mode not in ("drop", "detach"):
+            raise ValueError("retention_mode must be 'drop' or 'detach'")
+        # Category names become table names, so only known ones are accepted
+        unknown = set(retention_months) - {c.value for c in NotificationCategory}
+        if unknown:
+            raise ValueError(f"Unknown notification categories: {', '.join(sorted(unknown))}")
+        self.months_ahead = months_ahead
+        self.retention_months = dict(retention_months)
+        self.retention_mode = retention_mode
+
+    async def is_partitioned(self, conn: AsyncConnection) -> bool:
+        """Whether ``notifications`` is a partitioned table."""
+        if conn.dialect.name != "postgresql":
+            return False
+        result = await conn.execute(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+                "JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = 'notifications')"
+            )
+        )
+        return bool(result.scalar())
+
+    async def _child_partitions(self, conn: AsyncConnection, parent: str) -> List[str]:
+        result = await conn.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits i "
+                "JOIN pg_class parent ON parent.oid = i.inhparent "
+                "JOIN pg_class child ON child.oid = i.inhrelid "
+                "WHERE parent.relname = :parent"
+            ),
+            {"parent": parent},
+        )
+        return [row[0] for row in result]
+
+    async def ensure_partitions(
+        self, conn: AsyncConnection, today: Optional[date] = None
+    ) -> List[str]:
+        """Create missing monthly partitions; returns the ones created."""
+        if not await self.is_partitioned(conn):
+            return []
+
+        today = today or datetime.utcnow().date()
+        created = []
+        existing: Dict[str, List[str]] = {}
+        for category, name, start, end in planned_partitions(today, self.months_ahead):
+            if category not in existing:
+                existing[category] = await self._child_partitions(
+                    conn, category_table(category)
+                )
+            if name in existing[category]:
+                continue
+            try:
+                # A savepoint keeps one conflicting month from aborting the rest
+                async with conn.begin_nested():
+                    await conn.execute(
+                        text(
+                            f"CREATE TABLE IF NOT EXISTS {name} "
+                            f"PARTITION OF {category_table(category)} "
+                            f"FOR VALUES FROM ('{start.isoformat()}') "
+                            f"TO ('{end.isoformat()}')"
+                        )
+                    )
+                created.append(name)
+            except Exception as e:
+                # Usually rows for that month already landed in the default partition
+                logger.error(f"Failed to create partition {name}: {str(e)}")
+        if created:
+            logger.info(f"Created notification partitions: {', '.join(created)}")
+        return created
+
+    async def apply_retention(
+        self, conn: AsyncConnection, today: Optional[date] = None
+    ) -> List[str]:
+        """Remove expired notifications per category; returns what was removed."""
+        today = today or datetime.utcnow().date()
+        removed = []
+
+        if not await self.is_partitioned(conn):
+            # Plain-table fallback: one set-based DELETE per category
+            for category, months in self.retention_months.items():
+                cutoff = add_months(month_start(today), -months)
+                result = await conn.execute(
+                    text(
+                        "DELETE FROM notifications "
+                        "WHERE category = :category AND created_at < :cutoff"
+                    ),
+                    {"category": category, "cutoff": datetime.combine(cutoff, datetime.min.time())},
+                )
+                if result.rowcount:
+                    removed.append(f"{category}: {result.rowcount} rows")
+            return removed
+
+        for category, months in self.retention_months.items():
+            parent = category_table(category)
+            names = await self._child_partitions(conn, parent)
+            for name in expired_partitions(names, months, today):
+                await conn.execute(text(f"ALTER TABLE {parent} DETACH PARTITION {name}"))
+                if self.retention_mode == "drop":
+                    await conn.execute(text(f"DROP TABLE {name}"))
+                removed.append(name)
+        if removed:
+            action = "dropped" if self.retention_mode == "drop" else "detached"
+            logger.info(f"Notification retention {action} partitions: {', '.join(removed)}")
+        return removed
+
+    async def run_maintenance(self, engine: AsyncEngine) -> Dict[str, List[str]]:
+        """Create upcoming partitions and apply retention in one transaction."""
+        async with engine.begin() as conn:
+            created = await self.ensure_partitions(conn)
+            removed = await self.apply_retention(conn)
+        return {"created": created, "removed": removed}
+
+    def start(self, engine: AsyncEngine, interval_seconds: int) -> None:
+        """Run maintenance now and then every ``interval_seconds``."""
+        if interval_seconds <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run_forever(engine, interval_seconds))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run_forever(self, engine: AsyncEngine, interval_seconds: int) -> None:
+        while True:
+            try:
+                await self.run_maintenance(engine)
+            except Exception as e:
+                logger.error(f"Notification partition maintenance failed: {str(e)}")
+            await asyncio.sleep(interval_seconds)
+
+
+notification_partitions = NotificationPartitionManager()
@@ -0,0 +1,122 @@
+"""
+Retry scheduling for failed notification deliveries.
+
+A failed delivery with attempts left is stored as ``RETRYING`` with
+``next_attempt_at`` pushed out by exponential backoff. The delay doubles
+with each failure up to ``max_delay``. It is jittered between half and
+all of that value, so notifications that failed together, for example
+during a provider outage, do not all come back at once. Outbox workers
+claim due retries through the ``(status, next_attempt_at)`` index (see
+``NotificationWorkerPool.retry_claim_statement``). Once the attempts are
+used up the row becomes ``FAILED`` for good. Deliveries refused by an
+open circuit breaker are re-queued the same way but keep their attempts.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.shared.notification import Notification, NotificationStatus
+
+
+class RetryMetrics:
+    """Per-process counters for retry scheduling."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Zero all counters."""
+        self.scheduled = 0
+        self.exhausted = 0
+
+
+retry_metrics = RetryMetrics()
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter, bounded by an attempt limit."""
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        base_delay: float = 300.0,
+        max_delay: float = 21600.0,
+        rng: Optional[random.Random] = None,
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "RetryPolicy":
+        return cls(
+            attempts=getattr(settings, "notification_retry_attempts", 3),
+            base_delay=getattr(settings, "notification_retry_delay", 300),
+            max_delay=getattr(settings, "notification_retry_max_delay", 21600),
+        )
+
+    def delay(self, failures: int) -> float:
+        """Seconds to wait after the ``failures``-th failed attempt."""
+        ceiling = min(self.base_delay * 2 ** (failures - 1), self.max_delay)
+        return self._rng.uniform(ceiling / 2, ceiling)
+
+    def next_attempt(self, failures: int, now: datetime) -> Optional[datetime]:
+        """When to try again, or ``None`` once the attempts are used up."""
+        if failures > self.attempts:
+            retry_metrics.exhausted += 1
+            return None
+        retry_metrics.scheduled += 1
+        return now + timedelta(seconds=self.delay(failures))
+
+    def failure_update(self, notification: Notification, error: str, now: datetime) -> Dict[str, Any]:
+        """Bulk-UPDATE parameters recording a failed attempt of ``notification``."""
+        failures = notification.retry_count + 1
+        next_attempt_at = self.next_attempt(failures, now)
+        return {
+            "id": notification.id,
+            "status": NotificationStatus.RETRYING if next_attempt_at else NotificationStatus.FAILED,
+            "error_message": error,
+            "retry_count": failures,
+            "next_attempt_at": next_attempt_at,
+        }
+
+    def requeue_update(
+        self, notification: Notification, error: str, now: datetime, delay: float
+    ) -> Dict[str, Any]:
+        """
+        Re-queue a delivery that never reached the provider, keeping its attempts.
+
+        It comes back after one to two times ``delay``, spread out so the
+        queue does not rush a provider that is just recovering.
+        """
+        return {
+            "id": notification.id,
+            "status": NotificationStatus.RETRYING,
+            "error_message": error,
+            "next_attempt_at": now + timedelta(seconds=self._rng.uniform(delay, 2 * delay)),
+        }
+
+
+async def get_retry_queue_status(db: AsyncSession, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Depth of the retry queue, how much of it is due, and the oldest entry's age."""
+    now = now or datetime.utcnow()
+    result = await db.execute(
+        select(
+            func.count(),
+            func.count().filter(Notification.next_attempt_at <= now),
+            func.min(Notification.created_at),
+        ).where(Notification.status == NotificationStatus.RETRYING)
+    )
+    depth, due, oldest = result.one()
+    return {
+        "depth": depth,
+        "due": due,
+        "oldest_age_seconds": round((now - oldest).total_seconds(), 1) if oldest else 0.0,
+        "scheduled": retry_metrics.scheduled,
+        "exhausted": retry_metrics.exhausted,
+    }
@@ -6,31 +6,67 @@ Handles email, push, and in-app notifications with templates, preferences, and a
 
 import asyncio
 import json
-import smtplib
-from datetime import datetime, time
+from datetime import datetime
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from email.policy import SMTP
 from typing import Any, Dict, List, Optional, Union
 import uuid
 
 import aiohttp
 from fastapi import HTTPException, status
-from jinja2 import Template
 from loguru import logger
-from sqlalchemy import select, update
+from sqlalchemy import Row, Select, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
 from app.core.config import get_settings
+from app.core.circuit_breaker import (
+    CIRCUIT_OPEN,
+    CircuitOpenError,
+    breaker_from_settings,
+    guarded,
+)
+from app.core.rate_limiter import limiter_from_settings
+from app.models.farmers.farmer import Farmer
+from app.models.shared.location import Location
 from app.models.shared.notification import (
     DeviceToken,
     Notification,
     NotificationCategory,
+    NotificationDigestItem,
     NotificationStatus,
     NotificationTemplate,
     NotificationType,
     UserNotificationPreference,
 )
 from app.models.users.user import User
+from app.schemas.notification import NotificationSegment
+from app.services.apns import INVALID_TOKEN_REASONS, APNsClient
+from app.services.notification_deferral import (
+    DEFERRABLE_TYPES,
+    notification_deferrals,
+    quiet_hours_end,
+)
+from app.services.notification_digest import notification_digests
+from app.services.notification_idempotency import (
+    IdempotencyKey,
+    first_replayed,
+    notification_idempotency,
+)
+from app.services.notification_outbox import notification_workers
+from app.services.notification_retry import RetryPolicy
+from app.services.smtp_pool import SMTPConnectionPool, SMTPResponseError
+from app.services.template_registry import template_registry
+from app.services.template_renderer import TemplateRenderer
+from app.services.web_push import (
+    INVALID_SUBSCRIPTION_REASONS,
+    PUSH_SERVICE_HOSTS,
+    WebPushClient,
+    WebPushSubscription,
+    check_endpoint,
+)
 
 
 class EmailProvider:
@@ -43,9 +79,24 @@ class EmailProvider:
         self.smtp_username = getattr(settings, 'smtp_username', '')
         self.smtp_password = getattr(settings, 'smtp_password', '')
         self.from_email = getattr(settings, 'from_email', 'noreply@farmersmarketplace.com')
+        # Authenticated connections are kept open and reused across messages
+        self.pool = SMTPConnectionPool(
+            host=self.smtp_server,
+            port=self.smtp_port,
+            username=self.smtp_username,
+            password=self.smtp_password,
+            use_tls=getattr(settings, 'smtp_use_tls', False),
+            starttls=getattr(settings, 'smtp_starttls', True),
+            max_size=getattr(settings, 'smtp_pool_size', 4),
+            idle_timeout=getattr(settings, 'smtp_idle_timeout', 30.0),
+            timeout=getattr(settings, 'smtp_timeout', 30.0),
+        )
+        # Sends beyond the relay's rate or concurrency wait here
+        self.limiter = limiter_from_settings('smtp', settings)
+        self.breaker = breaker_from_settings('smtp', settings)
     
     async def send_email(self, to_email: str, subject: str, body: str) -> bool:
-        """Send email using SMTP."""
+        """Send email using SMTP; raises ``CircuitOpenError`` while the relay is failing."""
         try:
             msg = MIMEMultipart()
             msg['From'] = self.from_email
@@ -54,35 +105,178 @@ class EmailProvider:
             
             msg.attach(MIMEText(body, 'html'))
             
-            # Use asyncio to run SMTP in thread pool
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None, self._send_smtp_email, msg, to_email
-            )
+            async with guarded(self.breaker, self.limiter):
+                await self.pool.send_message(
+                    self.from_email, [to_email], msg.as_bytes(policy=SMTP)
+                )
+            self.breaker.record(True)
             return True
             
+        except CircuitOpenError:
+            raise
+        except SMTPResponseError as e:
+            # The relay answered; only "service not available" counts against it
+            self.breaker.record(e.code != 421)
+            if e.code == 421:  # relay is throttling us
+                self.limiter.throttle()
+            logger.error(f"Failed to send email to {to_email}: {str(e)}")
+            return False
         except Exception as e:
+            self.breaker.record(False)
             logger.error(f"Failed to send email to {to_email}: {str(e)}")
             return False
     
-    def _send_smtp_email(self, msg: MIMEMultipart, to_email: str):
-        """Send SMTP email in thread."""
-        with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-            server.starttls()
-            if self.smtp_username and self.smtp_password:
-                server.login(self.smtp_username, self.smtp_password)
-            server.send_message(msg, to_addrs=[to_email])
+    async def close(self):
+        """Close pooled SMTP connections."""
+        await self.pool.close()
 
 
 class PushProvider:
     """Push notification service provider."""
     
+    # Provider errors meaning the token will never work again
+    INVALID_TOKEN_ERRORS = (
+        frozenset({"NotRegistered", "InvalidRegistration"})
+        | INVALID_TOKEN_REASONS
+        | INVALID_SUBSCRIPTION_REASONS
+    )
+    
     def __init__(self, settings):
         self.settings = settings
         self.fcm_server_key = getattr(settings, 'fcm_server_key', '')
         self.apns_key_id = getattr(settings, 'apns_key_id', '')
         self.apns_team_id = getattr(settings, 'apns_team_id', '')
         self.apns_bundle_id = getattr(settings, 'apns_bundle_id', '')
+        self.fcm_url = getattr(settings, 'fcm_url', 'https://fcm.googleapis.com/fcm/send')
+        self.fcm_multicast_limit = getattr(settings, 'fcm_multicast_limit', 1000)
+        self.limiters = {
+            name: limiter_from_settings(name, settings) for name in ('fcm', 'apns', 'web_push')
+        }
+        self.breakers = {
+            name: breaker_from_settings(name, settings) for name in ('fcm', 'apns', 'web_push')
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._apns: Optional[APNsClient] = None
+        self._web_push: Optional[WebPushClient] = None
+    
+    async def start(self):
+        """Create the shared HTTP session; connections are kept alive between pushes."""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=getattr(self.settings, 'push_http_max_connections', 100),
+            limit_per_host=getattr(self.settings, 'push_http_max_connections_per_host', 50),
+            keepalive_timeout=getattr(self.settings, 'push_http_keepalive', 60.0),
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=getattr(self.settings, 'push_http_timeout', 15.0),
+            connect=getattr(self.settings, 'push_http_connect_timeout', 5.0),
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        apns = self._get_apns()
+        if apns is not None:
+            await apns.start()
+    
+    async def close(self):
+        """Close the shared HTTP session and APNs connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._apns is not None:
+            await self._apns.close()
+        if self._web_push is not None:
+            self._web_push.close()
+    
+    def _get_apns(self) -> Optional[APNsClient]:
+        """The APNs client, or ``None`` when no signing key is configured."""
+        if self._apns is None:
+            private_key = getattr(self.settings, 'apns_private_key', '')
+            key_path = getattr(self.settings, 'apns_key_path', '')
+            if not private_key and key_path:
+                with open(key_path) as key_file:
+                    private_key = key_file.read()
+            if not (private_key and self.apns_key_id and self.apns_team_id):
+                return None
+            self._apns = APNsClient(
+                key_id=self.apns_key_id,
+                team_id=self.apns_team_id,
+                bundle_id=self.apns_bundle_id,
+                private_key=private_key,
+                use_sandbox=getattr(self.settings, 'apns_use_sandbox', False),
+                max_connections=getattr(self.settings, 'apns_max_connections', 2),
+                concurrency=getattr(self.settings, 'apns_concurrency', 200),
+                timeout=getattr(self.settings, 'apns_timeout', 10.0),
+                token_refresh=getattr(self.settings, 'apns_token_refresh', 3000),
+                base_url=getattr(self.settings, 'apns_url', None) or None,
+            )
+        return self._apns
+    
+    def _get_web_push(self) -> Optional[WebPushClient]:
+        """The web push client, or ``None`` when no VAPID key is configured."""
+        if self._web_push is None:
+            vapid_private_key = getattr(self.settings, 'vapid_private_key', '')
+            if not vapid_private_key:
+                return None
+            self._web_push = WebPushClient(
+                vapid_private_key=vapid_private_key,
+                vapid_subject=getattr(
+                    self.settings, 'vapid_subject', 'mailto:noreply@farmersmarketplace.com'
+                ),
+                token_ttl=getattr(self.settings, 'vapid_token_ttl', 43200),
+                executor=getattr(self.settings, 'web_push_executor', 'thread'),
+                workers=getattr(self.settings, 'web_push_workers', 0),
+            )
+        return self._web_push
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Outside the app lifespan (scripts, tests) the session is created on first use
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+    
+    async def send_push_batch(
+        self,
+        platform: str,
+        device_tokens: List[str],
+        title: str,
+        body: str,
+        data: Optional[Dict] = None
+    ) -> Dict[str, Optional[str]]:
+        """
+        Send one payload to many devices on the same platform.
+
+        Returns an error per token (``None`` on success). Android tokens go
+        out as FCM multicast requests, iOS tokens as concurrent streams on
+        the shared APNs connections and web subscriptions as concurrent
+        encrypted posts.
+        """
+        if platform.lower() == 'android':
+            chunks = [
+                device_tokens[i:i + self.fcm_multicast_limit]
+                for i in range(0, len(device_tokens), self.fcm_multicast_limit)
+            ]
+            results: Dict[str, Optional[str]] = {}
+            for chunk_results in await asyncio.gather(
+                *(self._send_fcm_multicast(chunk, title, body, data) for chunk in chunks)
+            ):
+                results.update(chunk_results)
+            return results
+        if platform.lower() == 'ios':
+            return await self._send_apns_batch(device_tokens, title, body, data)
+        if platform.lower() == 'web':
+            return await self._send_web_push_batch(device_tokens, title, body, data)
+        
+        sent = await asyncio.gather(
+            *(
+                self.send_push_notification(token, platform, title, body, data)
+                for token in device_tokens
+            )
+        )
+        return {
+            token: None if ok else "Delivery failed"
+            for token, ok in zip(device_tokens, sent)
+        }
     
     async def send_push_notification(
         self, 
@@ -115,7 +309,6 @@ class PushProvider:
             logger.warning("FCM server key not configured")
             return False
         
-        url = "https://fcm.googleapis.com/fcm/send"
         headers = {
             "Authorization": f"key={self.fcm_server_key}",
             "Content-Type": "application/json"
@@ -130,25 +323,165 @@ class PushProvider:
             "data": data or {}
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, json=payload) as response:
-                return response.status == 200
+        breaker = self.breakers['fcm']
+        session = await self._get_session()
+        try:
+            async with guarded(breaker, self.limiters['fcm']):
+                async with session.post(self.fcm_url, headers=headers, json=payload) as response:
+                    await response.read()  # release the connection back to the pool
+        except CircuitOpenError:
+            return False
+        except Exception:
+            breaker.record(False)
+            raise
+        breaker.record(response.status < 500)
+        if response.status == 429:
+            self.limiters['fcm'].throttle()
+        return response.status == 200
+    
+    async def _send_fcm_multicast(
+        self, tokens: List[str], title: str, body: str, data: Optional[Dict] = None
+    ) -> Dict[str, Optional[str]]:
+        """Send one FCM request to up to ``fcm_multicast_limit`` tokens."""
+        if not self.fcm_server_key:
+            logger.warning("FCM server key not configured")
+            return {token: "FCM server key not configured" for token in tokens}
+        
+        headers = {
+            "Authorization": f"key={self.fcm_server_key}",
+            "Content-Type": "application/json"
+        }
+        
+        payload = {
+            "registration_ids": tokens,
+            "notification": {
+                "title": title,
+                "body": body
+            },
+            "data": data or {}
+        }
+        
+        limiter, breaker = self.limiters['fcm'], self.breakers['fcm']
+        try:
+            session = await self._get_session()
+            async with (
+                guarded(breaker, limiter),
+                session.post(self.fcm_url, headers=headers, json=payload) as response,
+            ):
+                raw = await response.read()
+        except CircuitOpenError:
+            return {token: CIRCUIT_OPEN for token in tokens}
+        except Exception as e:
+            breaker.record(False)
+            logger.error(f"Failed to send FCM multicast: {str(e)}")
+            return {token: str(e) for token in tokens}
+        # Recorded once, after the body is read, like the single-token path
+        breaker.record(response.status < 500)
+        if response.status != 200:
+            if response.status == 429:
+                limiter.throttle()
+            error = f"FCM returned HTTP {response.status}"
+            logger.error(f"{error} for {len(tokens)} tokens")
+            return {token: error for token in tokens}
+        try:
+            content = json.loads(raw)
+        except ValueError:
+            return {token: "Malformed FCM response" for token in tokens}
+        
+        # Results are in the same order as registration_ids
+        results = content.get("results") or []
+        if len(results) != len(tokens):
+            return {token: "Malformed FCM response" for token in tokens}
+        return {
+            token: result.get("error") if "message_id" not in result else None
+            for token, result in zip(tokens, results)
+        }
     
     async def _send_apns_notification(
         self, token: str, title: str, body: str, data: Optional[Dict] = None
     ) -> bool:
         """Send APNS notification for iOS."""
-        # This would require PyJWT and cryptography for proper APNS implementation
-        logger.info(f"APNS notification would be sent to {token}: {title}")
-        return True  # Placeholder
+        results = await self._send_apns_batch([token], title, body, data)
+        return results[token] is None
+    
+    async def _send_apns_batch(
+        self, tokens: List[str], title: str, body: str, data: Optional[Dict] = None
+    ) -> Dict[str, Optional[str]]:
+        """Send one payload to many iOS devices, multiplexed over HTTP/2."""
+        apns = self._get_apns()
+        if apns is None:
+            logger.warning("APNS credentials not configured")
+            return {token: "APNS credentials not configured" for token in tokens}
+        
+        payload = {
+            **(data or {}),
+            "aps": {"alert": {"title": title, "body": body}, "sound": "default"},
+        }
+        limiter, breaker = self.limiters['apns'], self.breakers['apns']
+        
+        async def send(token: str) -> Optional[str]:
+            try:
+                async with guarded(breaker, limiter):
+                    response = await apns.send(token, payload)
+            except CircuitOpenError:
+                return CIRCUIT_OPEN
+            except Exception as e:
+                breaker.record(False)
+                logger.error(f"Failed to send APNS notification: {str(e)}")
+                return str(e) or type(e).__name__
+            breaker.record(response.status < 500)
+            if response.status == 429:
+                limiter.throttle()
+            return None if response.ok else response.reason
+        
+        results = await asyncio.gather(*(send(token) for token in tokens))
+        return dict(zip(tokens, results))
     
     async def _send_web_push_notification(
         self, token: str, title: str, body: str, data: Optional[Dict] = None
     ) -> bool:
         """Send web push notification."""
-        # This would require pywebpush library for proper web push implementation
-        logger.info(f"Web push notification would be sent to {token}: {title}")
-        return True  # Placeholder
+        results = await self._send_web_push_batch([token], title, body, data)
+        return results[token] is None
+    
+    async def _send_web_push_batch(
+        self, tokens: List[str], title: str, body: str, data: Optional[Dict] = None
+    ) -> Dict[str, Optional[str]]:
+        """Encrypt one payload per subscription and post them concurrently."""
+        web_push = self._get_web_push()
+        if web_push is None:
+            logger.warning("VAPID key not configured")
+            return {token: "VAPID key not configured" for token in tokens}
+        
+        payload = json.dumps({"title": title, "body": body, "data": data or {}}).encode()
+        ttl = getattr(self.settings, 'web_push_ttl', 86400)
+        session = await self._get_session()
+        limiter, breaker = self.limiters['web_push'], self.breakers['web_push']
+        
+        allowed_hosts = getattr(self.settings, 'web_push_allowed_hosts', PUSH_SERVICE_HOSTS)
+        
+        async def send(token: str) -> Optional[str]:
+            try:
+                subscription = WebPushSubscription.from_token(token)
+                check_endpoint(subscription.endpoint, allowed_hosts)
+            except ValueError:
+                return "InvalidSubscription"
+            try:
+                async with guarded(breaker, limiter):
+                    error = await web_push.send(session, subscription, payload, ttl=ttl)
+            except CircuitOpenError:
+                return CIRCUIT_OPEN
+            except Exception as e:
+                breaker.record(False)
+                logger.error(f"Failed to send web push notification: {str(e)}")
+                return str(e) or type(e).__name__
+            breaker.record(not (error or "").startswith("HTTP 5"))
+            if error == "TooManyRequests":
+                limiter.throttle()
+            return error
+        
+        results = await asyncio.gather(*(send(token) for token in tokens))
+        return dict(zip(tokens, results))
 
 
 class NotificationService:
@@ -158,6 +491,32 @@ class NotificationService:
         self.settings = get_settings()
         self.email_provider = EmailProvider(self.settings)
         self.push_provider = PushProvider(self.settings)
+        self.retry_policy = RetryPolicy.from_settings(self.settings)
+        self.circuit_open_seconds = getattr(self.settings, 'notification_breaker_open_seconds', 30.0)
+        self.template_renderer = TemplateRenderer(
+            cache_size=getattr(self.settings, 'notification_template_cache_size', 256),
+            bytecode_dir=getattr(self.settings, 'notification_template_bytecode_dir', ''),
+        )
+    
+    async def start(self):
+        """Open provider connections; called on application startup."""
+        await self.push_provider.start()
+    
+    async def close(self):
+        """Release provider connections; called on application shutdown."""
+        await self.email_provider.close()
+        await self.push_provider.close()
+    
+    def delivery_limits(self) -> Dict[str, Dict[str, Any]]:
+        """Rate, concurrency, queue depth and circuit state per outbound provider."""
+        limiters = [self.email_provider.limiter, *self.push_provider.limiters.values()]
+        breakers = {
+            'smtp': self.email_provider.breaker, **self.push_provider.breakers
+        }
+        return {
+            limiter.name: {**limiter.snapshot(), 'circuit': breakers[limiter.name].snapshot()}
+            for limiter in limiters
+        }
     
     async def send_notification(
         self,
@@ -170,9 +529,16 @@ class NotificationService:
         template_name: Optional[str] = None,
         template_data: Optional[Dict[str, Any]] = None,
         data: Optional[Dict[str, Any]] = None,
-        recipient_override: Optional[str] = None
+        recipient_override: Optional[str] = None,
+        idempotency_key: Optional[IdempotencyKey] = None
     ) -> Notification:
-        """Send a notification to a user."""
+        """
+        Send a notification to a user.
+
+        With ``idempotency_key`` the key is recorded in the same transaction.
+        If a concurrent request recorded it first, that request's
+        notification is returned and nothing is created.
+        """
         
         # Get user and preferences
         user = await self._get_user_with_preferences(db, user_id)
@@ -187,10 +553,13 @@ class NotificationService:
             logger.info(f"Notification blocked by user preferences: {user_id}")
             return None
         
-        # Check quiet hours
-        if await self._is_quiet_hours(user):
-            logger.info(f"Notification delayed due to quiet hours: {user_id}")
-            # Could implement delayed sending here
+        # Hold email and push until the user's quiet hours end
+        deliver_after = self._quiet_hours_end(user.notification_preferences, notification_type)
+        
+        # Buffer it for a digest while this user and category's window is open
+        flush_after = await notification_digests.hold_until(
+            db, user_id, notification_type, category, deliver_after
+        )
         
         # Get template if specified
         template = None
@@ -199,27 +568,63 @@ class NotificationService:
             if template and template_data:
                 title, message = await self._render_template(template, template_data)
         
+        if flush_after:
+            initial_status = NotificationStatus.DIGESTED
+        elif deliver_after:
+            initial_status = NotificationStatus.DEFERRED
+        else:
+            initial_status = NotificationStatus.PENDING
+        
         # Create notification record
         notification = Notification(
             user_id=user_id,
             template_id=template.id if template else None,
             notification_type=notification_type,
             category=category,
-            status=NotificationStatus.PENDING,
+            status=initial_status,
             title=title,
             message=message,
             data=data,
-            recipient=recipient_override or await self._get_recipient(user, notification_type)
+            recipient=recipient_override or await self._get_recipient(user, notification_type),
+            deliver_after=flush_after or deliver_after,
         )
         
         db.add(notification)
-        await db.commit()
+        if flush_after or idempotency_key:
+            await db.flush()
+        if flush_after:
+            db.add(NotificationDigestItem(
+                notification_id=notification.id,
+                user_id=user_id,
+                notification_type=notification_type,
+                category=category,
+                flush_after=flush_after,
+            ))
+        if idempotency_key:
+            await notification_idempotency.claim(db, idempotency_key, [notification.id])
+        try:
+            await db.commit()
+        except IntegrityError:
+            if not idempotency_key:
+                raise
+            await db.rollback()
+            replayed = await notification_idempotency.replay(db, idempotency_key)
+            if replayed is None:
+                raise
+            return first_replayed(replayed)
         await db.refresh(notification)
+        if idempotency_key:
+            notification_idempotency.remember(idempotency_key, [notification.id])
         
-        # Send notification asynchronously
-        asyncio.create_task(
-            self._deliver_notification(db, notification)
-        )
+        if flush_after:
+            notification_digests.held += 1
+            logger.info(f"Notification held for a digest until {flush_after}: {user_id}")
+        elif deliver_after:
+            logger.info(f"Notification deferred until {deliver_after} by quiet hours: {user_id}")
+            notification_deferrals.schedule(deliver_after)
+        else:
+            # The committed PENDING row is the delivery job; wake local workers
+            notification_workers.wake()
         
         return notification
     
@@ -233,24 +638,237 @@ class NotificationService:
         message: str,
         template_name: Optional[str] = None,
         template_data: Optional[Dict[str, Any]] = None,
-        data: Optional[Dict[str, Any]] = None
+        data: Optional[Dict[str, Any]] = None,
+        idempotency_key: Optional[IdempotencyKey] = None
     ) -> List[Notification]:
-        """Send notifications to multiple users."""
-        notifications = []
+        """
+        Send notifications to multiple users.
+
+        Set-based: one query selects the recipients whose preferences allow
+        this notification, the template is rendered once, and the rows are
+        inserted with multi-row INSERTs in a single transaction. The outbox
+        workers then deliver them in batches. ``idempotency_key`` works as
+        in ``send_notification``.
+        """
+        if not user_ids:
+            return []
         
-        for user_id in user_ids:
-            try:
-                notification = await self.send_notification(
-                    db, user_id, notification_type, category, title, message,
-                    template_name, template_data, data
-                )
-                if notification:
-                    notifications.append(notification)
-            except Exception as e:
-                logger.error(f"Failed to send notification to user {user_id}: {str(e)}")
+        template = None
+        if template_name:
+            template = await self._get_template(db, template_name)
+            if template and template_data:
+                title, message = await self._render_template(template, template_data)
+        
+        result = await db.execute(
+            self._bulk_recipients_query(set(user_ids), notification_type, category)
+        )
+        recipients = result.all()
+        if not recipients:
+            return []
+        
+        rows = [
+            self._bulk_row(recipient, template, notification_type, category, title, message, data)
+            for recipient in recipients
+        ]
+        
+        notifications: List[Notification] = []
+        chunk_size = self.settings.max_bulk_notifications
+        for start in range(0, len(rows), chunk_size):
+            inserted = await db.scalars(
+                insert(Notification).returning(Notification),
+                rows[start:start + chunk_size]
+            )
+            notifications.extend(inserted.all())
+        ids = [notification.id for notification in notifications]
+        if idempotency_key:
+            await notification_idempotency.claim(db, idempotency_key, ids)
+        try:
+            await db.commit()
+        except IntegrityError:
+            if not idempotency_key:
+                raise
+            await db.rollback()
+            replayed = await notification_idempotency.replay(db, idempotency_key)
+            if replayed is None:
+                raise
+            return replayed
+        if idempotency_key:
+            notification_idempotency.remember(idempotency_key, ids)
         
+        # Many users share a window end, so this schedules a few instants
+        for deliver_after in {row["deliver_after"] for row in rows} - {None}:
+            notification_deferrals.schedule(deliver_after)
+        notification_workers.wake()
+        logger.info(
+            f"Queued {len(notifications)} {notification_type.value} notifications "
+            f"for {len(user_ids)} requested users"
+        )
         return notifications
     
+    async def send_segment_notification(
+        self,
+        db: AsyncSession,
+        read_db: AsyncSession,
+        segment: NotificationSegment,
+        notification_type: NotificationType,
+        category: NotificationCategory,
+        title: str,
+        message: str,
+        template_name: Optional[str] = None,
+        template_data: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, int]:
+        """
+        Send a notification to every user in ``segment``.
+
+        Recipients are streamed from ``read_db`` through a server-side
+        cursor, ``notification_segment_chunk_size`` rows at a time. Each
+        chunk is inserted and committed through ``db`` and the outbox
+        workers are woken, so delivery starts while later chunks are still
+        being read and memory stays flat however large the audience. The
+        cursor needs its own connection, which is why reads and writes use
+        separate sessions. A failure part-way keeps the chunks already
+        committed.
+        """
+        template = None
+        if template_name:
+            template = await self._get_template(db, template_name)
+            if template and template_data:
+                title, message = await self._render_template(template, template_data)
+        
+        chunk_size = getattr(self.settings, 'notification_segment_chunk_size', 5000)
+        query = self._segment_recipients_query(segment, notification_type, category)
+        result = await read_db.stream(query.execution_options(yield_per=chunk_size))
+        queued = deferred = 0
+        async for recipients in result.partitions():
+            rows = [
+                self._bulk_row(recipient, template, notification_type, category, title, message, data)
+                for recipient in recipients
+            ]
+            await db.execute(insert(Notification), rows)
+            await db.commit()
+            
+            release_times = {row["deliver_after"] for row in rows} - {None}
+            for deliver_after in release_times:
+                notification_deferrals.schedule(deliver_after)
+            queued += len(rows)
+            deferred += sum(row["deliver_after"] is not None for row in rows)
+            notification_workers.wake()
+        
+        logger.info(
+            f"Queued {queued} {notification_type.value} notifications for a segment "
+            f"({deferred} deferred by quiet hours)"
+        )
+        return {"queued": queued, "deferred": deferred}
+    
+    def _recipients_query(
+        self,
+        notification_type: NotificationType,
+        category: NotificationCategory
+    ) -> Select:
+        """
+        Users whose preferences allow this notification, with the
+        quiet-hours settings ``quiet_hours_end`` takes.
+        """
+        prefs = UserNotificationPreference
+        return (
+            select(
+                User.id,
+                User.email,
+                prefs.quiet_hours_enabled,
+                prefs.quiet_hours_start,
+                prefs.quiet_hours_end,
+                prefs.timezone,
+            )
+            .outerjoin(prefs, prefs.user_id == User.id)
+            .where(
+                # Users without saved preferences get everything
+                or_(prefs.id.is_(None), prefs.allows(notification_type, category))
+            )
+        )
+    
+    def _bulk_recipients_query(
+        self,
+        user_ids: set,
+        notification_type: NotificationType,
+        category: NotificationCategory
+    ) -> Select:
+        """Recipients among ``user_ids``; see ``_recipients_query``."""
+        return self._recipients_query(notification_type, category).where(User.id.in_(user_ids))
+    
+    def _segment_recipients_query(
+        self,
+        segment: NotificationSegment,
+        notification_type: NotificationType,
+        category: NotificationCategory
+    ) -> Select:
+        """Active users matching ``segment``; see ``_recipients_query``."""
+        query = self._recipients_query(notification_type, category).where(User.is_active.is_(True))
+        if segment.user_types:
+            query = query.where(User.user_type.in_(segment.user_types))
+        if segment.is_verified is not None:
+            query = query.where(User.is_verified == segment.is_verified)
+        if segment.joined_after:
+            query = query.where(User.created_at >= segment.joined_after)
+        if segment.joined_before:
+            query = query.where(User.created_at < segment.joined_before)
+        
+        places = {
+            Location.country: segment.farmer_country,
+            Location.state: segment.farmer_state,
+            Location.city: segment.farmer_city,
+        }
+        places = {column: value for column, value in places.items() if value}
+        if places or segment.organic_certified is not None:
+            query = query.join(Farmer, Farmer.user_id == User.id)
+        if segment.organic_certified is not None:
+            query = query.where(Farmer.organic_certified == segment.organic_certified)
+        if places:
+            query = query.join(Location, Location.id == Farmer.location_id).where(
+                *(func.lower(column) == value.lower() for column, value in places.items())
+            )
+        return query
+    
+    def _bulk_row(
+        self,
+        recipient: Row,
+        template: Optional[NotificationTemplate],
+        notification_type: NotificationType,
+        category: NotificationCategory,
+        title: str,
+        message: str,
+        data: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """INSERT parameters for one row of ``_recipients_query``."""
+        user_id, email, *quiet_hours = recipient
+        deliver_after = (
+            quiet_hours_end(*quiet_hours)
+            if notification_type in DEFERRABLE_TYPES else None
+        )
+        return {
+            "user_id": user_id,
+            "template_id": template.id if template else None,
+            "notification_type": notification_type,
+            "category": category,
+            "status": NotificationStatus.DEFERRED if deliver_after else NotificationStatus.PENDING,
+            "title": title,
+            "message": message,
+            "data": data,
+            "recipient": self._bulk_recipient(user_id, email, notification_type),
+            "deliver_after": deliver_after,
+        }
+    
+    @staticmethod
+    def _bulk_recipient(
+        user_id: uuid.UUID, email: str, notification_type: NotificationType
+    ) -> str:
+        """Recipient address without loading the full user."""
+        if notification_type == NotificationType.EMAIL:
+            return email
+        elif notification_type == NotificationType.IN_APP:
+            return str(user_id)
+        return ""  # PUSH: device tokens are resolved at delivery
+    
     async def mark_as_read(
         self, 
         db: AsyncSession, 
@@ -318,6 +936,29 @@ class NotificationService:
         )
         return result.scalar() or 0
     
+    async def get_unread_counts(
+        self,
+        db: AsyncSession,
+        user_ids: List[uuid.UUID]
+    ) -> Dict[uuid.UUID, int]:
+        """Get unread notification counts for many users in one query."""
+        from sqlalchemy import func
+        
+        if not user_ids:
+            return {}
+        
+        result = await db.execute(
+            select(Notification.user_id, func.count(Notification.id))
+            .where(
+                Notification.user_id.in_(set(user_ids)),
+                Notification.notification_type == NotificationType.IN_APP,
+                Notification.status != NotificationStatus.READ
+            )
+            .group_by(Notification.user_id)
+        )
+        counts = {user_id: count for user_id, count in result.all()}
+        return {user_id: counts.get(user_id, 0) for user_id in user_ids}
+    
     async def update_user_preferences(
         self,
         db: AsyncSession,
@@ -353,6 +994,17 @@ class NotificationService:
         platform: str
     ) -> DeviceToken:
         """Register device token for push notifications."""
+        if platform.lower() == "web":
+            # The server POSTs to the endpoint, so only push services are accepted
+            try:
+                subscription = WebPushSubscription.from_token(token)
+                check_endpoint(
+                    subscription.endpoint,
+                    getattr(self.settings, 'web_push_allowed_hosts', PUSH_SERVICE_HOSTS),
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
         # Deactivate existing tokens for this device
         await db.execute(
             update(DeviceToken)
@@ -381,6 +1033,7 @@ class NotificationService:
         """Get user with notification preferences."""
         result = await db.execute(
             select(User)
+            .options(joinedload(User.notification_preferences))
             .where(User.id == user_id)
         )
         return result.scalar_one_or_none()
@@ -395,45 +1048,29 @@ class NotificationService:
         if not user.notification_preferences:
             return True  # Default to sending if no preferences set
         
-        prefs = user.notification_preferences
-        
-        # Check global settings
-        if notification_type == NotificationType.EMAIL and not prefs.email_enabled:
-            return False
-        elif notification_type == NotificationType.PUSH and not prefs.push_enabled:
-            return False
-        elif notification_type == NotificationType.IN_APP and not prefs.in_app_enabled:
-            return False
-        
-        # Check category-specific settings
-        category_attr = f"{notification_type.value}_{category.value}"
-        if hasattr(prefs, category_attr):
-            return getattr(prefs, category_attr)
-        
-        return True
+        return user.notification_preferences.allows(notification_type, category)
     
-    async def _is_quiet_hours(self, user: User) -> bool:
-        """Check if current time is within user's quiet hours."""
-        if not user.notification_preferences or not user.notification_preferences.quiet_hours_enabled:
-            return False
-        
-        prefs = user.notification_preferences
-        if not prefs.quiet_hours_start or not prefs.quiet_hours_end:
-            return False
-        
-        now = datetime.now().time()
-        start_time = time.fromisoformat(prefs.quiet_hours_start)
-        end_time = time.fromisoformat(prefs.quiet_hours_end)
-        
-        if start_time <= end_time:
-            return start_time <= now <= end_time
-        else:  # Quiet hours span midnight
-            return now >= start_time or now <= end_time
+    @staticmethod
+    def _quiet_hours_end(
+        prefs: Optional[UserNotificationPreference],
+        notification_type: NotificationType
+    ) -> Optional[datetime]:
+        """UTC end of the user's current quiet hours, or None to send now."""
+        if prefs is None or notification_type not in DEFERRABLE_TYPES:
+            return None
+        return quiet_hours_end(
+            prefs.quiet_hours_enabled,
+            prefs.quiet_hours_start,
+            prefs.quiet_hours_end,
+            prefs.timezone,
+        )
     
     async def _get_template(
         self, db: AsyncSession, template_name: str
     ) -> Optional[NotificationTemplate]:
         """Get notification template by name."""
+        if template_registry.loaded:
+            return template_registry.get(template_name)
         result = await db.execute(
             select(NotificationTemplate)
             .where(
@@ -450,17 +1087,39 @@ class NotificationService:
     ) -> tuple[str, str]:
         """Render notification template with data."""
         try:
-            subject_template = Template(template.subject_template or "")
-            body_template = Template(template.body_template)
-            
-            subject = subject_template.render(**data) if template.subject_template else ""
-            body = body_template.render(**data)
-            
-            return subject, body
+            return self.template_renderer.render(template, data)
         except Exception as e:
             logger.error(f"Template rendering failed: {str(e)}")
             return "Notification", template.body_template
     
+    async def render_digest(
+        self,
+        db: AsyncSession,
+        notification_type: NotificationType,
+        category: NotificationCategory,
+        notifications: List[Notification],
+    ) -> tuple[Optional[NotificationTemplate], str, str]:
+        """Template, title and message for a digest of ``notifications``."""
+        template = await self._get_template(
+            db,
+            "notification_digest_push" if notification_type == NotificationType.PUSH
+            else "notification_digest",
+        )
+        items = [
+            {"title": n.title, "message": n.message, "created_at": n.created_at}
+            for n in notifications
+        ]
+        if template:
+            try:
+                title, message = self.template_renderer.render(
+                    template, {"category": category.value, "count": len(items), "items": items}
+                )
+                return template, title, message
+            except Exception as e:
+                logger.error(f"Digest template rendering failed: {str(e)}")
+        title = f"{len(items)} new {category.value} notifications"
+        return None, title, "\n".join(item["title"] for item in items)
+    
     async def _get_recipient(
         self, user: User, notification_type: NotificationType
     ) -> str:
@@ -473,13 +1132,142 @@ class NotificationService:
             # Would need to get active device token
             return ""
     
-    async def _deliver_notification(
-        self, db: AsyncSession, notification: Notification
-    ):
-        """Deliver notification via appropriate channel."""
+    async def deliver_batch(
+        self, db: AsyncSession, notifications: List[Notification]
+    ) -> List[Dict[str, Any]]:
+        """
+        Deliver claimed notifications concurrently.
+
+        Returns one bulk-UPDATE parameter set per notification; the caller
+        writes them back in a single statement. Failures are rescheduled by
+        ``retry_policy`` until their attempts run out; deliveries refused by
+        an open circuit breaker are re-queued without using an attempt.
+        """
+        push_user_ids = {
+            n.user_id for n in notifications
+            if n.notification_type == NotificationType.PUSH
+        }
+        device_tokens: Dict[uuid.UUID, List[DeviceToken]] = {}
+        if push_user_ids:
+            result = await db.execute(
+                select(DeviceToken)
+                .where(
+                    DeviceToken.user_id.in_(push_user_ids),
+                    DeviceToken.is_active.is_(True)
+                )
+            )
+            for device_token in result.scalars().all():
+                device_tokens.setdefault(device_token.user_id, []).append(device_token)
+        
+        pushes = [n for n in notifications if n.notification_type == NotificationType.PUSH]
+        others = [n for n in notifications if n.notification_type != NotificationType.PUSH]
+        errors, results = await asyncio.gather(
+            self._deliver_push_batch(db, pushes, device_tokens),
+            asyncio.gather(*(self._deliver_notification(n) for n in others)),
+        )
+        errors.update((n.id, error) for n, error in zip(others, results))
+        
+        sent_at = datetime.utcnow()
+        updates = []
+        for notification in notifications:
+            error = errors[notification.id]
+            if error is None:
+                updates.append({
+                    "id": notification.id,
+                    "status": NotificationStatus.SENT,
+                    "sent_at": sent_at,
+                    "error_message": None,
+                    "next_attempt_at": None,
+                })
+            elif error == CIRCUIT_OPEN:
+                # Never reached the provider: try again once it is probing
+                updates.append(self.retry_policy.requeue_update(
+                    notification, error, sent_at, self.circuit_open_seconds
+                ))
+            else:
+                updates.append(self.retry_policy.failure_update(notification, error, sent_at))
+        return updates
+    
+    async def _deliver_push_batch(
+        self,
+        db: AsyncSession,
+        notifications: List[Notification],
+        device_tokens: Dict[uuid.UUID, List[DeviceToken]],
+    ) -> Dict[int, Optional[str]]:
+        """
+        Deliver push notifications grouped by identical payload and platform.
+
+        Each group is sent with as few provider requests as the platform
+        allows. Per-token results are folded back into one error per
+        notification (``None`` if any of its devices received it), and tokens
+        the provider reports as unregistered are deactivated.
+        """
+        errors: Dict[int, Optional[str]] = {}
+        groups: Dict[tuple, Dict[str, List[int]]] = {}
+        payloads: Dict[str, Optional[Dict[str, Any]]] = {}
+        for notification in notifications:
+            tokens = device_tokens.get(notification.user_id, [])
+            if not tokens:
+                errors[notification.id] = "No active device tokens"
+                continue
+            payload_key = json.dumps(notification.data or {}, sort_keys=True, default=str)
+            payloads[payload_key] = notification.data
+            for device_token in tokens:
+                key = (
+                    device_token.platform.lower(),
+                    notification.title,
+                    notification.message,
+                    payload_key,
+                )
+                # Duplicate payloads to the same device are sent once
+                groups.setdefault(key, {}).setdefault(device_token.token, []).append(
+                    notification.id
+                )
+        if not groups:
+            return errors
+        
+        group_results = await asyncio.gather(
+            *(
+                self.push_provider.send_push_batch(
+                    platform, list(recipients), title, message, payloads[payload_key]
+                )
+                for (platform, title, message, payload_key), recipients in groups.items()
+            ),
+            return_exceptions=True,
+        )
+        
+        delivered = set()
+        invalid_tokens = set()
+        for recipients, results in zip(groups.values(), group_results):
+            if isinstance(results, Exception):
+                logger.error(f"Push batch failed: {str(results)}")
+                results = {token: str(results) for token in recipients}
+            for token, notification_ids in recipients.items():
+                error = results.get(token, "Delivery failed")
+                if error is None:
+                    delivered.update(notification_ids)
+                    continue
+                if error in PushProvider.INVALID_TOKEN_ERRORS:
+                    invalid_tokens.add(token)
+                for notification_id in notification_ids:
+                    errors.setdefault(notification_id, error)
+        
+        for notification_id in delivered:
+            errors[notification_id] = None
+        
+        if invalid_tokens:
+            await db.execute(
+                update(DeviceToken)
+                .where(DeviceToken.token.in_(invalid_tokens))
+                .values(is_active=False)
+            )
+            logger.info(f"Deactivated {len(invalid_tokens)} unregistered device tokens")
+        
+        return errors
+    
+    async def _deliver_notification(self, notification: Notification) -> Optional[str]:
+        """Deliver one email or in-app notification; returns an error message on failure."""
         try:
-            success = False
-            
             if notification.notification_type == NotificationType.EMAIL:
                 success = await self.email_provider.send_email(
                     notification.recipient,
@@ -487,47 +1275,17 @@ class NotificationService:
                     notification.message
                 )
             
-            elif notification.notification_type == NotificationType.PUSH:
-                # Get user's device tokens
-                result = await db.execute(
-                    select(DeviceToken)
-                    .where(
-                        DeviceToken.user_id == notification.user_id,
-                        DeviceToken.is_active == True
-                    )
-                )
-                device_tokens = result.scalars().all()
-                
-                for device_token in device_tokens:
-                    await self.push_provider.send_push_notification(
-                        device_token.token,
-                        device_token.platform,
-                        notification.title,
-                        notification.message,
-                        notification.data
-                    )
-                success = len(device_tokens) > 0
-            
-            elif notification.notification_type == NotificationType.IN_APP:
+            else:
                 # In-app notifications are just stored in database
                 success = True
             
-            # Update notification status
-            notification.status = NotificationStatus.SENT if success else NotificationStatus.FAILED
-            notification.sent_at = datetime.utcnow()
-            
-            if not success:
-                notification.retry_count += 1
-                notification.error_message = "Delivery failed"
-            
-            await db.commit()
-            
+            return None if success else "Delivery failed"
+        
+        except CircuitOpenError:
+            return CIRCUIT_OPEN
         except Exception as e:
             logger.error(f"Notification delivery failed: {str(e)}")
-            notification.status = NotificationStatus.FAILED
-            notification.error_message = str(e)
-            notification.retry_count += 1
-            await db.commit()
+            return str(e)
 
 
 # Global service instance
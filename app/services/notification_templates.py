@@ -4,7 +4,8 @@ Predefined notification templates for the Farmers Marketplace.
 Templates for: new orders, status updates, reminders, and system notifications.
 """
 
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, List, Tuple
 
 from app.models.shared.notification import NotificationCategory, NotificationType
 
@@ -373,30 +374,78 @@ class NotificationTemplates:
                     "feature_name": "string",
                     "feature_description": "string"
                 }
+            },
+            
+            # Digest Templates (coalesced notifications, see notification_digest)
+            {
+                "name": "notification_digest",
+                "category": NotificationCategory.SYSTEM,
+                "notification_type": NotificationType.EMAIL,
+                "subject_template": "You have {{ count }} new {{ category }} updates",
+                "body_template": """
+                <h2>{{ count }} new {{ category }} updates</h2>
+                
+                {% for item in items %}
+                <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px; margin: 10px 0;">
+                    <h3>{{ item.title }}</h3>
+                    <div>{{ item.message }}</div>
+                </div>
+                {% endfor %}
+                
+                <p>Best regards,<br>Farmers Marketplace Team</p>
+                """,
+                "variables": {
+                    "category": "string",
+                    "count": "number",
+                    "items": "list"
+                }
+            },
+            
+            {
+                "name": "notification_digest_push",
+                "category": NotificationCategory.SYSTEM,
+                "notification_type": NotificationType.PUSH,
+                "subject_template": "{{ count }} new {{ category }} updates",
+                "body_template": "{{ items | map(attribute='title') | join(' · ') }}",
+                "variables": {
+                    "category": "string",
+                    "count": "number",
+                    "items": "list"
+                }
             }
         ]
 
 
 # Template helper functions
+@lru_cache()
+def _templates_by_category() -> Dict[NotificationCategory, Tuple[Dict, ...]]:
+    """Default templates indexed by category, built once."""
+    index: Dict[NotificationCategory, List[Dict]] = {}
+    for template in NotificationTemplates.get_default_templates():
+        index.setdefault(template["category"], []).append(template)
+    return {category: tuple(templates) for category, templates in index.items()}
+
+
+def get_templates_by_category(category: NotificationCategory) -> List[Dict]:
+    """Get default templates for one category."""
+    return [dict(t) for t in _templates_by_category().get(category, ())]
+
+
 def get_order_templates() -> List[Dict]:
     """Get order-related templates."""
-    templates = NotificationTemplates.get_default_templates()
-    return [t for t in templates if t["category"] == NotificationCategory.ORDER]
+    return get_templates_by_category(NotificationCategory.ORDER)
 
 
 def get_product_templates() -> List[Dict]:
     """Get product-related templates."""
-    templates = NotificationTemplates.get_default_templates()
-    return [t for t in templates if t["category"] == NotificationCategory.PRODUCT]
+    return get_templates_by_category(NotificationCategory.PRODUCT)
 
 
 def get_account_templates() -> List[Dict]:
     """Get account-related templates."""
-    templates = NotificationTemplates.get_default_templates()
-    return [t for t in templates if t["category"] == NotificationCategory.ACCOUNT]
+    return get_templates_by_category(NotificationCategory.ACCOUNT)
 
 
 def get_system_templates() -> List[Dict]:
     """Get system-related templates."""
-    templates = NotificationTemplates.get_default_templates()
-    return [t for t in templates if t["category"] == NotificationCategory.SYSTEM]
+    return get_templates_by_category(NotificationCategory.SYSTEM)
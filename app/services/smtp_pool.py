@@ -0,0 +1,375 @@
+"""
+Native asyncio SMTP client with a pool of authenticated connections.
+
+Each connection does the TCP, TLS (implicit or STARTTLS) and AUTH handshake
+once and is then reused for many messages. When the server advertises
+PIPELINING (RFC 2920), MAIL FROM, every RCPT TO and DATA go out in one
+write and the replies are read back together, so a message costs two
+round trips instead of three or more.
+
+The pool keeps at most ``max_size`` connections. Idle connections past
+``idle_timeout`` are closed, and a connection the server dropped while
+idle is replaced transparently before the message is sent.
+"""
+
+import asyncio
+import base64
+import re
+import ssl
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+
+class SMTPError(Exception):
+    """SMTP protocol or transport failure."""
+
+
+class SMTPServerDisconnected(SMTPError):
+    """The connection was closed or timed out."""
+
+
+class SMTPResponseError(SMTPError):
+    """The server rejected a command."""
+
+    def __init__(self, code: int, message: str, command: str):
+        self.code = code
+        self.message = message
+        self.command = command
+        super().__init__(f"{command.split(':')[0]} failed: {code} {message}")
+
+
+class SMTPConnection:
+    """One SMTP session, reusable for many messages."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = False,
+        starttls: bool = True,
+        timeout: float = 30.0,
+        local_hostname: str = "localhost",
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.starttls = starttls
+        self.timeout = timeout
+        self.local_hostname = local_hostname
+        self.ssl_context = ssl_context
+        self.extensions: Dict[str, str] = {}
+        self.last_used = time.monotonic()
+        # Set once message data starts going out; retrying after that could duplicate it
+        self.message_started = False
+        # Set from MAIL FROM until the final reply or a successful RSET; a session
+        # left in a transaction may still have replies on the wire
+        self.in_transaction = False
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    @property
+    def pipelining(self) -> bool:
+        return "pipelining" in self.extensions
+
+    @property
+    def is_connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self) -> None:
+        """Open the session: greeting, EHLO, optional STARTTLS, AUTH."""
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.host,
+                    self.port,
+                    ssl=self._ssl_context() if self.use_tls else None,
+                ),
+                self.timeout,
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise SMTPServerDisconnected(f"Could not connect to {self.host}:{self.port}: {e}")
+
+        try:
+            self._expect(await self._read_reply(), (220,), "greeting")
+            await self._ehlo()
+
+            if self.starttls and not self.use_tls:
+                if "starttls" not in self.extensions:
+                    raise SMTPError("Server does not support STARTTLS")
+                await self._command("STARTTLS", (220,))
+                await self._writer.start_tls(self._ssl_context(), server_hostname=self.host)
+                await self._ehlo()  # capabilities may change after TLS
+
+            if self.username and self.password:
+                await self._login()
+        except Exception:
+            await self.close(quit=False)
+            raise
+        self.last_used = time.monotonic()
+
+    async def send(self, sender: str, recipients: Sequence[str], message: bytes) -> None:
+        """Send one message; the session stays open for the next one."""
+        self.message_started = False
+        self.in_transaction = True
+        commands = [f"MAIL FROM:<{sender}>"]
+        commands += [f"RCPT TO:<{recipient}>" for recipient in recipients]
+        commands.append("DATA")
+
+        if self.pipelining:
+            self._write("".join(f"{command}\r\n" for command in commands))
+            await self._drain()
+            replies = [await self._read_reply() for _ in commands]
+        else:
+            replies = []
+            for command in commands:
+                self._write(f"{command}\r\n")
+                await self._drain()
+                replies.append(await self._read_reply())
+                if replies[-1][0] >= 400 and command.startswith("MAIL"):
+                    break
+
+        try:
+            self._expect(replies[0], (250,), commands[0])
+            accepted = [r for r in replies[1:-1] if r[0] in (250, 251)]
+            if not accepted:
+                if replies[-1][0] == 354:
+                    # DATA was accepted anyway; end it empty before resetting
+                    self._write(b".\r\n")
+                    await self._drain()
+                    await self._read_reply()
+                code, text = replies[1] if len(replies) > 1 else replies[0]
+                raise SMTPResponseError(code, " ".join(text), "RCPT TO")
+            self._expect(replies[-1], (354,), "DATA")
+        except SMTPResponseError:
+            await self.reset()
+            raise
+
+        self.message_started = True
+        self._write(_dot_stuff(message))
+        await self._drain()
+        self._expect(await self._read_reply(), (250,), "end of data")
+        self.in_transaction = False
+        self.last_used = time.monotonic()
+
+    async def reset(self) -> None:
+        """Abort the current transaction so the session can be reused."""
+        try:
+            await self._command("RSET", (250,))
+        except SMTPError:
+            await self.close(quit=False)
+            return
+        self.in_transaction = False
+
+    async def close(self, quit: bool = True) -> None:
+        self.in_transaction = False
+        if self._writer is None:
+            return
+        writer, self._writer = self._writer, None
+        try:
+            if quit and not writer.is_closing():
+                writer.write(b"QUIT\r\n")
+                await asyncio.wait_for(writer.drain(), 1)
+            writer.close()
+            await asyncio.wait_for(writer.wait_closed(), 1)
+        except (OSError, asyncio.TimeoutError, ssl.SSLError):
+            pass
+
+    # Protocol helpers
+
+    def _ssl_context(self) -> ssl.SSLContext:
+        return self.ssl_context or ssl.create_default_context()
+
+    async def _ehlo(self) -> None:
+        code, lines = await self._command(f"EHLO {self.local_hostname}", (250,))
+        self.extensions = {}
+        for line in lines[1:]:
+            keyword, _, params = line.partition(" ")
+            self.extensions[keyword.lower()] = params
+
+    async def _login(self) -> None:
+        mechanisms = self.extensions.get("auth", "").upper().split()
+        if "PLAIN" in mechanisms or not mechanisms:
+            token = base64.b64encode(
+                f"\0{self.username}\0{self.password}".encode()
+            ).decode()
+            # Labels keep credentials out of error messages
+            await self._command(f"AUTH PLAIN {token}", (235,), "AUTH PLAIN")
+        else:
+            await self._command("AUTH LOGIN", (334,))
+            await self._command(
+                base64.b64encode(self.username.encode()).decode(), (334,), "AUTH LOGIN"
+            )
+            await self._command(
+                base64.b64encode(self.password.encode()).decode(), (235,), "AUTH LOGIN"
+            )
+
+    async def _command(
+        self, command: str, expected: Tuple[int, ...], label: Optional[str] = None
+    ) -> Tuple[int, List[str]]:
+        self._write(f"{command}\r\n")
+        await self._drain()
+        reply = await self._read_reply()
+        self._expect(reply, expected, label or command)
+        return reply
+
+    def _expect(self, reply: Tuple[int, List[str]], expected: Tuple[int, ...], command: str) -> None:
+        code, lines = reply
+        if code not in expected:
+            raise SMTPResponseError(code, " ".join(lines), command)
+
+    def _write(self, data) -> None:
+        if not self.is_connected:
+            raise SMTPServerDisconnected("Not connected")
+        self._writer.write(data.encode() if isinstance(data, str) else data)
+
+    async def _drain(self) -> None:
+        try:
+            await asyncio.wait_for(self._writer.drain(), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            await self.close(quit=False)
+            raise SMTPServerDisconnected(str(e) or "Write timed out")
+
+    async def _read_reply(self) -> Tuple[int, List[str]]:
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                await self.close(quit=False)
+                raise SMTPServerDisconnected(str(e) or "Read timed out")
+            if not line:
+                await self.close(quit=False)
+                raise SMTPServerDisconnected("Connection closed by server")
+            text = line.decode("utf-8", "replace").rstrip("\r\n")
+            lines.append(text[4:])
+            if text[3:4] != "-":
+                try:
+                    return int(text[:3]), lines
+                except ValueError:
+                    raise SMTPError(f"Malformed reply: {text!r}")
+
+
+def _dot_stuff(message: bytes) -> bytes:
+    """Normalize to CRLF, escape leading dots and append the terminator."""
+    data = re.sub(rb"\r?\n", b"\r\n", message)
+    data = re.sub(rb"(?m)^\.", b"..", data)
+    if not data.endswith(b"\r\n"):
+        data += b"\r\n"
+    return data + b".\r\n"
+
+
+class SMTPConnectionPool:
+    """Bounded pool of reusable, authenticated SMTP connections."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = False,
+        starttls: bool = True,
+        max_size: int = 4,
+        idle_timeout: float = 30.0,
+        timeout: float = 30.0,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ):
+        self._connection_options = dict(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            use_tls=use_tls,
+            starttls=starttls,
+            timeout=timeout,
+            ssl_context=ssl_context,
+        )
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle: Deque[SMTPConnection] = deque()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._closing: set = set()
+        self.connections_opened = 0
+        self.messages_sent = 0
+
+    async def send_message(self, sender: str, recipients: Sequence[str], message: bytes) -> None:
+        """Send ``message`` over a pooled connection, waiting for a free slot."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+        async with self._slots:
+            connection = await self._acquire()
+            try:
+                try:
+                    await connection.send(sender, recipients, message)
+                except SMTPServerDisconnected:
+                    if connection.message_started:
+                        raise
+                    # Dropped while idle: nothing was sent, so retry on a fresh session
+                    await connection.close(quit=False)
+                    connection = await self._connect()
+                    await connection.send(sender, recipients, message)
+                self.messages_sent += 1
+            except Exception:
+                if connection.in_transaction:
+                    # e.g. a malformed or rejected final reply: the session state is unknown
+                    await connection.close(quit=False)
+                raise
+            finally:
+                if connection.in_transaction:
+                    # Cancelled mid-transaction: replies may still be on the wire
+                    self._close_later(connection, quit=False)
+                else:
+                    # Only sessions that sent their message or were reset are reused
+                    self._release(connection)
+
+    async def close(self) -> None:
+        """Close every idle connection politely."""
+        while self._idle:
+            await self._idle.pop().close()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    @property
+    def idle_connections(self) -> int:
+        return len(self._idle)
+
+    async def _acquire(self) -> SMTPConnection:
+        now = time.monotonic()
+        while self._idle:
+            # Most recently used first, so surplus connections age out
+            connection = self._idle.pop()
+            if connection.is_connected and now - connection.last_used < self.idle_timeout:
+                return connection
+            await connection.close()
+        return await self._connect()
+
+    async def _connect(self) -> SMTPConnection:
+        connection = SMTPConnection(**self._connection_options)
+        await connection.connect()
+        self.connections_opened += 1
+        return connection
+
+    def _release(self, connection: SMTPConnection) -> None:
+        if not connection.is_connected:
+            return
+        self._idle.append(connection)
+        now = time.monotonic()
+        # Expire stale connections at the cold end of the stack
+        while self._idle and now - self._idle[0].last_used >= self.idle_timeout:
+            self._close_later(self._idle.popleft())
+        if len(self._idle) > self.max_size:
+            logger.debug("Closing surplus SMTP connection")
+            self._close_later(self._idle.popleft())
+
+    def _close_later(self, connection: SMTPConnection, quit: bool = True) -> None:
+        task = asyncio.get_running_loop().create_task(connection.close(quit=quit))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
@@ -0,0 +1,121 @@
+"""
+Per-process registry of active notification templates.
+
+There are only a handful of templates and they rarely change, so each
+worker loads them all at startup and serves lookups by name or category
+from memory instead of querying for every notification.
+
+Changes reach every worker through a version poll. The version is the
+template count plus the newest ``updated_at``; it changes whenever a
+template is created, edited, activated or deactivated. Each worker checks
+it every ``interval`` seconds with one aggregate query and reloads when it
+differs. The worker that made the write reloads straight away through
+``refresh``.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.shared.notification import NotificationCategory, NotificationTemplate
+
+Version = Tuple[int, Optional[datetime]]
+
+
+class NotificationTemplateRegistry:
+    """In-memory index of active templates, kept in step with the database."""
+
+    def __init__(self):
+        self._by_name: Dict[str, NotificationTemplate] = {}
+        self._by_category: Dict[str, List[NotificationTemplate]] = {}
+        self._version: Optional[Version] = None
+        self._session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._version is not None
+
+    def get(self, name: str) -> Optional[NotificationTemplate]:
+        return self._by_name.get(name)
+
+    def by_category(self, category: NotificationCategory) -> List[NotificationTemplate]:
+        return list(self._by_category.get(category, ()))
+
+    async def load(self, db: AsyncSession) -> None:
+        """Replace the registry with the active templates visible to ``db``."""
+        # Read the version first: a write landing in between just triggers another reload
+        version = await self._current_version(db)
+        result = await db.execute(
+            select(NotificationTemplate).where(NotificationTemplate.is_active.is_(True))
+        )
+        templates = result.scalars().all()
+        # Detach so the instances outlive the session and never lazy-load
+        for template in templates:
+            db.expunge(template)
+
+        by_category: Dict[str, List[NotificationTemplate]] = {}
+        for template in templates:
+            by_category.setdefault(template.category, []).append(template)
+        self._by_name = {template.name: template for template in templates}
+        self._by_category = by_category
+        self._version = version
+        logger.debug(f"Loaded {len(templates)} notification templates")
+
+    async def refresh(self, force: bool = True) -> bool:
+        """Reload from the database; without ``force`` only if the version changed."""
+        if self._session_factory is None:
+            return False
+        async with self._lock:
+            async with self._session_factory() as db:
+                if not force and await self._current_version(db) == self._version:
+                    return False
+                await self.load(db)
+        return True
+
+    async def start(
+        self, session_factory: async_sessionmaker[AsyncSession], interval_seconds: float
+    ) -> None:
+        """Load now, then poll for changes every ``interval_seconds``."""
+        self._session_factory = session_factory
+        try:
+            await self.refresh()
+        except Exception as e:
+            # Lookups fall back to the database until a poll succeeds
+            logger.error(f"Loading notification templates failed: {str(e)}")
+        if interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._poll_forever(interval_seconds))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _poll_forever(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                if await self.refresh(force=False):
+                    logger.info("Notification templates changed; registry reloaded")
+            except Exception as e:
+                logger.error(f"Notification template poll failed: {str(e)}")
+
+    async def _current_version(self, db: AsyncSession) -> Version:
+        result = await db.execute(
+            select(func.count(NotificationTemplate.id), func.max(NotificationTemplate.updated_at))
+        )
+        count, updated_at = result.one()
+        return count, updated_at
+
+
+template_registry = NotificationTemplateRegistry()
@@ -0,0 +1,95 @@
+"""
+Compiled notification template cache.
+
+Building a ``jinja2.Template`` from source lexes, parses and compiles it to
+Python bytecode, which costs far more than rendering it. All notification
+templates share one ``Environment``, and its LRU keeps compiled templates
+keyed by ``(template.id, template.updated_at)``. An edited template gets
+a new key, and ``invalidate`` drops the old versions as soon as the edit
+is written.
+
+If ``bytecode_dir`` is set, the compiled code is also written to disk
+with Jinja's ``FileSystemBytecodeCache``. New workers then load it instead
+of compiling. Entries are validated against a checksum of the source.
+"""
+
+import weakref
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache, Template, TemplateNotFound
+
+from app.models.shared.notification import NotificationTemplate
+
+
+class _RegisteredSourceLoader(BaseLoader):
+    """Serves template sources registered by the renderer, by name."""
+
+    def __init__(self):
+        self.sources: Dict[str, str] = {}
+
+    def get_source(
+        self, environment: Environment, template: str
+    ) -> Tuple[str, Optional[str], Callable[[], bool]]:
+        if template not in self.sources:
+            raise TemplateNotFound(template)
+        # Names embed the version, so a loaded template never goes stale
+        return self.sources[template], None, lambda: True
+
+
+class TemplateRenderer:
+    """Renders notification templates from a shared compiled-template LRU."""
+
+    def __init__(self, cache_size: int = 256, bytecode_dir: str = ""):
+        self._loader = _RegisteredSourceLoader()
+        self.environment = Environment(
+            loader=self._loader,
+            cache_size=cache_size,
+            auto_reload=False,
+            bytecode_cache=FileSystemBytecodeCache(bytecode_dir) if bytecode_dir else None,
+        )
+        self._names_by_id: Dict[int, Set[str]] = {}
+
+    def render(self, template: NotificationTemplate, data: Dict[str, Any]) -> Tuple[str, str]:
+        """Render subject and body; the subject is empty if the template has none."""
+        subject = ""
+        if template.subject_template:
+            subject = self._compiled(template, "subject", template.subject_template).render(**data)
+        body = self._compiled(template, "body", template.body_template).render(**data)
+        return subject, body
+
+    def invalidate(self, template_id: int) -> None:
+        """Forget every compiled version of a template."""
+        self._forget(template_id)
+
+    def clear(self) -> None:
+        self._loader.sources.clear()
+        self._names_by_id.clear()
+        self.environment.cache.clear()
+
+    def _compiled(self, template: NotificationTemplate, part: str, source: str) -> Template:
+        name = _template_name(template.id, template.updated_at, part)
+        if name not in self._loader.sources:
+            # A new version replaces any older one of the same template part
+            self._forget(template.id, part)
+            self._names_by_id.setdefault(template.id, set()).add(name)
+            self._loader.sources[name] = source
+        return self.environment.get_template(name)
+
+    def _forget(self, template_id: int, part: Optional[str] = None) -> None:
+        names = self._names_by_id.get(template_id, set())
+        for name in [n for n in names if part is None or n.endswith(f"/{part}")]:
+            names.discard(name)
+            self._loader.sources.pop(name, None)
+            try:
+                # Environment.cache keys are (weakref to the loader, template name)
+                del self.environment.cache[(weakref.ref(self._loader), name)]
+            except KeyError:
+                pass
+        if not names:
+            self._names_by_id.pop(template_id, None)
+
+
+def _template_name(template_id: int, updated_at: Optional[datetime], part: str) -> str:
+    version = updated_at.isoformat() if updated_at else "0"
+    return f"{template_id}/{version}/{part}"
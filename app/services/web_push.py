@@ -0,0 +1,245 @@
+"""
+Web Push delivery (RFC 8030) with VAPID (RFC 8292) and aes128gcm payload
+encryption (RFC 8291).
+
+A browser subscription is stored as the device token: the JSON
+``PushSubscription`` with its ``endpoint`` and ``keys.p256dh`` /
+``keys.auth``. Every message must be encrypted separately for each
+subscription, with a fresh ECDH key pair, two HKDF derivations and
+AES-GCM. That is CPU work the event loop should not do, so
+``encrypt_payload`` runs in a thread or process pool.
+
+The VAPID JWT only depends on the push service origin (its ``aud`` claim),
+so one signature is cached per origin and reused until shortly before
+it expires.
+
+The endpoint comes from the client, and the server POSTs to it. So
+``check_endpoint`` accepts only ``https`` URLs on known push service hosts
+and never an IP address in a private, loopback or link-local range. It
+runs both when a subscription is registered and before every delivery.
+"""
+
+import asyncio
+import base64
+import ipaddress
+import json
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from jose import jwt
+from loguru import logger
+
+RECORD_SIZE = 4096
+
+# Reasons meaning the subscription will never be accepted again
+INVALID_SUBSCRIPTION_REASONS = frozenset({"SubscriptionGone", "InvalidSubscription"})
+
+# Browser push services; subdomains are included
+PUSH_SERVICE_HOSTS = (
+    "fcm.googleapis.com",  # Chrome, Edge on Android
+    "updates.push.services.mozilla.com",  # Firefox
+    "notify.windows.com",  # Edge on Windows
+    "push.apple.com",  # Safari
+)
+
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def b64url_encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode()
+
+
+@dataclass(frozen=True)
+class WebPushSubscription:
+    """A browser ``PushSubscription``."""
+
+    endpoint: str
+    p256dh: str
+    auth: str
+
+    @classmethod
+    def from_token(cls, token: str) -> "WebPushSubscription":
+        """Parse a stored device token; raises ``ValueError`` if it is not a subscription."""
+        try:
+            subscription = json.loads(token)
+            keys = subscription["keys"]
+            return cls(subscription["endpoint"], keys["p256dh"], keys["auth"])
+        except (TypeError, KeyError, json.JSONDecodeError):
+            raise ValueError("Device token is not a web push subscription")
+
+
+def check_endpoint(endpoint: str, allowed_hosts: Iterable[str] = PUSH_SERVICE_HOSTS) -> None:
+    """
+    Raise ``ValueError`` unless ``endpoint`` is safe for the server to POST to.
+
+    An empty ``allowed_hosts`` accepts any public host name.
+    """
+    parts = urlsplit(endpoint)
+    host = (parts.hostname or "").rstrip(".").lower()
+    if parts.scheme != "https" or not host:
+        raise ValueError("Web push endpoint must be an https URL")
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        address = None
+    if address is not None and not address.is_global:
+        raise ValueError("Web push endpoint must not be a private address")
+    if host == "localhost" or host.endswith(".localhost"):
+        raise ValueError("Web push endpoint must not be a private address")
+    allowed = [allowed_host.lower() for allowed_host in allowed_hosts]
+    if allowed and not any(host == a or host.endswith("." + a) for a in allowed):
+        raise ValueError(f"Web push endpoint host {host} is not a known push service")
+
+
+def _hkdf(salt: bytes, info: bytes, length: int, key_material: bytes) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=length, salt=salt, info=info).derive(key_material)
+
+
+def encrypt_payload(payload: bytes, p256dh: str, auth: str, salt: Optional[bytes] = None) -> bytes:
+    """
+    Encrypt ``payload`` for one subscription as a single aes128gcm record.
+
+    Module-level and argument-only so it can run in a process pool.
+    """
+    ua_public = b64url_decode(p256dh)
+    auth_secret = b64url_decode(auth)
+    salt = salt or os.urandom(16)
+    if len(payload) > RECORD_SIZE - 17:  # 16-byte tag plus the padding delimiter
+        raise ValueError("Web push payload too large")
+
+    ephemeral = ec.generate_private_key(ec.SECP256R1())
+    as_public = ephemeral.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    shared_secret = ephemeral.exchange(
+        ec.ECDH(), ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), ua_public)
+    )
+
+    ikm = _hkdf(auth_secret, b"WebPush: info\x00" + ua_public + as_public, 32, shared_secret)
+    cek = _hkdf(salt, b"Content-Encoding: aes128gcm\x00", 16, ikm)
+    nonce = _hkdf(salt, b"Content-Encoding: nonce\x00", 12, ikm)
+    # 0x02 marks the last (and only) record; no padding
+    ciphertext = AESGCM(cek).encrypt(nonce, payload + b"\x02", None)
+
+    header = salt + RECORD_SIZE.to_bytes(4, "big") + bytes([len(as_public)]) + as_public
+    return header + ciphertext
+
+
+def load_vapid_key(key: str) -> ec.EllipticCurvePrivateKey:
+    """Accept a PEM key or the raw base64url private scalar most tooling emits."""
+    if key.lstrip().startswith("-----BEGIN"):
+        return serialization.load_pem_private_key(key.encode(), password=None)
+    return ec.derive_private_key(int.from_bytes(b64url_decode(key), "big"), ec.SECP256R1())
+
+
+class VAPIDSigner:
+    """VAPID ``Authorization`` headers, one cached JWT per push service origin."""
+
+    def __init__(self, private_key: str, subject: str, token_ttl: int = 43200):
+        key = load_vapid_key(private_key)
+        self._pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ).decode()
+        self.public_key = b64url_encode(
+            key.public_key().public_bytes(
+                serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+            )
+        )
+        self.subject = subject
+        self.token_ttl = min(token_ttl, 86400)  # push services reject exp beyond 24h
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        self.signed = 0
+
+    def header(self, endpoint: str) -> str:
+        parts = urlsplit(endpoint)
+        audience = f"{parts.scheme}://{parts.netloc}"
+        now = time.time()
+        cached = self._tokens.get(audience)
+        # Refresh with a tenth of the lifetime left so a token never expires in flight
+        if cached is None or cached[1] - now < self.token_ttl / 10:
+            expires = now + self.token_ttl
+            token = jwt.encode(
+                {"aud": audience, "exp": int(expires), "sub": self.subject},
+                self._pem,
+                algorithm="ES256",
+            )
+            cached = self._tokens[audience] = (token, expires)
+            self.signed += 1
+        return f"vapid t={cached[0]}, k={self.public_key}"
+
+
+class WebPushClient:
+    """Encrypts off the event loop and posts to push services."""
+
+    def __init__(
+        self,
+        vapid_private_key: str,
+        vapid_subject: str,
+        token_ttl: int = 43200,
+        executor: str = "thread",
+        workers: int = 0,
+    ):
+        self.vapid = VAPIDSigner(vapid_private_key, vapid_subject, token_ttl)
+        self.executor_kind = executor
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="web-push")
+        return self._executor
+
+    async def encrypt(self, subscription: WebPushSubscription, payload: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), encrypt_payload, payload, subscription.p256dh, subscription.auth
+        )
+
+    async def send(
+        self,
+        session: aiohttp.ClientSession,
+        subscription: WebPushSubscription,
+        payload: bytes,
+        ttl: int = 86400,
+        urgency: str = "normal",
+    ) -> Optional[str]:
+        """Deliver one message; returns an error reason, or ``None`` once accepted."""
+        body = await self.encrypt(subscription, payload)
+        headers = {
+            "Authorization": self.vapid.header(subscription.endpoint),
+            "Content-Encoding": "aes128gcm",
+            "Content-Type": "application/octet-stream",
+            "TTL": str(ttl),
+            "Urgency": urgency,
+        }
+        async with session.post(subscription.endpoint, data=body, headers=headers) as response:
+            await response.read()  # release the connection back to the pool
+            if response.status in (200, 201, 202):
+                return None
+            if response.status in (404, 410):
+                return "SubscriptionGone"
+            if response.status == 429:
+                return "TooManyRequests"
+            logger.debug(f"Push service returned HTTP {response.status} for {subscription.endpoint}")
+            return f"HTTP {response.status}"
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
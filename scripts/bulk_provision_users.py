@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Bulk-provision users from a CSV or JSON Lines file.
+
+Each record needs ``username``, ``email``, ``password`` and ``user_type``.
+Passwords are hashed in a process pool and rows are inserted in batches;
+emails that already exist are reported as duplicates instead of failing.
+
+Usage:
+    python scripts/bulk_provision_users.py users.csv [--batch-size 1000] [--report report.jsonl]
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import get_settings
+from app.schemas.user import UserBulkStatus, UserCreate
+from app.services.auth_service import auth_service
+
+
+def read_records(path: Path) -> Iterator[Dict[str, str]]:
+    """Yield raw user records from a CSV or JSON Lines file."""
+    with path.open(newline="") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+async def provision(path: Path, batch_size: int, report_path: Path | None) -> None:
+    """Validate the input file and provision all valid users."""
+    users: List[UserCreate] = []
+    invalid = 0
+    for line_number, record in enumerate(read_records(path), start=1):
+        try:
+            users.append(UserCreate(**record))
+        except ValidationError as e:
+            invalid += 1
+            print(f"  ⚠️  Skipping record {line_number}: {e.errors()[0]['msg']}")
+
+    print(f"📄 Loaded {len(users)} valid records ({invalid} invalid)")
+
+    settings = get_settings()
+    engine = create_async_engine(settings.database_url)
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with async_session() as db:
+            results = await auth_service.bulk_create_users(
+                db, users, batch_size=batch_size
+            )
+    finally:
+        auth_service.shutdown()
+        await engine.dispose()
+
+    counts = {s: 0 for s in UserBulkStatus}
+    for result in results:
+        counts[result.status] += 1
+
+    print("\n🎉 Provisioning complete!")
+    print(f"   ✨ Created: {counts[UserBulkStatus.CREATED]}")
+    print(f"   🔁 Duplicates: {counts[UserBulkStatus.DUPLICATE]}")
+    print(f"   ❌ Failed: {counts[UserBulkStatus.FAILED]}")
+
+    if report_path:
+        with report_path.open("w") as f:
+            for result in results:
+                f.write(result.model_dump_json() + "\n")
+        print(f"   📝 Report written to {report_path}")
+
+
+async def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("input", type=Path, help="CSV or JSON Lines file")
+    parser.add_argument(
+        "--batch-size", type=int, default=get_settings().bulk_user_batch_size
+    )
+    parser.add_argument("--report", type=Path, help="Write per-row results here")
+    args = parser.parse_args()
+
+    print("🌾 Farmers Marketplace - Bulk User Provisioning")
+    print("=" * 60)
+
+    try:
+        await provision(args.input, args.batch_size, args.report)
+    except Exception as e:
+        print(f"\n❌ Failed to provision users: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
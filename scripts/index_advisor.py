@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Propose indexes from recorded query shapes and generate a migration.
+
+Reads the statements recorded by the slow-query log and the per-route
+query statistics, either from saved JSON responses or from a running
+instance's internal API, and proposes B-tree, partial and trigram indexes
+the models do not already declare. With ``--replay`` every shape is
+re-planned against the database with ``EXPLAIN (GENERIC_PLAN)``
+(PostgreSQL 16+) and only shapes that still sequentially scan their table
+are kept. With ``--write-migration`` the proposals are written as the next
+Alembic revision, built with ``CREATE INDEX CONCURRENTLY``.
+
+Usage:
+    python scripts/index_advisor.py slow-queries.json queries.json
+    python scripts/index_advisor.py --url http://localhost:8000 --token "$ADMIN_TOKEN" --replay --write-migration
+
+The internal API requires an admin bearer token, passed with ``--token`` or
+the ``REVO_ADMIN_TOKEN`` environment variable.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import urllib.request
+from datetime import date
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# Add the project root to the Python path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import get_settings
+from app.core.index_advisor import (
+    advise,
+    generic_plan_sql,
+    parse_statement,
+    recorded_statements,
+    render_migration,
+    seq_scanned_tables,
+)
+from app.models.base import Base
+
+# Register every table on Base.metadata
+import app.models.farmers.farmer  # noqa: F401,E402
+import app.models.shared.location  # noqa: F401,E402
+import app.models.shared.notification  # noqa: F401,E402
+import app.models.users.user  # noqa: F401,E402
+
+VERSIONS_DIR = project_root / "alembic" / "versions"
+
+
+def load_statements(
+    paths: List[Path], url: Optional[str], token: Optional[str] = None
+) -> List[Tuple[str, float]]:
+    """Collect weighted statements from files and/or the internal API."""
+    statements: List[Tuple[str, float]] = []
+    for path in paths:
+        statements.extend(recorded_statements(json.loads(path.read_text())))
+    if url:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        for endpoint in ("/internal/db/slow-queries?limit=500", "/internal/db/queries?limit=200"):
+            request = urllib.request.Request(url.rstrip("/") + endpoint, headers=headers)
+            with urllib.request.urlopen(request) as response:
+                statements.extend(recorded_statements(json.load(response)))
+    return statements
+
+
+async def replay(statements: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+    """Keep only statements whose generic plan seq-scans their table."""
+    engine = create_async_engine(get_settings().database_url)
+    kept: List[Tuple[str, float]] = []
+    try:
+        async with engine.connect() as conn:
+            for sql, weight in statements:
+                shape = parse_statement(sql)
+                if shape is None:
+                    continue
+                try:
+                    result = await conn.exec_driver_sql(generic_plan_sql(sql))
+                    plan = result.scalar()
+                except Exception as e:
+                    print(f"⚠️  Could not plan: {sql[:80]} ({str(e).splitlines()[0]})")
+                    await conn.rollback()
+                    continue
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                if shape.table in seq_scanned_tables(plan):
+                    kept.append((sql, weight))
+    finally:
+        await engine.dispose()
+    return kept
+
+
+def next_revision() -> Tuple[str, Optional[str]]:
+    """The next numeric revision id and the current head."""
+    numbers = [
+        int(match.group(1))
+        for path in VERSIONS_DIR.glob("*.py")
+        if (match := re.match(r"(\d+)_", path.name))
+    ]
+    head = max(numbers, default=0)
+    return f"{head + 1:03d}", (f"{head:03d}" if head else None)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="*", type=Path, help="Saved internal API JSON responses")
+    parser.add_argument("--url", help="Base URL of a running instance to read stats from")
+    parser.add_argument(
+        "--token",
+        default=os.environ.get("REVO_ADMIN_TOKEN"),
+        help="Admin bearer token for the internal API (default: $REVO_ADMIN_TOKEN)",
+    )
+    parser.add_argument("--replay", action="store_true", help="Confirm sequential scans with EXPLAIN (GENERIC_PLAN)")
+    parser.add_argument("--write-migration", action="store_true", help="Write the proposals as the next Alembic revision")
+    args = parser.parse_args()
+
+    if args.url and not args.token:
+        print("❌ --url needs an admin token (--token or REVO_ADMIN_TOKEN)")
+        return 1
+    statements = load_statements(args.files, args.url, args.token)
+    if not statements:
+        print("❌ No recorded statements found")
+        return 1
+    print(f"🔍 Analysing {len(statements)} recorded statements...")
+
+    if args.replay:
+        statements = asyncio.run(replay(statements))
+        print(f"🔁 {len(statements)} statements still use sequential scans")
+
+    proposals = advise(statements, metadata=Base.metadata)
+    if not proposals:
+        print("✅ Existing indexes already cover the recorded shapes")
+        return 0
+
+    for proposal in proposals:
+        extras = f" WHERE {proposal.where}" if proposal.where else ""
+        print(
+            f"  • {proposal.name} ON {proposal.table} USING {proposal.using} "
+            f"({', '.join(proposal.columns)}){extras}  [weight {proposal.weight:g}]"
+        )
+
+    if args.write_migration:
+        revision, head = next_revision()
+        path = VERSIONS_DIR / f"{revision}_add_advised_indexes.py"
+        path.write_text(render_migration(proposals, revision, head, date.today().isoformat()))
+        print(f"📝 Wrote {path.relative_to(project_root)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
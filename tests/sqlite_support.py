@@ -0,0 +1,82 @@
+"""
+Helpers for running model-level tests against SQLite.
+
+The models use PostgreSQL column types (``UUID``) that SQLite cannot render
+natively; this module teaches the SQLite compiler to store them as text so
+service code can be exercised end to end without a Postgres server.
+
+Modules that use the ``wakes`` fixture load this file as a plugin with
+``pytest_plugins = ["tests.sqlite_support"]``.
+"""
+
+from pathlib import Path
+from typing import AsyncIterator, Iterable, List
+
+import pytest
+from sqlalchemy import Table, event
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+from app.core.query_stats import instrument_engine
+from app.services.notification_outbox import notification_workers
+
+# Import every model module so relationship strings resolve
+import app.models.farmers.farmer  # noqa: F401
+import app.models.shared.location  # noqa: F401
+import app.models.shared.notification  # noqa: F401
+import app.models.users.user  # noqa: F401
+
+
+@compiles(UUID, "sqlite")
+def _compile_uuid_sqlite(type_, compiler, **kw) -> str:
+    return "CHAR(32)"
+
+
+async def sqlite_session(tables: Iterable[Table]) -> AsyncIterator[AsyncSession]:
+    """Yield a session bound to a fresh in-memory database with ``tables``."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        for table in tables:
+            await conn.run_sync(table.create)
+
+    async_session = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with async_session() as session:
+        yield session
+    await engine.dispose()
+
+
+async def sqlite_session_factory(
+    tmp_path: Path, tables: Iterable[Table], instrument: bool = False, wal: bool = False
+) -> AsyncIterator[async_sessionmaker[AsyncSession]]:
+    """
+    Yield a session factory for a file-backed database with ``tables``.
+
+    Unlike ``sqlite_session``, every session shares one database, so
+    workers, flushers and the test can each open their own. ``instrument``
+    feeds ``track_queries``; ``wal`` lets writers commit while another
+    connection holds a read cursor open.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    if wal:
+        @event.listens_for(engine.sync_engine, "connect")
+        def use_wal(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA journal_mode=WAL")
+    if instrument:
+        instrument_engine(engine.sync_engine)
+    async with engine.begin() as conn:
+        for table in tables:
+            await conn.run_sync(table.create)
+
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+def wakes(monkeypatch) -> List[int]:
+    """Record outbox worker wake-ups instead of waking real workers."""
+    calls: List[int] = []
+    monkeypatch.setattr(notification_workers, "wake", lambda: calls.append(1))
+    return calls
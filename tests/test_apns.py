@@ -0,0 +1,281 @@
+"""
+Tests for the HTTP/2 APNs client.
+
+Most tests plug an in-memory httpx transport into the client so they can
+inspect every request. ``test_streams_multiplex_over_one_connection`` runs
+against a real HTTP/2 stand-in server and needs the ``h2`` package.
+"""
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import jwt
+
+from app.services.apns import APNsClient, ProviderToken
+from app.services.notification_service import PushProvider
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    key = ec.generate_private_key(ec.SECP256R1())
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ).decode()
+    return private_pem, public_pem
+
+
+class FakeAPNs:
+    """In-memory APNs: tokens starting with ``dead`` are unregistered."""
+
+    def __init__(self, public_key, delay=0.0, expire_first=0):
+        self.public_key = public_key
+        self.delay = delay
+        self.expire_first = expire_first
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request):
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            token = request.headers["authorization"].removeprefix("bearer ")
+            claims = jwt.decode(token, self.public_key, algorithms=["ES256"])
+            assert claims["iss"] == "TEAM123"
+            if self.expire_first:
+                self.expire_first -= 1
+                return httpx.Response(403, json={"reason": "ExpiredProviderToken"})
+            if request.url.path.startswith("/3/device/dead"):
+                return httpx.Response(410, json={"reason": "Unregistered", "timestamp": 0})
+            return httpx.Response(200, headers={"apns-id": f"id-{len(self.requests)}"})
+        finally:
+            self.in_flight -= 1
+
+
+def make_client(private_key, handler, **options):
+    return APNsClient(
+        key_id="KEY123",
+        team_id="TEAM123",
+        bundle_id="com.farmersmarketplace.app",
+        private_key=private_key,
+        base_url="https://apns.test",
+        http2=False,
+        transport=httpx.MockTransport(handler),
+        **options,
+    )
+
+
+async def test_provider_token_is_signed_once_and_reused(signing_key):
+    private_key, public_key = signing_key
+    server = FakeAPNs(public_key)
+    client = make_client(private_key, server)
+    try:
+        responses = await asyncio.gather(*(
+            client.send(f"token{n}", {"aps": {"alert": "hi"}}) for n in range(50)
+        ))
+    finally:
+        await client.close()
+
+    assert all(r.ok for r in responses)
+    assert client.token.signed == 1
+    assert len({r.headers["authorization"] for r in server.requests}) == 1
+    request = server.requests[0]
+    assert jwt.get_unverified_header(request.headers["authorization"][7:])["kid"] == "KEY123"
+    assert request.headers["apns-topic"] == "com.farmersmarketplace.app"
+    assert request.headers["apns-push-type"] == "alert"
+
+
+def test_provider_token_is_refreshed_when_due(signing_key, monkeypatch):
+    token = ProviderToken("KEY123", "TEAM123", signing_key[0], refresh_after=3000)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    first = token.get()
+    monkeypatch.setattr(time, "time", lambda: now + 2999)
+    assert token.get() == first
+    monkeypatch.setattr(time, "time", lambda: now + 3000)
+    assert token.get() != first
+    assert token.signed == 2
+
+
+async def test_expired_provider_token_is_resigned_and_retried(signing_key, monkeypatch):
+    private_key, public_key = signing_key
+    server = FakeAPNs(public_key, expire_first=1)
+    client = make_client(private_key, server)
+    # Distinct iat so the new token differs from the rejected one
+    clock = iter(range(1_700_000_000, 1_700_000_100))
+    monkeypatch.setattr(time, "time", lambda: next(clock))
+    try:
+        response = await client.send("token", {"aps": {"alert": "hi"}})
+    finally:
+        await client.close()
+
+    assert response.ok
+    assert client.token.signed == 2
+    first, second = server.requests
+    assert first.headers["authorization"] != second.headers["authorization"]
+
+
+async def test_in_flight_requests_are_capped_by_concurrency(signing_key):
+    private_key, public_key = signing_key
+    server = FakeAPNs(public_key, delay=0.01)
+    client = make_client(private_key, server, concurrency=5)
+    try:
+        await asyncio.gather(*(client.send(f"t{n}", {"aps": {}}) for n in range(40)))
+    finally:
+        await client.close()
+
+    assert server.max_in_flight == 5
+
+
+async def test_push_provider_maps_apns_reasons_per_token(signing_key):
+    private_key, public_key = signing_key
+    server = FakeAPNs(public_key)
+    provider = PushProvider(SimpleNamespace(
+        apns_key_id="KEY123",
+        apns_team_id="TEAM123",
+        apns_bundle_id="com.farmersmarketplace.app",
+        apns_private_key=private_key,
+    ))
+    provider._apns = make_client(private_key, server)
+    try:
+        results = await provider.send_push_batch(
+            "ios", ["live", "dead-1"], "Order shipped", "On its way", {"order_id": "42"}
+        )
+    finally:
+        await provider.close()
+
+    assert results == {"live": None, "dead-1": "Unregistered"}
+    assert "Unregistered" in PushProvider.INVALID_TOKEN_ERRORS
+    payload = json.loads(server.requests[0].read())
+    assert payload["order_id"] == "42"
+    assert payload["aps"]["alert"] == {"title": "Order shipped", "body": "On its way"}
+
+
+async def test_apns_without_credentials_fails_fast():
+    provider = PushProvider(SimpleNamespace())
+    assert not await provider.send_push_notification("token", "ios", "Hi", "Body")
+
+
+def test_cached_token_signing_benchmark(signing_key):
+    """Reusing the provider token vs. signing one per request."""
+    requests = 2000
+    cached = ProviderToken("KEY123", "TEAM123", signing_key[0])
+    per_request = ProviderToken("KEY123", "TEAM123", signing_key[0], refresh_after=0)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        cached.get()
+    cached_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        per_request.get()
+    signing_elapsed = time.perf_counter() - started
+
+    print(
+        f"\nAPNs provider token for {requests} requests: cached {cached_elapsed * 1000:.1f}ms "
+        f"({cached.signed} signature), per-request {signing_elapsed * 1000:.0f}ms "
+        f"({per_request.signed} signatures)"
+    )
+    assert cached.signed == 1
+    assert per_request.signed == requests
+    assert cached_elapsed < signing_elapsed
+
+
+class H2StandIn:
+    """Minimal cleartext HTTP/2 APNs stand-in built on ``h2``."""
+
+    def __init__(self):
+        self.connections = 0
+        self.streams = 0
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        import h2.config
+        import h2.connection
+        import h2.events
+
+        self.connections += 1
+        conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        conn.initiate_connection()
+        writer.write(conn.data_to_send())
+        paths = {}
+        try:
+            while data := await reader.read(65536):
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        paths[event.stream_id] = dict(event.headers)[":path"]
+                        self.streams += 1
+                    elif isinstance(event, h2.events.DataReceived):
+                        conn.acknowledge_received_data(
+                            event.flow_controlled_length, event.stream_id
+                        )
+                    elif isinstance(event, h2.events.StreamEnded):
+                        if paths.pop(event.stream_id).startswith("/3/device/dead"):
+                            body = b'{"reason":"BadDeviceToken"}'
+                            conn.send_headers(event.stream_id, [(":status", "400")])
+                            conn.send_data(event.stream_id, body, end_stream=True)
+                        else:
+                            conn.send_headers(
+                                event.stream_id,
+                                [(":status", "200"), ("apns-id", str(event.stream_id))],
+                                end_stream=True,
+                            )
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+                writer.write(conn.data_to_send())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def test_streams_multiplex_over_one_connection(signing_key):
+    pytest.importorskip("h2")
+    async with H2StandIn() as server:
+        client = APNsClient(
+            key_id="KEY123",
+            team_id="TEAM123",
+            bundle_id="com.farmersmarketplace.app",
+            private_key=signing_key[0],
+            base_url=server.url,
+            max_connections=1,
+            concurrency=100,
+        )
+        try:
+            responses = await asyncio.gather(*(
+                client.send(f"token{n}", {"aps": {"alert": "hi"}}) for n in range(200)
+            ))
+            rejected = await client.send("dead-token", {"aps": {"alert": "hi"}})
+        finally:
+            await client.close()
+
+    assert all(r.ok for r in responses)
+    assert rejected.reason == "BadDeviceToken"
+    assert server.connections == 1
+    assert server.streams == 201
@@ -0,0 +1,188 @@
+"""
+Tests for provider circuit breakers.
+"""
+
+import asyncio
+import random
+import time
+import uuid
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import tests.sqlite_support  # noqa: F401  (UUID support for SQLite)
+from app.core import circuit_breaker
+from app.core.circuit_breaker import CIRCUIT_OPEN, CircuitBreaker, CircuitState
+from app.models.shared.notification import (
+    DeviceToken,
+    Notification,
+    NotificationCategory,
+    NotificationStatus,
+    NotificationType,
+)
+from app.services.notification_outbox import NotificationWorkerPool
+from app.services.notification_retry import RetryPolicy
+from app.services.notification_service import EmailProvider, NotificationService, PushProvider
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def make_breaker(**overrides):
+    options = dict(failure_rate=0.5, window=10, min_calls=10, open_seconds=30, half_open_probes=3)
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+
+class TestCircuitBreaker:
+    """Tests for CircuitBreaker state transitions."""
+
+    def test_opens_on_failure_rate_once_enough_calls_are_seen(self, clock):
+        breaker = make_breaker()
+        for _ in range(9):
+            breaker.record(False)
+        assert breaker.state == CircuitState.CLOSED  # below min_calls
+        breaker.record(True)
+        assert breaker.state == CircuitState.OPEN
+        assert not breaker.allow()
+        assert breaker.rejected == 1
+        assert breaker.retry_after == 30
+
+    def test_failures_age_out_of_the_window(self, clock):
+        breaker = make_breaker()
+        for _ in range(8):
+            breaker.record(False)
+        clock.now += 11
+        for _ in range(10):
+            breaker.record(True)
+        assert breaker.state == CircuitState.CLOSED
+        assert breaker.snapshot()["window_failure_rate"] == 0.0
+
+    def test_half_open_probes_close_the_circuit(self, clock):
+        breaker = make_breaker()
+        for _ in range(10):
+            breaker.record(False)
+        clock.now += 30
+
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert [breaker.allow() for _ in range(5)] == [True, True, True, False, False]
+        breaker.record(True)
+        breaker.record(True)
+        assert breaker.allow()  # a finished probe frees a slot
+        breaker.record(True)
+        assert breaker.state == CircuitState.CLOSED
+        assert all(breaker.allow() for _ in range(50))
+
+    def test_failed_probe_reopens(self, clock):
+        breaker = make_breaker()
+        for _ in range(10):
+            breaker.record(False)
+        clock.now += 30
+        assert breaker.allow()
+        breaker.record(False)
+        assert breaker.state == CircuitState.OPEN
+        assert breaker.opened == 2
+        clock.now += 29
+        assert not breaker.allow()
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'breaker.db'}")
+    async with engine.begin() as conn:
+        for table in (Notification.__table__, DeviceToken.__table__):
+            await conn.run_sync(table.create)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def test_open_smtp_circuit_requeues_without_using_an_attempt(session_factory):
+    service = NotificationService()
+    service.retry_policy = RetryPolicy(rng=random.Random(5))
+    service.circuit_open_seconds = 30
+    service.email_provider.pool.send_message = AsyncMock()
+    for _ in range(20):
+        service.email_provider.breaker.record(False)
+    async with session_factory() as db:
+        db.add(Notification(
+            user_id=uuid.uuid4(),
+            notification_type=NotificationType.EMAIL,
+            category=NotificationCategory.ORDER,
+            status=NotificationStatus.PENDING,
+            title="Order shipped",
+            message="On its way",
+            recipient="buyer@example.com",
+            retry_count=1,
+        ))
+        await db.commit()
+        assert await NotificationWorkerPool().claim_and_deliver(db, service) == 1
+        notification = (await db.execute(select(Notification))).scalar_one()
+
+    service.email_provider.pool.send_message.assert_not_awaited()
+    assert (notification.status, notification.retry_count) == ("retrying", 1)
+    assert notification.error_message == CIRCUIT_OPEN
+    assert service.delivery_limits()["smtp"]["circuit"]["state"] == "open"
+
+
+async def test_open_fcm_circuit_fails_fast_without_requests():
+    provider = PushProvider(SimpleNamespace(
+        fcm_server_key="test-key",
+        fcm_url="http://127.0.0.1:9/fcm/send",  # discard port: connection refused
+        notification_breaker_min_calls=3,
+    ))
+    try:
+        for _ in range(3):
+            results = await provider.send_push_batch("android", ["a"], "Hi", "Body")
+            assert results["a"] not in (None, CIRCUIT_OPEN)
+        assert await provider.send_push_batch("android", ["a", "b"], "Hi", "Body") == {
+            "a": CIRCUIT_OPEN, "b": CIRCUIT_OPEN
+        }
+    finally:
+        await provider.close()
+    assert provider.breakers["fcm"].rejected == 1
+
+
+async def test_outage_benchmark():
+    """200 emails to a relay that times out: with and without a breaker."""
+
+    async def timing_out(*args):
+        await asyncio.sleep(0.02)
+        raise asyncio.TimeoutError()
+
+    async def send_all(min_calls):
+        provider = EmailProvider(SimpleNamespace(
+            notification_provider_limits={"smtp": {"concurrency": 4}},
+            notification_breaker_min_calls=min_calls,
+        ))
+        provider.pool.send_message = timing_out
+
+        async def send():
+            try:
+                await provider.send_email("buyer@example.com", "Hi", "Body")
+            except circuit_breaker.CircuitOpenError:
+                pass
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send() for _ in range(200)))
+        return time.perf_counter() - started
+
+    without_breaker = await send_all(min_calls=10_000)
+    with_breaker = await send_all(min_calls=20)
+
+    print(f"\n200 sends during an outage: {without_breaker:.2f}s without breaker, {with_breaker:.2f}s with")
+    assert with_breaker < without_breaker / 3
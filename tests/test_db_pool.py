@@ -0,0 +1,108 @@
+"""
+Tests for connection pool configuration and pool metrics.
+"""
+
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.api.internal import router
+from app.core.config import Settings
+from app.core.database import engine_options, get_db
+from app.core.db_pool import (
+    InstrumentedAsyncQueuePool,
+    get_pool_status,
+    instrument_pool,
+    pool_metrics,
+)
+from app.core.metrics import Histogram
+from app.models.users.user import UserType
+from app.services.auth_service import auth_service
+
+
+def test_histogram_snapshot_is_cumulative():
+    """Bucket counts are cumulative and include an overflow bucket."""
+    histogram = Histogram(buckets=(1, 10))
+    for value in (0.5, 5, 50):
+        histogram.observe(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 3
+    assert snapshot["max"] == 50
+    assert snapshot["buckets"] == {"le_1": 1, "le_10": 2, "le_inf": 3}
+
+
+def test_engine_options_for_postgres():
+    """Pool settings are passed through for server databases."""
+    settings = Settings(db_pool_size=3, db_max_overflow=2, db_pool_pre_ping=False)
+    options = engine_options(settings, "postgresql+asyncpg://u:p@db/app")
+
+    assert options["poolclass"] is InstrumentedAsyncQueuePool
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == 2
+    assert options["pool_pre_ping"] is False
+    assert options["echo"] is False
+
+
+def test_engine_options_for_sqlite():
+    """SQLite keeps its default pool."""
+    options = engine_options(Settings(), "sqlite+aiosqlite:///./test.db")
+    assert "poolclass" not in options
+    assert "pool_size" not in options
+
+
+def test_pool_status_without_engine():
+    assert get_pool_status(None) == {"initialized": False}
+
+
+async def test_pool_status_tracks_checkouts(tmp_path):
+    """Checked-out connections and wait times are reported."""
+    pool_metrics.reset()
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=2,
+        max_overflow=1,
+    )
+    instrument_pool(engine.pool)
+
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            status = get_pool_status(engine)
+            assert status["checked_out"] == 1
+            assert status["size"] == 2
+            assert status["max_overflow"] == 1
+
+        status = get_pool_status(engine)
+        assert status["checked_out"] == 0
+        assert status["idle"] == 1
+        assert status["checkouts"] == 1
+        assert status["wait_time_ms"]["count"] == 1
+        assert status["hold_time_ms"]["count"] == 1
+    finally:
+        await engine.dispose()
+
+
+def test_internal_endpoints_require_an_admin(monkeypatch):
+    """Pool resets and the rest of /internal are refused without an admin token."""
+    async def user_for(db, token):
+        return SimpleNamespace(user_type=UserType.ADMIN if token == "admin" else UserType.BUYER)
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(auth_service, "get_current_user_from_token", user_for)
+    app = FastAPI()
+    app.include_router(router, prefix="/internal")
+    app.dependency_overrides[get_db] = no_db
+    client = TestClient(app)
+
+    assert client.post("/internal/db/pool/reset").status_code == 401
+    buyer = {"Authorization": "Bearer buyer"}
+    assert client.post("/internal/db/pool/reset", headers=buyer).status_code == 403
+    admin = {"Authorization": "Bearer admin"}
+    assert client.post("/internal/db/pool/reset", headers=admin).json() == {"status": "reset"}
@@ -0,0 +1,136 @@
+"""
+Tests for the index advisor.
+"""
+
+import ast
+
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, MetaData, String, Table
+
+from app.core.index_advisor import (
+    advise,
+    existing_indexes,
+    parse_statement,
+    recorded_statements,
+    render_migration,
+    seq_scanned_tables,
+)
+from app.models.base import Base
+import app.models.farmers.farmer  # noqa: F401
+import app.models.shared.location  # noqa: F401
+import app.models.shared.notification  # noqa: F401
+import app.models.users.user  # noqa: F401
+
+UNREAD_LIST = (
+    "SELECT notifications.id, notifications.title FROM notifications "
+    "WHERE notifications.user_id = ? AND notifications.status != ? "
+    "ORDER BY notifications.created_at DESC LIMIT ? OFFSET ?"
+)
+ORGANIC = (
+    "SELECT farmers.id FROM farmers WHERE farmers.organic_certified = true"
+)
+FARM_NAME = "SELECT farmers.id FROM farmers WHERE farmers.farm_name ILIKE ?"
+
+
+def _bare_metadata() -> MetaData:
+    """The tables as they were before any advisor indexes existed."""
+    metadata = MetaData()
+    Table("users", metadata, Column("id", Integer, primary_key=True))
+    Table(
+        "notifications",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", ForeignKey("users.id")),
+        Column("status", String(20)),
+    )
+    Table(
+        "farmers",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("farm_name", String(255)),
+        Column("organic_certified", Boolean),
+    )
+    return metadata
+
+
+def test_parse_statement_classifies_columns():
+    shape = parse_statement(UNREAD_LIST)
+
+    assert shape.table == "notifications"
+    assert shape.equality == ["user_id"]
+    assert shape.inequality == ["status"]
+    assert shape.order_by == ["created_at"]
+
+
+def test_statements_with_or_are_skipped():
+    sql = "SELECT users.id FROM users WHERE users.email = ? OR users.username = ?"
+    assert parse_statement(sql) is None
+
+
+def test_advise_proposes_composite_partial_and_trigram_indexes():
+    proposals = advise(
+        [(UNREAD_LIST, 40.0), (ORGANIC, 10.0), (FARM_NAME, 5.0)],
+        metadata=_bare_metadata(),
+    )
+
+    by_name = {p.name: p for p in proposals}
+    assert list(by_name) == [
+        "ix_notifications_user_id_status_created_at",
+        "ix_farmers_organic_certified_partial",
+        "ix_farmers_farm_name_trgm",
+    ]
+    assert by_name["ix_farmers_organic_certified_partial"].where == (
+        "organic_certified = true"
+    )
+    assert by_name["ix_farmers_farm_name_trgm"].using == "gin"
+
+
+def test_narrower_shapes_fold_into_wider_index():
+    count = "SELECT count(notifications.id) FROM notifications WHERE notifications.user_id = ?"
+    [proposal] = advise([(count, 3.0), (UNREAD_LIST, 1.0)], metadata=_bare_metadata())
+
+    assert proposal.columns == ("user_id", "status", "created_at")
+    assert proposal.weight == 4.0
+
+
+def test_model_indexes_cover_the_hot_shapes():
+    """The indexes declared on the models leave nothing to propose."""
+    device_tokens = (
+        "SELECT device_tokens.token FROM device_tokens "
+        "WHERE device_tokens.user_id = ? AND device_tokens.is_active = ?"
+    )
+    farmers_by_location = "SELECT farmers.id FROM farmers WHERE farmers.location_id IN (?...)"
+    statements = [(s, 1.0) for s in (UNREAD_LIST, ORGANIC, FARM_NAME, device_tokens, farmers_by_location)]
+
+    assert advise(statements, metadata=Base.metadata) == []
+    assert ("user_id", "status", "created_at") in existing_indexes(Base.metadata)["notifications"]
+
+
+def test_recorded_statements_reads_internal_api_payloads():
+    slow = {"entries": [{"sql": ORGANIC, "duration_ms": 750.0}]}
+    routes = [{"route": "GET /x", "last_repeated": [{"sql": UNREAD_LIST, "count": 12}]}]
+
+    assert recorded_statements(slow) + recorded_statements(routes) == [
+        (ORGANIC, 750.0),
+        (UNREAD_LIST, 12.0),
+    ]
+
+
+def test_seq_scanned_tables_walks_nested_plans():
+    plan = [{"Plan": {"Node Type": "Limit", "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "farmers"},
+        {"Node Type": "Index Scan", "Relation Name": "locations"},
+    ]}}]
+    assert seq_scanned_tables(plan) == ["farmers"]
+
+
+def test_render_migration_builds_indexes_concurrently():
+    proposals = advise([(ORGANIC, 1.0), (FARM_NAME, 1.0)], metadata=_bare_metadata())
+    source = render_migration(proposals, "004", "003", "2026-10-19")
+
+    ast.parse(source)
+    assert "revision = '004'" in source
+    assert "down_revision = '003'" in source
+    assert "autocommit_block()" in source
+    assert source.count("postgresql_concurrently=True") == 4
+    assert "CREATE EXTENSION IF NOT EXISTS pg_trgm" in source
+    assert 'postgresql_where=sa.text("organic_certified = true")' in source
@@ -0,0 +1,147 @@
+"""
+Tests for the set-based bulk notification path.
+"""
+
+import time
+import uuid
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.core.query_stats import instrument_engine, track_queries
+from app.models.shared.notification import (
+    Notification,
+    NotificationCategory,
+    NotificationStatus,
+    NotificationTemplate,
+    NotificationType,
+    UserNotificationPreference,
+)
+from app.models.users.user import User, UserType
+from app.services.notification_service import NotificationService
+from tests.sqlite_support import sqlite_session
+
+TABLES = [
+    User.__table__,
+    UserNotificationPreference.__table__,
+    NotificationTemplate.__table__,
+    Notification.__table__,
+]
+
+
+@pytest.fixture
+async def db_session():
+    async for session in sqlite_session(TABLES):
+        instrument_engine(session.bind.sync_engine)
+        yield session
+
+
+async def add_users(db, count):
+    ids = [uuid.uuid4() for _ in range(count)]
+    await db.execute(
+        insert(User),
+        [
+            {
+                "id": user_id,
+                "username": f"buyer{n}",
+                "email": f"buyer{n}@example.com",
+                "password_hash": "x",
+                "user_type": UserType.BUYER,
+            }
+            for n, user_id in enumerate(ids)
+        ],
+    )
+    await db.commit()
+    return ids
+
+
+class TestSendBulkNotification:
+    """Tests for NotificationService.send_bulk_notification."""
+
+    async def test_preferences_are_filtered_in_sql(self, db_session):
+        """Opted-out users are skipped; users without preferences receive it."""
+        opted_out, disabled, opted_in, no_prefs = await add_users(db_session, 4)
+        db_session.add_all([
+            UserNotificationPreference(user_id=opted_out, email_marketing=False),
+            UserNotificationPreference(user_id=disabled, email_enabled=False, email_marketing=True),
+            UserNotificationPreference(user_id=opted_in, email_marketing=True),
+        ])
+        await db_session.commit()
+
+        notifications = await NotificationService().send_bulk_notification(
+            db_session,
+            [opted_out, disabled, opted_in, no_prefs, uuid.uuid4()],
+            NotificationType.EMAIL,
+            NotificationCategory.MARKETING,
+            "Harvest sale",
+            "Fresh produce at half price",
+        )
+
+        assert {n.user_id for n in notifications} == {opted_in, no_prefs}
+        assert all(n.status == NotificationStatus.PENDING for n in notifications)
+        assert {n.recipient for n in notifications} == {
+            "buyer2@example.com",
+            "buyer3@example.com",
+        }
+
+    async def test_template_rendered_once_for_all_recipients(self, db_session):
+        user_ids = await add_users(db_session, 3)
+        template = NotificationTemplate(
+            name="harvest_sale",
+            category=NotificationCategory.MARKETING,
+            notification_type=NotificationType.IN_APP,
+            subject_template="{{ farm }} sale",
+            body_template="{{ discount }}% off at {{ farm }}",
+        )
+        db_session.add(template)
+        await db_session.commit()
+
+        notifications = await NotificationService().send_bulk_notification(
+            db_session,
+            user_ids,
+            NotificationType.IN_APP,
+            NotificationCategory.MARKETING,
+            "unused",
+            "unused",
+            template_name="harvest_sale",
+            template_data={"farm": "Green Acres", "discount": 20},
+        )
+
+        assert {(n.title, n.message) for n in notifications} == {
+            ("Green Acres sale", "20% off at Green Acres")
+        }
+        assert {n.template_id for n in notifications} == {template.id}
+        assert {n.recipient for n in notifications} == {str(u) for u in user_ids}
+
+    async def test_ten_thousand_recipients_use_a_handful_of_statements(self, db_session):
+        """End-to-end time and round trips for a 10k blast."""
+        user_ids = await add_users(db_session, 10_000)
+        service = NotificationService()
+
+        started = time.perf_counter()
+        with track_queries() as stats:
+            notifications = await service.send_bulk_notification(
+                db_session,
+                user_ids,
+                NotificationType.IN_APP,
+                NotificationCategory.SYSTEM,
+                "Maintenance",
+                "The marketplace will be down tonight",
+            )
+        elapsed = time.perf_counter() - started
+
+        assert len(notifications) == 10_000
+        count = await db_session.scalar(select(func.count()).select_from(Notification))
+        assert count == 10_000
+        # One recipient query plus one multi-row INSERT per chunk
+        chunks = -(-10_000 // service.settings.max_bulk_notifications)
+        assert stats.query_count <= 1 + chunks * 2
+        print(f"\n10k bulk notifications: {elapsed * 1000:.0f}ms, {stats.query_count} statements")
+        assert elapsed < 30
+
+    async def test_empty_user_list_is_a_no_op(self, db_session):
+        with track_queries() as stats:
+            assert await NotificationService().send_bulk_notification(
+                db_session, [], NotificationType.PUSH, NotificationCategory.ORDER, "t", "m"
+            ) == []
+        assert stats.query_count == 0
@@ -0,0 +1,232 @@
+"""
+Tests for quiet-hours deferral.
+"""
+
+import asyncio
+import importlib
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.core.query_stats import track_queries
+from app.models.shared.notification import (
+    Notification,
+    NotificationCategory,
+    NotificationDigestItem,
+    NotificationStatus,
+    NotificationTemplate,
+    NotificationType,
+    UserNotificationPreference,
+)
+from app.models.users.user import User, UserType
+from app.schemas.notification import NotificationPreferencesUpdate
+from app.services.notification_deferral import NotificationDeferralScheduler, quiet_hours_end
+from app.services.notification_service import NotificationService
+from tests.sqlite_support import sqlite_session_factory
+
+pytest_plugins = ["tests.sqlite_support"]
+
+notification_service_module = importlib.import_module("app.services.notification_service")
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    tables = (
+        User.__table__,
+        UserNotificationPreference.__table__,
+        NotificationTemplate.__table__,
+        Notification.__table__,
+        NotificationDigestItem.__table__,
+    )
+    async for factory in sqlite_session_factory(tmp_path, tables, instrument=True):
+        yield factory
+
+
+async def add_deferred(session_factory, count, deliver_after):
+    async with session_factory() as db:
+        await db.execute(insert(Notification), [
+            {
+                "user_id": uuid.uuid4(),
+                "notification_type": NotificationType.PUSH,
+                "category": NotificationCategory.ORDER,
+                "status": NotificationStatus.DEFERRED,
+                "title": "Order shipped",
+                "message": "On its way",
+                "recipient": "",
+                "deliver_after": deliver_after,
+            }
+            for _ in range(count)
+        ])
+        await db.commit()
+
+
+async def status_counts(session_factory):
+    async with session_factory() as db:
+        result = await db.execute(select(Notification.status))
+        statuses = list(result.scalars())
+    return {status: statuses.count(status) for status in set(statuses)}
+
+
+class TestQuietHoursEnd:
+    """Tests for quiet_hours_end."""
+
+    def test_window_spanning_midnight_in_the_users_timezone(self):
+        # 23:30 in Madrid (UTC+2 in summer) is inside 22:00-08:00
+        now = datetime(2026, 7, 1, 21, 30)
+        assert quiet_hours_end(True, "22:00", "08:00", "Europe/Madrid", now) == datetime(
+            2026, 7, 2, 6, 0
+        )
+        # 01:00 local, after midnight: ends the same local day
+        now = datetime(2026, 7, 1, 23, 0)
+        assert quiet_hours_end(True, "22:00", "08:00", "Europe/Madrid", now) == datetime(
+            2026, 7, 2, 6, 0
+        )
+        # Noon local is outside the window
+        assert quiet_hours_end(True, "22:00", "08:00", "Europe/Madrid", datetime(2026, 7, 1, 10)) is None
+
+    def test_same_day_window_and_defaults(self):
+        now = datetime(2026, 3, 2, 13, 15)
+        assert quiet_hours_end(True, "13:00", "14:00", None, now) == datetime(2026, 3, 2, 14, 0)
+        assert quiet_hours_end(True, "13:00", "14:00", None, datetime(2026, 3, 2, 14)) is None
+        assert quiet_hours_end(False, "13:00", "14:00", None, now) is None
+        assert quiet_hours_end(True, "9:00", "14:00", "Not/AZone", now) == datetime(2026, 3, 2, 14, 0)
+
+    def test_schema_rejects_unknown_timezones(self):
+        assert NotificationPreferencesUpdate(timezone="America/Bogota").timezone == "America/Bogota"
+        with pytest.raises(ValueError):
+            NotificationPreferencesUpdate(timezone="Mars/Olympus")
+
+
+class TestDeferredSends:
+    """Tests for quiet hours in the send paths."""
+
+    async def add_users(self, db, count, **preferences):
+        ids = [uuid.uuid4() for _ in range(count)]
+        await db.execute(insert(User), [
+            {
+                "id": user_id,
+                "username": f"u-{user_id.hex[:10]}",
+                "email": f"{user_id.hex[:10]}@example.com",
+                "password_hash": "x",
+                "user_type": UserType.BUYER,
+            }
+            for user_id in ids
+        ])
+        if preferences:
+            db.add_all(UserNotificationPreference(user_id=user_id, **preferences) for user_id in ids)
+        await db.commit()
+        return ids
+
+    async def test_send_inside_quiet_hours_is_deferred(self, session_factory, wakes):
+        scheduler = NotificationDeferralScheduler()
+        now = datetime.utcnow()
+        quiet_now = dict(
+            quiet_hours_enabled=True,
+            quiet_hours_start=f"{(now - timedelta(hours=1)):%H:%M}",
+            quiet_hours_end=f"{(now + timedelta(hours=1)):%H:%M}",
+        )
+        async with session_factory() as db:
+            (quiet,) = await self.add_users(db, 1, **quiet_now)
+            (loud,) = await self.add_users(db, 1)
+            service = NotificationService()
+            with pytest.MonkeyPatch.context() as mp:
+                mp.setattr(notification_service_module, "notification_deferrals", scheduler)
+                push = await service.send_notification(
+                    db, quiet, NotificationType.PUSH, NotificationCategory.ORDER, "t", "m"
+                )
+                in_app = await service.send_notification(
+                    db, quiet, NotificationType.IN_APP, NotificationCategory.ORDER, "t", "m"
+                )
+                bulk = await service.send_bulk_notification(
+                    db, [quiet, loud], NotificationType.EMAIL, NotificationCategory.ORDER, "t", "m"
+                )
+
+        assert push.status == NotificationStatus.DEFERRED
+        assert push.deliver_after == (now + timedelta(hours=1)).replace(second=0, microsecond=0)
+        assert in_app.status == NotificationStatus.PENDING
+        assert {n.user_id: n.status for n in bulk} == {
+            quiet: NotificationStatus.DEFERRED, loud: NotificationStatus.PENDING
+        }
+        # Both deferred rows end at the same minute: one release instant
+        assert scheduler.pending_releases == 1
+
+
+class TestDeferralScheduler:
+    """Tests for NotificationDeferralScheduler."""
+
+    async def test_due_rows_are_released_in_batches(self, session_factory, wakes):
+        now = datetime.utcnow()
+        await add_deferred(session_factory, 25, now - timedelta(minutes=1))
+        await add_deferred(session_factory, 5, now + timedelta(hours=1))
+        scheduler = NotificationDeferralScheduler(batch_size=10)
+
+        async with session_factory() as db:
+            with track_queries() as stats:
+                assert await scheduler.release_due(db, now) == 25
+        assert stats.query_count == 3  # 10 + 10 + 5
+        assert await status_counts(session_factory) == {
+            NotificationStatus.PENDING: 25, NotificationStatus.DEFERRED: 5
+        }
+        assert wakes == [1]
+
+    async def test_resync_schedules_each_distinct_instant_once(self, session_factory):
+        later = datetime.utcnow().replace(microsecond=0) + timedelta(hours=2)
+        await add_deferred(session_factory, 50, later)
+        await add_deferred(session_factory, 50, later + timedelta(minutes=30))
+        scheduler = NotificationDeferralScheduler()
+
+        async with session_factory() as db:
+            assert await scheduler.resync(db) == 2
+            await scheduler.resync(db)
+        assert scheduler.pending_releases == 2
+
+        assert not scheduler.due(time.time())
+        assert scheduler.due(time.time() + 3 * 3600)
+        assert scheduler.pending_releases == 0
+
+    async def test_background_loop_releases_when_the_window_ends(self, session_factory, wakes):
+        await add_deferred(session_factory, 3, datetime.utcnow() + timedelta(seconds=0.1))
+        scheduler = NotificationDeferralScheduler(tick_seconds=0.05)
+        scheduler.start(session_factory)
+        try:
+            for _ in range(60):
+                if scheduler.released:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await scheduler.stop()
+
+        assert await status_counts(session_factory) == {NotificationStatus.PENDING: 3}
+
+
+async def test_idle_tick_cost_benchmark(session_factory):
+    """Wheel ticks vs. polling the deferred rows, with 20k messages waiting."""
+    later = datetime.utcnow() + timedelta(hours=8)
+    await add_deferred(session_factory, 20_000, later)
+    scheduler = NotificationDeferralScheduler()
+    ticks = 200
+
+    async with session_factory() as db:
+        await scheduler.resync(db)
+        started = time.perf_counter()
+        for _ in range(ticks):
+            await db.execute(
+                select(Notification.id).where(
+                    Notification.status == NotificationStatus.DEFERRED,
+                    Notification.deliver_after <= datetime.utcnow(),
+                )
+            )
+        polling = (time.perf_counter() - started) / ticks
+        await db.rollback()
+
+    started = time.perf_counter()
+    clock = time.time()
+    for tick in range(ticks):
+        assert not scheduler.due(clock + tick)
+    wheel = (time.perf_counter() - started) / ticks
+
+    print(f"\nIdle tick with 20k deferred: polling {polling * 1e6:.0f}us, wheel {wheel * 1e6:.1f}us")
+    assert wheel < polling
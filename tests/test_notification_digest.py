@@ -0,0 +1,164 @@
+"""
+Tests for digest coalescing.
+"""
+
+import importlib
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.models.shared.notification import (
+    DeviceToken,
+    Notification,
+    NotificationCategory,
+    NotificationDigestItem,
+    NotificationStatus,
+    NotificationTemplate,
+    NotificationType,
+    UserNotificationPreference,
+)
+from app.models.users.user import User, UserType
+from app.services.notification_digest import NotificationDigestBuffer
+from app.services.notification_outbox import NotificationWorkerPool
+from app.services.notification_service import NotificationService
+from app.services.notification_templates import NotificationTemplates
+from tests.sqlite_support import sqlite_session_factory
+
+pytest_plugins = ["tests.sqlite_support"]
+
+notification_service_module = importlib.import_module("app.services.notification_service")
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    tables = (
+        User.__table__,
+        UserNotificationPreference.__table__,
+        NotificationTemplate.__table__,
+        Notification.__table__,
+        NotificationDigestItem.__table__,
+        DeviceToken.__table__,
+    )
+    async for factory in sqlite_session_factory(tmp_path, tables):
+        async with factory() as db:
+            db.add_all(
+                NotificationTemplate(**template)
+                for template in NotificationTemplates.get_default_templates()
+                if template["name"].startswith("notification_digest")
+            )
+            await db.commit()
+        yield factory
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    buffer = NotificationDigestBuffer(window=300)
+    monkeypatch.setattr(notification_service_module, "notification_digests", buffer)
+    return buffer
+
+
+async def add_farmer(db):
+    user_id = uuid.uuid4()
+    await db.execute(insert(User), [{
+        "id": user_id,
+        "username": f"farmer-{user_id.hex[:8]}",
+        "email": f"{user_id.hex[:8]}@example.com",
+        "password_hash": "x",
+        "user_type": UserType.FARMER,
+    }])
+    await db.commit()
+    return user_id
+
+
+async def send_orders(service, db, user_id, count, notification_type=NotificationType.EMAIL):
+    return [
+        await service.send_notification(
+            db, user_id, notification_type, NotificationCategory.ORDER,
+            f"New order #{n}", f"Order #{n} is waiting"
+        )
+        for n in range(count)
+    ]
+
+
+async def deliver_all(session_factory, service):
+    service.email_provider.pool.send_message = AsyncMock()
+    async with session_factory() as db:
+        while await NotificationWorkerPool().claim_and_deliver(db, service):
+            pass
+    return service.email_provider.pool.send_message.await_count
+
+
+async def test_notifications_inside_the_window_become_one_digest(session_factory, wakes, buffer):
+    service = NotificationService()
+    async with session_factory() as db:
+        farmer = await add_farmer(db)
+        first, *held = await send_orders(service, db, farmer, 3)
+
+        assert first.status == NotificationStatus.PENDING
+        assert [n.status for n in held] == [NotificationStatus.DIGESTED] * 2
+        assert await buffer.flush_due(db, service) == 0  # window still open
+
+        assert await buffer.flush_due(db, service, datetime.utcnow() + timedelta(seconds=301)) == 1
+        digest = (
+            await db.scalars(select(Notification).where(Notification.template_id.is_not(None)))
+        ).one()
+        assert await db.scalar(select(func.count()).select_from(NotificationDigestItem)) == 0
+
+    assert digest.status == NotificationStatus.PENDING
+    assert digest.title == "You have 2 new order updates"
+    assert "New order #1" in digest.message and "New order #2" in digest.message
+    assert digest.data == {"digest_of": [held[0].id, held[1].id]}
+    assert digest.recipient == first.recipient
+    assert wakes
+    assert await deliver_all(session_factory, service) == 2
+
+
+async def test_other_types_and_categories_are_not_held(session_factory, wakes, buffer):
+    service = NotificationService()
+    async with session_factory() as db:
+        farmer = await add_farmer(db)
+        in_app = await send_orders(service, db, farmer, 2, NotificationType.IN_APP)
+        marketing = [
+            await service.send_notification(
+                db, farmer, NotificationType.EMAIL, NotificationCategory.MARKETING, "Sale", "Now"
+            )
+            for _ in range(2)
+        ]
+    assert {n.status for n in in_app + marketing} == {NotificationStatus.PENDING}
+
+
+async def test_buffered_items_survive_a_restart(session_factory, wakes, buffer):
+    service = NotificationService()
+    async with session_factory() as db:
+        farmer = await add_farmer(db)
+        _, held = await send_orders(service, db, farmer, 2)
+
+    # A fresh buffer, as after a restart, finds the item in the table
+    restarted = NotificationDigestBuffer(window=300)
+    async with session_factory() as db:
+        queued = await restarted.flush_due(db, service, datetime.utcnow() + timedelta(seconds=301))
+        flushed = await db.get(Notification, held.id)
+
+    # A window holding a single item sends it unchanged
+    assert queued == 1
+    assert flushed.status == NotificationStatus.PENDING
+    assert restarted.digests == 0
+
+
+async def test_digest_benchmark(session_factory, wakes, buffer):
+    """A farmer receives 40 order emails in a burst: provider calls with and without digests."""
+    counts = {}
+    for window in (0, 300):
+        buffer.configure(window, ["order"], batch_size=500, flush_interval=5)
+        service = NotificationService()
+        async with session_factory() as db:
+            farmer = await add_farmer(db)
+            await send_orders(service, db, farmer, 40)
+            await buffer.flush_due(db, service, datetime.utcnow() + timedelta(seconds=301))
+        counts[window] = await deliver_all(session_factory, service)
+
+    print(f"\n40 order emails in a burst: {counts[0]} provider calls without digests, {counts[300]} with")
+    assert counts == {0: 40, 300: 2}
@@ -0,0 +1,251 @@
+"""
+Tests for idempotency keys on notification creation.
+"""
+
+import importlib
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select, update
+
+from app.core.query_stats import track_queries
+from app.models.shared.notification import (
+    Notification,
+    NotificationCategory,
+    NotificationDigestItem,
+    NotificationIdempotencyKey,
+    NotificationTemplate,
+    NotificationType,
+    UserNotificationPreference,
+)
+from app.models.users.user import User, UserType
+from app.schemas.notification import NotificationBulkCreate, NotificationCreate
+from app.services.notification_idempotency import NotificationIdempotency, first_replayed
+from app.services.notification_service import NotificationService
+from tests.sqlite_support import sqlite_session_factory
+
+pytest_plugins = ["tests.sqlite_support"]
+
+notification_service_module = importlib.import_module("app.services.notification_service")
+notifications_api = importlib.import_module("app.api.notifications")
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    tables = (
+        User.__table__,
+        UserNotificationPreference.__table__,
+        NotificationTemplate.__table__,
+        Notification.__table__,
+        NotificationDigestItem.__table__,
+        NotificationIdempotencyKey.__table__,
+    )
+    async for factory in sqlite_session_factory(tmp_path, tables, instrument=True):
+        yield factory
+
+
+@pytest.fixture
+def keys(monkeypatch, wakes):
+    keys = NotificationIdempotency()
+    monkeypatch.setattr(notification_service_module, "notification_idempotency", keys)
+    return keys
+
+
+async def add_users(db, count):
+    ids = [uuid.uuid4() for _ in range(count)]
+    await db.execute(insert(User), [
+        {
+            "id": user_id,
+            "username": f"u-{user_id.hex[:10]}",
+            "email": f"{user_id.hex[:10]}@example.com",
+            "password_hash": "x",
+            "user_type": UserType.FARMER,
+        }
+        for user_id in ids
+    ])
+    await db.commit()
+    return ids
+
+
+def order_request(user_id, **overrides):
+    fields = dict(
+        user_id=user_id,
+        notification_type=NotificationType.IN_APP,
+        category=NotificationCategory.ORDER,
+        title="New order #7",
+        message="Order #7 is waiting",
+        idempotency_key="order-7-created",
+    )
+    fields.update(overrides)
+    return NotificationCreate(**fields)
+
+
+async def create(service, keys, db, requester, request):
+    """What POST /api/notifications/ does with a key."""
+    key = keys.key_for(requester, request.idempotency_key, request)
+    replayed = await keys.replay(db, key)
+    if replayed is not None:
+        return first_replayed(replayed)
+    return await service.send_notification(
+        db, request.user_id, request.notification_type, request.category,
+        request.title, request.message, idempotency_key=key
+    )
+
+
+async def notification_count(db):
+    return await db.scalar(select(func.count()).select_from(Notification))
+
+
+async def test_repeat_returns_the_original_without_writing(session_factory, keys):
+    service = NotificationService()
+    async with session_factory() as db:
+        requester, farmer = await add_users(db, 2)
+        request = order_request(farmer)
+        first = await create(service, keys, db, requester, request)
+
+        with track_queries() as stats:
+            repeat = await create(service, keys, db, requester, request)
+
+        assert repeat.id == first.id
+        assert await notification_count(db) == 1
+    assert keys.hits == 1
+    assert stats.query_count == 1  # reads the original row back
+    assert not any(shape.startswith(("INSERT", "UPDATE", "DELETE")) for shape in stats.shapes)
+
+
+async def test_key_is_found_in_the_table_by_other_processes(session_factory, keys):
+    service = NotificationService()
+    async with session_factory() as db:
+        requester, farmer = await add_users(db, 2)
+        request = order_request(farmer)
+        first = await create(service, keys, db, requester, request)
+
+    restarted = NotificationIdempotency()
+    async with session_factory() as db:
+        key = restarted.key_for(requester, request.idempotency_key, request)
+        assert [n.id for n in await restarted.replay(db, key)] == [first.id]
+
+        # Other requesters and other keys are independent
+        assert await restarted.replay(db, restarted.key_for(farmer, request.idempotency_key, request)) is None
+        assert await restarted.replay(db, restarted.key_for(requester, "order-8-created", request)) is None
+
+
+async def test_concurrent_first_requests_create_one_notification(session_factory, keys):
+    """Both requests miss the cache; the unique index lets only one insert."""
+    service = NotificationService()
+    async with session_factory() as db:
+        requester, farmer = await add_users(db, 2)
+    request = order_request(farmer)
+    key = keys.key_for(requester, request.idempotency_key, request)
+
+    results = []
+    for _ in range(2):
+        async with session_factory() as db:
+            keys.configure(ttl=86400, cache_size=100)  # no shared cache
+            results.append(await service.send_notification(
+                db, farmer, NotificationType.IN_APP, NotificationCategory.ORDER,
+                request.title, request.message, idempotency_key=key
+            ))
+
+    assert results[0].id == results[1].id
+    async with session_factory() as db:
+        assert await notification_count(db) == 1
+
+
+async def test_reusing_a_key_for_a_different_request_is_rejected(session_factory, keys):
+    service = NotificationService()
+    async with session_factory() as db:
+        requester, farmer = await add_users(db, 2)
+        await create(service, keys, db, requester, order_request(farmer))
+        with pytest.raises(HTTPException) as error:
+            await create(service, keys, db, requester, order_request(farmer, title="New order #8"))
+    assert error.value.status_code == 422
+
+
+async def test_expired_keys_are_replaced(session_factory, keys):
+    service = NotificationService()
+    async with session_factory() as db:
+        requester, farmer = await add_users(db, 2)
+        first = await create(service, keys, db, requester, order_request(farmer))
+        await db.execute(
+            update(NotificationIdempotencyKey)
+            .values(created_at=datetime.utcnow() - timedelta(days=2))
+        )
+        await db.commit()
+        keys.configure(ttl=86400, cache_size=100)
+
+        second = await create(service, keys, db, requester, order_request(farmer))
+        assert second.id != first.id
+        assert await db.scalar(select(func.count()).select_from(NotificationIdempotencyKey)) == 1
+
+
+async def test_repeat_after_the_original_was_deleted_does_not_send_again(session_factory, keys):
+    service = NotificationService()
+    async with session_factory() as db:
+        requester, farmer = await add_users(db, 2)
+        await create(service, keys, db, requester, order_request(farmer))
+        await db.execute(Notification.__table__.delete())
+        await db.commit()
+
+        with pytest.raises(HTTPException) as error:
+            await create(service, keys, db, requester, order_request(farmer))
+        assert error.value.status_code == 410
+        assert await notification_count(db) == 0
+
+
+async def test_bulk_repeat_returns_the_original_notifications(session_factory, keys):
+    service = NotificationService()
+    async with session_factory() as db:
+        requester, *farmers = await add_users(db, 4)
+        request = NotificationBulkCreate(
+            user_ids=farmers,
+            notification_type=NotificationType.IN_APP,
+            category=NotificationCategory.SYSTEM,
+            title="Maintenance tonight",
+            message="Back by 2am",
+            idempotency_key="maintenance-2026-10-19",
+        )
+        key = keys.key_for(requester, request.idempotency_key, request)
+        sent = await service.send_bulk_notification(
+            db, farmers, request.notification_type, request.category,
+            request.title, request.message, idempotency_key=key
+        )
+        # A retry that raced past the replay check
+        keys.configure(ttl=86400, cache_size=100)
+        retried = await service.send_bulk_notification(
+            db, farmers, request.notification_type, request.category,
+            request.title, request.message, idempotency_key=key
+        )
+
+        assert sorted(n.id for n in retried) == sorted(n.id for n in sent)
+        assert await notification_count(db) == 3
+
+
+async def test_concurrent_claim_with_a_different_body_is_a_422(session_factory, keys, monkeypatch):
+    """The loser of the key race replays inside the endpoint; its 422 is not wrapped as a 500."""
+    monkeypatch.setattr(notifications_api, "notification_idempotency", keys)
+    service = NotificationService()
+    async with session_factory() as db:
+        requester, farmer = await add_users(db, 2)
+        await create(service, keys, db, requester, order_request(farmer))
+    requester_user = SimpleNamespace(id=requester)
+
+    # The second request's replay check runs before the first one commits
+    keys.configure(ttl=86400, cache_size=100)
+    replay, checks = keys.replay, []
+
+    async def replay_after_race(db, key):
+        checks.append(key)
+        return None if len(checks) == 1 else await replay(db, key)
+
+    monkeypatch.setattr(keys, "replay", replay_after_race)
+    async with session_factory() as db:
+        with pytest.raises(HTTPException) as error:
+            await notifications_api.create_notification(
+                order_request(farmer, title="New order #8"), None, db, requester_user
+            )
+    assert len(checks) == 2  # the pre-check and the replay after the failed claim
+    assert error.value.status_code == 422
@@ -0,0 +1,156 @@
+"""
+Tests for priority lanes in notification delivery.
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql
+
+from app.models.shared.notification import (
+    DeviceToken,
+    Notification,
+    NotificationCategory,
+    NotificationStatus,
+    NotificationType,
+)
+from app.services.notification_lanes import (
+    DEFAULT_LANES,
+    DeliveryLane,
+    build_lanes,
+    get_lane_backlog,
+    lanes_from_settings,
+    pick_lane,
+)
+from app.services.notification_outbox import NotificationWorkerPool
+from app.services.notification_service import NotificationService
+from tests.sqlite_support import sqlite_session_factory
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    async for factory in sqlite_session_factory(
+        tmp_path, (Notification.__table__, DeviceToken.__table__)
+    ):
+        yield factory
+
+
+async def add_pending(session_factory, count, category, created_at=None):
+    async with session_factory() as db:
+        await db.execute(insert(Notification), [
+            {
+                "user_id": uuid.uuid4(),
+                "notification_type": NotificationType.IN_APP,
+                "category": category,
+                "status": NotificationStatus.PENDING,
+                "title": "Hello",
+                "message": "World",
+                "recipient": "x",
+                "created_at": created_at or datetime.utcnow(),
+            }
+            for _ in range(count)
+        ])
+        await db.commit()
+
+
+async def pending_categories(session_factory):
+    async with session_factory() as db:
+        result = await db.scalars(
+            select(Notification.category).where(Notification.status == NotificationStatus.PENDING)
+        )
+        return sorted(result.all())
+
+
+class TestLaneConfiguration:
+    """Tests for building and scheduling lanes."""
+
+    def test_unlisted_categories_go_to_the_lowest_weight_lane(self):
+        lanes = build_lanes({
+            "transactional": {"categories": ["order", "account"], "weight": 4, "workers": 4},
+            "bulk": {"categories": ["marketing"], "weight": 1, "workers": 1},
+        })
+        assert lanes[1].categories == {"marketing", "system", "product"}
+        assert lanes_from_settings(SimpleNamespace())[0].name == "transactional"
+
+    def test_weighted_round_robin_and_budgets(self):
+        transactional, bulk = build_lanes(DEFAULT_LANES)
+        picks = [pick_lane([transactional, bulk]).name for _ in range(10)]
+        assert picks.count("transactional") == 8
+        assert picks.count("bulk") == 2
+        assert picks[:5].count("bulk") == 1  # interleaved, not bunched
+
+        bulk.in_flight = bulk.workers  # at its budget
+        assert {pick_lane([transactional, bulk]).name for _ in range(5)} == {"transactional"}
+        transactional.idle = True
+        assert pick_lane([transactional, bulk]) is None
+
+    def test_claim_is_restricted_to_the_lane_categories(self):
+        transactional = build_lanes(DEFAULT_LANES)[0]
+        sql = str(
+            NotificationWorkerPool().claim_statement(transactional)
+            .compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+        )
+        assert "notifications.category IN ('account', 'order', 'product')" in sql
+        assert "FOR UPDATE SKIP LOCKED" in sql
+
+
+async def test_transactional_claim_skips_an_older_marketing_backlog(session_factory):
+    await add_pending(
+        session_factory, 30, NotificationCategory.MARKETING, datetime.utcnow() - timedelta(hours=1)
+    )
+    await add_pending(session_factory, 2, NotificationCategory.ACCOUNT)
+    pool = NotificationWorkerPool(batch_size=10)
+    transactional = pool.lanes[0]
+
+    async with session_factory() as db:
+        assert await pool.claim_and_deliver(db, NotificationService(), transactional) == 2
+
+    assert await pending_categories(session_factory) == ["marketing"] * 30
+    status = pool.lane_status()["transactional"]
+    assert status["latency_seconds"]["count"] == 2
+    assert status["slo_attainment"] == 1.0
+    async with session_factory() as db:
+        backlog = await get_lane_backlog(db, pool.lanes)
+    assert backlog["transactional"]["pending"] == 0
+    assert backlog["bulk"]["pending"] == 30
+    assert backlog["bulk"]["oldest_age_seconds"] >= 3600
+
+
+async def test_latency_benchmark(session_factory):
+    """20 order notifications queued behind a 1000-row marketing send."""
+
+    async def time_orders(lanes):
+        async with session_factory() as db:
+            await db.execute(Notification.__table__.delete())
+            await db.commit()
+        await add_pending(session_factory, 1000, NotificationCategory.MARKETING)
+        await add_pending(session_factory, 20, NotificationCategory.ORDER)
+
+        service = NotificationService()
+        deliver_batch = service.deliver_batch
+
+        async def slow_deliver_batch(db, batch):
+            await asyncio.sleep(0.05)  # provider round trips
+            return await deliver_batch(db, batch)
+
+        service.deliver_batch = slow_deliver_batch
+        pool = NotificationWorkerPool(concurrency=4, batch_size=50, poll_interval=0.05, lanes=lanes)
+        started = time.perf_counter()
+        pool.start(session_factory, service)
+        try:
+            while "order" in await pending_categories(session_factory):
+                await asyncio.sleep(0.005)
+            return time.perf_counter() - started
+        finally:
+            await pool.stop()
+
+    single = await time_orders([DeliveryLane("all", list(NotificationCategory), workers=4)])
+    laned = await time_orders(build_lanes(DEFAULT_LANES))
+
+    print(f"\nOrders behind a 1000-row marketing send: {single:.2f}s in one queue, {laned:.2f}s with lanes")
+    assert laned < single / 2
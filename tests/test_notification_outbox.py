@@ -0,0 +1,192 @@
+"""
+Tests for the notification outbox and its worker pool.
+"""
+
+import asyncio
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.models.shared.notification import (
+    DeviceToken,
+    Notification,
+    NotificationCategory,
+    NotificationStatus,
+    NotificationType,
+)
+from app.services.notification_outbox import NotificationWorkerPool
+from app.services.notification_service import NotificationService
+from tests.sqlite_support import sqlite_session_factory
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """A file-backed SQLite database shared by several worker sessions."""
+    async for factory in sqlite_session_factory(
+        tmp_path, (Notification.__table__, DeviceToken.__table__)
+    ):
+        yield factory
+
+
+@pytest.fixture
+def service():
+    service = NotificationService()
+    service.email_provider.send_email = AsyncMock(return_value=True)
+
+    async def send_push_batch(platform, tokens, title, body, data=None):
+        return {token: "NotRegistered" if token.startswith("dead") else None for token in tokens}
+
+    service.push_provider.send_push_batch = AsyncMock(side_effect=send_push_batch)
+    return service
+
+
+async def add_pending(
+    session_factory, count, notification_type=NotificationType.IN_APP, user_id=None, title=None
+):
+    async with session_factory() as db:
+        db.add_all(
+            Notification(
+                user_id=user_id or uuid.uuid4(),
+                notification_type=notification_type,
+                category=NotificationCategory.ORDER,
+                status=NotificationStatus.PENDING,
+                title=title or f"Order {n}",
+                message="Your order shipped",
+                recipient="buyer@example.com",
+            )
+            for n in range(count)
+        )
+        await db.commit()
+
+
+async def statuses(session_factory):
+    async with session_factory() as db:
+        result = await db.execute(select(Notification.status, Notification.retry_count))
+        return sorted(result.all())
+
+
+def test_claim_skips_rows_locked_by_other_workers():
+    sql = str(
+        NotificationWorkerPool(batch_size=50)
+        .claim_statement()
+        .compile(dialect=postgresql.dialect())
+    )
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "ORDER BY notifications.created_at" in sql
+
+
+async def test_claim_delivers_batch_and_writes_status_back(session_factory, service):
+    await add_pending(session_factory, 3, NotificationType.EMAIL)
+    service.email_provider.send_email.side_effect = [True, False, True]
+    pool = NotificationWorkerPool(batch_size=10)
+
+    async with session_factory() as db:
+        assert await pool.claim_and_deliver(db, service) == 3
+    async with session_factory() as db:
+        assert await pool.claim_and_deliver(db, service) == 0
+
+    assert await statuses(session_factory) == [
+        ("retrying", 1),
+        ("sent", 0),
+        ("sent", 0),
+    ]
+
+
+async def test_push_tokens_are_loaded_once_per_batch(session_factory, service):
+    user_id = uuid.uuid4()
+    async with session_factory() as db:
+        db.add_all([
+            DeviceToken(user_id=user_id, token="a", platform="android", is_active=True),
+            DeviceToken(user_id=user_id, token="b", platform="ios", is_active=True),
+        ])
+        await db.commit()
+    await add_pending(session_factory, 2, NotificationType.PUSH, user_id=user_id)
+    await add_pending(session_factory, 1, NotificationType.PUSH)  # no tokens
+
+    async with session_factory() as db:
+        await NotificationWorkerPool().claim_and_deliver(db, service)
+
+    # Two payloads, each to one android and one ios device
+    assert service.push_provider.send_push_batch.await_count == 4
+    assert await statuses(session_factory) == [("retrying", 1), ("sent", 0), ("sent", 0)]
+
+
+async def test_identical_pushes_are_grouped_and_dead_tokens_deactivated(session_factory, service):
+    user_ids = [uuid.uuid4() for _ in range(3)]
+    async with session_factory() as db:
+        db.add_all([
+            DeviceToken(user_id=user_ids[0], token="a", platform="android", is_active=True),
+            DeviceToken(user_id=user_ids[1], token="b", platform="android", is_active=True),
+            DeviceToken(user_id=user_ids[1], token="dead-b", platform="android", is_active=True),
+            DeviceToken(user_id=user_ids[2], token="dead-c", platform="android", is_active=True),
+        ])
+        await db.commit()
+    for user_id in user_ids:
+        await add_pending(session_factory, 1, NotificationType.PUSH, user_id=user_id, title="Sale")
+
+    async with session_factory() as db:
+        await NotificationWorkerPool().claim_and_deliver(db, service)
+
+    service.push_provider.send_push_batch.assert_awaited_once()
+    platform, tokens = service.push_provider.send_push_batch.await_args.args[:2]
+    assert (platform, sorted(tokens)) == ("android", ["a", "b", "dead-b", "dead-c"])
+
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Notification.user_id, Notification.status, Notification.error_message)
+        )
+        outcome = {user_id: (s, e) for user_id, s, e in result.all()}
+        active = set(await db.scalars(select(DeviceToken.token).where(DeviceToken.is_active.is_(True))))
+
+    assert outcome[user_ids[0]] == ("sent", None)
+    assert outcome[user_ids[1]] == ("sent", None)  # one of two devices received it
+    assert outcome[user_ids[2]] == ("retrying", "NotRegistered")
+    assert active == {"a", "b"}
+
+
+async def test_batch_size_bounds_each_claim(session_factory, service):
+    await add_pending(session_factory, 5)
+    pool = NotificationWorkerPool(batch_size=2)
+
+    async with session_factory() as db:
+        assert await pool.claim_and_deliver(db, service) == 2
+
+    pending = [s for s, _ in await statuses(session_factory) if s == "pending"]
+    assert len(pending) == 3
+
+
+async def test_worker_pool_drains_outbox_and_stops(session_factory, service):
+    await add_pending(session_factory, 25)
+    pool = NotificationWorkerPool(concurrency=3, batch_size=4, poll_interval=0.05)
+
+    pool.start(session_factory, service)
+    try:
+        for _ in range(100):
+            if all(s == "sent" for s, _ in await statuses(session_factory)):
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await pool.stop()
+
+    assert not pool.running
+    assert [s for s, _ in await statuses(session_factory)] == ["sent"] * 25
+
+
+async def test_wake_shortens_idle_wait(session_factory, service):
+    pool = NotificationWorkerPool(concurrency=1, batch_size=10, poll_interval=30)
+    pool.start(session_factory, service)
+    try:
+        await asyncio.sleep(0.05)  # worker is now idle until woken
+        await add_pending(session_factory, 1)
+        pool.wake()
+        for _ in range(100):
+            if await statuses(session_factory) == [("sent", 0)]:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await pool.stop()
+
+    assert await statuses(session_factory) == [("sent", 0)]
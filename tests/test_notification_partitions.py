@@ -0,0 +1,118 @@
+"""
+Tests for notification partition maintenance and retention.
+"""
+
+from datetime import date, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.services.notification_partitions import (
+    NotificationPartitionManager,
+    add_months,
+    expired_partitions,
+    planned_partitions,
+)
+
+
+def test_add_months_crosses_years():
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+
+def test_planned_partitions_cover_current_and_upcoming_months():
+    planned = planned_partitions(date(2026, 12, 15), months_ahead=1)
+    order = [p for p in planned if p[0] == "order"]
+
+    assert order == [
+        ("order", "notifications_order_2026_12", date(2026, 12, 1), date(2027, 1, 1)),
+        ("order", "notifications_order_2027_01", date(2027, 1, 1), date(2027, 2, 1)),
+    ]
+    assert len(planned) == 10  # two months for each of the five categories
+
+
+def test_expired_partitions_keep_full_retention_window():
+    names = [
+        "notifications_marketing_2026_06",
+        "notifications_marketing_2026_07",
+        "notifications_marketing_2026_08",
+        "notifications_marketing_default",
+    ]
+    # Three months kept before October: July, August, September
+    assert expired_partitions(names, 3, date(2026, 10, 19)) == [
+        "notifications_marketing_2026_06"
+    ]
+
+
+def test_unknown_retention_category_is_rejected():
+    with pytest.raises(ValueError):
+        NotificationPartitionManager(retention_months={"orders; DROP TABLE users": 1})
+
+
+async def test_plain_table_retention_deletes_per_category():
+    """SQLite keeps the plain table and expires rows with one DELETE per category."""
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.execute(
+            text("CREATE TABLE notifications (id INTEGER PRIMARY KEY, category TEXT, created_at DATETIME)")
+        )
+        await conn.execute(
+            text("INSERT INTO notifications (category, created_at) VALUES (:c, :t)"),
+            [
+                {"c": "marketing", "t": datetime(2026, 5, 1)},
+                {"c": "marketing", "t": datetime(2026, 9, 1)},
+                {"c": "order", "t": datetime(2026, 5, 1)},
+            ],
+        )
+
+    manager = NotificationPartitionManager(retention_months={"marketing": 3})
+    try:
+        async with engine.begin() as conn:
+            assert await manager.ensure_partitions(conn) == []
+            removed = await manager.apply_retention(conn, today=date(2026, 10, 19))
+            remaining = (
+                await conn.execute(text("SELECT category, created_at FROM notifications ORDER BY id"))
+            ).all()
+    finally:
+        await engine.dispose()
+
+    assert removed == ["marketing: 1 rows"]
+    assert [row[0] for row in remaining] == ["marketing", "order"]
+
+
+async def test_partitioned_retention_detaches_and_drops():
+    manager = NotificationPartitionManager(
+        retention_months={"marketing": 3}, retention_mode="drop"
+    )
+    manager.is_partitioned = AsyncMock(return_value=True)
+    manager._child_partitions = AsyncMock(
+        return_value=["notifications_marketing_2026_05", "notifications_marketing_2026_09"]
+    )
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+
+    removed = await manager.apply_retention(conn, today=date(2026, 10, 19))
+
+    statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+    assert removed == ["notifications_marketing_2026_05"]
+    assert statements == [
+        "ALTER TABLE notifications_marketing DETACH PARTITION notifications_marketing_2026_05",
+        "DROP TABLE notifications_marketing_2026_05",
+    ]
+
+
+async def test_detach_mode_keeps_the_detached_table():
+    manager = NotificationPartitionManager(
+        retention_months={"system": 1}, retention_mode="detach"
+    )
+    manager.is_partitioned = AsyncMock(return_value=True)
+    manager._child_partitions = AsyncMock(return_value=["notifications_system_2026_01"])
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+
+    await manager.apply_retention(conn, today=date(2026, 10, 19))
+
+    [statement] = [str(call.args[0]) for call in conn.execute.call_args_list]
+    assert statement.startswith("ALTER TABLE notifications_system DETACH")
@@ -0,0 +1,173 @@
+"""
+Tests for the notification preference bitmask.
+"""
+
+import importlib.util
+import random
+import time
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.core.query_stats import instrument_engine, track_queries
+from app.models.shared.notification import (
+    DEFAULT_PREFERENCE_MASK,
+    PREFERENCE_CATEGORY_NAMES,
+    NotificationCategory,
+    NotificationType,
+    UserNotificationPreference,
+)
+from app.models.users.user import User, UserType
+from app.schemas.notification import NotificationPreferencesBase, NotificationPreferencesResponse
+from app.services.notification_service import NotificationService
+from tests.sqlite_support import sqlite_session
+
+FLAGS = [
+    f"{notification_type.value}_{suffix}"
+    for notification_type in NotificationType
+    for suffix in ("enabled", *PREFERENCE_CATEGORY_NAMES.values())
+]
+
+
+@pytest.fixture
+async def db_session():
+    async for session in sqlite_session([User.__table__, UserNotificationPreference.__table__]):
+        instrument_engine(session.bind.sync_engine)
+        yield session
+
+
+async def add_user(db, **preferences):
+    user_id = uuid.uuid4()
+    await db.execute(insert(User), [{
+        "id": user_id,
+        "username": f"user-{user_id.hex[:8]}",
+        "email": f"{user_id.hex[:8]}@example.com",
+        "password_hash": "x",
+        "user_type": UserType.BUYER,
+    }])
+    db.add(UserNotificationPreference(user_id=user_id, **preferences))
+    await db.commit()
+    return user_id
+
+
+def test_defaults_match_the_preferences_schema():
+    prefs = UserNotificationPreference()
+    schema_defaults = NotificationPreferencesBase()
+    assert {flag: getattr(prefs, flag) for flag in FLAGS} == {
+        flag: getattr(schema_defaults, flag) for flag in FLAGS
+    }
+    assert prefs.mask == DEFAULT_PREFERENCE_MASK
+
+
+def test_each_flag_owns_one_bit():
+    prefs = UserNotificationPreference(preference_mask=0)
+    for flag in FLAGS:
+        setattr(prefs, flag, True)
+        assert getattr(prefs, flag)
+    assert bin(prefs.preference_mask).count("1") == len(FLAGS) == 18
+    for flag in FLAGS:
+        setattr(prefs, flag, False)
+    assert prefs.preference_mask == 0
+
+
+def test_order_and_product_switches_are_honoured():
+    """The old string lookup built ``push_order``, which no column matched."""
+    prefs = UserNotificationPreference(push_orders=False)
+    assert not prefs.allows(NotificationType.PUSH, NotificationCategory.ORDER)
+    assert not prefs.allows(NotificationType.PUSH, NotificationCategory.PRODUCT)  # off by default
+    assert prefs.allows(NotificationType.EMAIL, NotificationCategory.PRODUCT)
+
+
+def test_migration_writes_the_model_layout():
+    path = Path(__file__).parents[1] / "alembic/versions/006_notification_preference_bitmask.py"
+    spec = importlib.util.spec_from_file_location("migration_006", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    assert migration.DEFAULT_MASK == DEFAULT_PREFERENCE_MASK
+    for column, bit in migration._COLUMNS.items():
+        prefs = UserNotificationPreference(preference_mask=bit)
+        assert [flag for flag in FLAGS if getattr(prefs, flag)] == [column]
+
+
+async def test_sql_predicate_agrees_with_python(db_session):
+    rng = random.Random(42)
+    masks = [rng.getrandbits(24) for _ in range(40)] + [0, DEFAULT_PREFERENCE_MASK]
+    users = {}
+    for mask in masks:
+        users[await add_user(db_session, preference_mask=mask)] = mask
+
+    for notification_type in NotificationType:
+        for category in NotificationCategory:
+            result = await db_session.execute(
+                select(UserNotificationPreference.user_id).where(
+                    UserNotificationPreference.allows(notification_type, category)
+                )
+            )
+            expected = {
+                user_id for user_id, mask in users.items()
+                if UserNotificationPreference(preference_mask=mask).allows(notification_type, category)
+            }
+            assert set(result.scalars()) == expected
+
+
+async def test_single_send_gating_loads_user_and_preferences_in_one_query(db_session):
+    opted_out = await add_user(db_session, email_marketing=False)
+    opted_in = await add_user(db_session, email_marketing=True)
+    db_session.expunge_all()
+    service = NotificationService()
+
+    with track_queries() as stats:
+        user = await service._get_user_with_preferences(db_session, opted_out)
+        assert not await service._should_send_notification(
+            user, NotificationType.EMAIL, NotificationCategory.MARKETING
+        )
+    assert stats.query_count == 1
+
+    user = await service._get_user_with_preferences(db_session, opted_in)
+    assert await service._should_send_notification(
+        user, NotificationType.EMAIL, NotificationCategory.MARKETING
+    )
+
+
+async def test_preferences_api_reads_and_writes_flags(db_session):
+    user_id = await add_user(db_session)
+    prefs = await NotificationService().update_user_preferences(
+        db_session, user_id, {"push_enabled": False, "email_marketing": True}
+    )
+    response = NotificationPreferencesResponse.model_validate(prefs)
+    assert not response.push_enabled
+    assert response.email_marketing
+    assert response.email_orders
+
+
+def test_gating_benchmark():
+    """Bitwise AND vs. the old per-notification attribute lookups."""
+    prefs = UserNotificationPreference(email_marketing=True)
+    checks = [(t, c) for t in NotificationType for c in NotificationCategory] * 2000
+
+    def old_gate(prefs, notification_type, category):
+        if not getattr(prefs, f"{notification_type.value}_enabled"):
+            return False
+        category_attr = f"{notification_type.value}_{category.value}"
+        if hasattr(prefs, category_attr):
+            return getattr(prefs, category_attr)
+        return True
+
+    started = time.perf_counter()
+    for notification_type, category in checks:
+        old_gate(prefs, notification_type, category)
+    old = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for notification_type, category in checks:
+        prefs.allows(notification_type, category)
+    new = time.perf_counter() - started
+
+    print(
+        f"\nPreference checks: attribute lookups {len(checks) / old:.0f}/s, "
+        f"bitmask {len(checks) / new:.0f}/s"
+    )
+    assert new < old
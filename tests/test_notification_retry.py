@@ -0,0 +1,166 @@
+"""
+Tests for notification retry scheduling.
+"""
+
+import random
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql
+
+from app.core.query_stats import track_queries
+from app.models.shared.notification import (
+    DeviceToken,
+    Notification,
+    NotificationCategory,
+    NotificationStatus,
+    NotificationType,
+)
+from app.services.notification_outbox import NotificationWorkerPool
+from app.services.notification_retry import RetryPolicy, get_retry_queue_status
+from app.services.notification_service import NotificationService
+from tests.sqlite_support import sqlite_session_factory
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    async for factory in sqlite_session_factory(
+        tmp_path, (Notification.__table__, DeviceToken.__table__), instrument=True
+    ):
+        yield factory
+
+
+@pytest.fixture
+def service():
+    service = NotificationService()
+    service.retry_policy = RetryPolicy(attempts=2, base_delay=60, rng=random.Random(1))
+    service.email_provider.send_email = AsyncMock(return_value=False)
+    return service
+
+
+async def add_rows(session_factory, count, status, next_attempt_at=None, retry_count=0):
+    async with session_factory() as db:
+        await db.execute(insert(Notification), [
+            {
+                "user_id": uuid.uuid4(),
+                "notification_type": NotificationType.EMAIL,
+                "category": NotificationCategory.ORDER,
+                "status": status,
+                "title": "Order shipped",
+                "message": "On its way",
+                "recipient": "buyer@example.com",
+                "retry_count": retry_count,
+                "next_attempt_at": next_attempt_at,
+            }
+            for _ in range(count)
+        ])
+        await db.commit()
+
+
+async def rows(session_factory):
+    async with session_factory() as db:
+        result = await db.execute(
+            select(Notification.status, Notification.retry_count, Notification.next_attempt_at)
+            .order_by(Notification.id)
+        )
+        return result.all()
+
+
+class TestRetryPolicy:
+    """Tests for RetryPolicy."""
+
+    def test_backoff_doubles_with_jitter_up_to_the_ceiling(self):
+        policy = RetryPolicy(attempts=10, base_delay=300, max_delay=3600, rng=random.Random(3))
+        for failures, ceiling in [(1, 300), (2, 600), (3, 1200), (4, 2400), (5, 3600), (9, 3600)]:
+            delays = [policy.delay(failures) for _ in range(200)]
+            assert ceiling / 2 <= min(delays) and max(delays) <= ceiling
+            assert len(set(delays)) == len(delays)  # jittered, not in lockstep
+
+    def test_attempt_limit_and_settings(self):
+        policy = RetryPolicy.from_settings(
+            SimpleNamespace(notification_retry_attempts=2, notification_retry_delay=10)
+        )
+        now = datetime(2026, 1, 1)
+        assert policy.next_attempt(1, now) > now
+        assert policy.next_attempt(2, now) > now
+        assert policy.next_attempt(3, now) is None
+        assert policy.max_delay == 21600
+
+
+class TestRetryClaims:
+    """Tests for claiming due retries from the outbox."""
+
+    def test_retry_claim_uses_status_and_next_attempt_order(self):
+        sql = str(
+            NotificationWorkerPool()
+            .retry_claim_statement(10, datetime(2026, 1, 1))
+            .compile(dialect=postgresql.dialect())
+        )
+        assert "ORDER BY notifications.next_attempt_at" in sql
+        assert "FOR UPDATE SKIP LOCKED" in sql
+        index = next(
+            i for i in Notification.__table__.indexes
+            if i.name == "ix_notifications_status_next_attempt_at"
+        )
+        assert [c.name for c in index.columns] == ["status", "next_attempt_at"]
+
+    async def test_failures_retry_until_attempts_run_out(self, session_factory, service):
+        await add_rows(session_factory, 1, NotificationStatus.PENDING)
+        pool = NotificationWorkerPool(batch_size=10)
+
+        async with session_factory() as db:
+            await pool.claim_and_deliver(db, service)
+        ((status, failures, next_attempt_at),) = await rows(session_factory)
+        assert (status, failures) == ("retrying", 1)
+        assert 30 <= (next_attempt_at - datetime.utcnow()).total_seconds() <= 60
+
+        # Not due yet: nothing to claim
+        async with session_factory() as db:
+            assert await pool.claim_and_deliver(db, service) == 0
+
+        for expected in [("retrying", 2), ("failed", 3)]:
+            async with session_factory() as db:
+                await db.execute(
+                    Notification.__table__.update().values(next_attempt_at=datetime.utcnow())
+                )
+                await db.commit()
+                assert await pool.claim_and_deliver(db, service) == 1
+            (row,) = await rows(session_factory)
+            assert row[:2] == expected
+        assert row.next_attempt_at is None
+
+    async def test_pending_rows_first_then_due_retries(self, session_factory, service):
+        service.email_provider.send_email.return_value = True
+        past = datetime.utcnow() - timedelta(minutes=5)
+        await add_rows(session_factory, 3, NotificationStatus.RETRYING, past, retry_count=1)
+        await add_rows(session_factory, 2, NotificationStatus.RETRYING, past + timedelta(hours=1), 1)
+        await add_rows(session_factory, 4, NotificationStatus.PENDING)
+        pool = NotificationWorkerPool(batch_size=6)
+
+        async with session_factory() as db:
+            with track_queries() as stats:
+                assert await pool.claim_and_deliver(db, service) == 6
+        assert stats.query_count == 3  # pending claim, retry claim, one bulk UPDATE
+
+        statuses = [status for status, _, _ in await rows(session_factory)]
+        assert statuses.count("sent") == 6
+        assert statuses[:3].count("sent") == 2  # the earliest due retries fill the batch
+        assert statuses[3:5] == ["retrying", "retrying"]  # not due
+        assert statuses[5:] == ["sent"] * 4
+
+
+async def test_retry_queue_status(session_factory):
+    now = datetime.utcnow()
+    await add_rows(session_factory, 3, NotificationStatus.RETRYING, now - timedelta(seconds=5), 1)
+    await add_rows(session_factory, 2, NotificationStatus.RETRYING, now + timedelta(hours=1), 1)
+    await add_rows(session_factory, 4, NotificationStatus.FAILED)
+
+    async with session_factory() as db:
+        status = await get_retry_queue_status(db, now + timedelta(minutes=10))
+
+    assert (status["depth"], status["due"]) == (5, 3)
+    assert 590 <= status["oldest_age_seconds"] <= 610
@@ -0,0 +1,170 @@
+"""
+Tests for segment-targeted notification sends.
+"""
+
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app.core.query_stats import track_queries
+from app.models.farmers.farmer import Farmer
+from app.models.shared.location import Location
+from app.models.shared.notification import (
+    Notification,
+    NotificationCategory,
+    NotificationStatus,
+    NotificationTemplate,
+    NotificationType,
+    UserNotificationPreference,
+)
+from app.models.users.user import User, UserType
+from app.schemas.notification import NotificationSegment
+from app.services.notification_service import NotificationService
+from tests.sqlite_support import sqlite_session_factory
+
+pytest_plugins = ["tests.sqlite_support"]
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    tables = (
+        User.__table__,
+        UserNotificationPreference.__table__,
+        NotificationTemplate.__table__,
+        Notification.__table__,
+        Location.__table__,
+        Farmer.__table__,
+    )
+    # WAL lets the chunk commits proceed while the recipient cursor is open
+    async for factory in sqlite_session_factory(tmp_path, tables, instrument=True, wal=True):
+        yield factory
+
+
+async def add_users(db, count, user_type=UserType.BUYER, **fields):
+    ids = [uuid.uuid4() for _ in range(count)]
+    await db.execute(insert(User), [
+        {
+            "id": user_id,
+            "username": f"u-{user_id.hex[:12]}",
+            "email": f"{user_id.hex[:12]}@example.com",
+            "password_hash": "x",
+            "user_type": user_type,
+            **fields,
+        }
+        for user_id in ids
+    ])
+    await db.commit()
+    return ids
+
+
+async def add_farmer(db, state, organic=False):
+    (user_id,) = await add_users(db, 1, UserType.FARMER)
+    location = Location(state=state, country="Mexico", latitude=20.6, longitude=-103.3)
+    db.add(location)
+    await db.flush()
+    db.add(Farmer(user_id=user_id, farm_name="Rancho", location_id=location.id, organic_certified=organic))
+    await db.commit()
+    return user_id
+
+
+async def send(service, session_factory, segment, category=NotificationCategory.MARKETING):
+    async with session_factory() as db, session_factory() as read_db:
+        return await service.send_segment_notification(
+            db, read_db, segment, NotificationType.IN_APP, category, "Harvest fair", "This Saturday"
+        )
+
+
+async def recipients(session_factory):
+    async with session_factory() as db:
+        return set(await db.scalars(select(Notification.user_id)))
+
+
+async def test_segment_filters_by_type_location_and_activity(session_factory, wakes):
+    async with session_factory() as db:
+        buyers = await add_users(db, 2)
+        await add_users(db, 1, is_active=False)
+        await add_users(db, 1, UserType.ADMIN)
+        jalisco = await add_farmer(db, "Jalisco", organic=True)
+        jalisco_conventional = await add_farmer(db, "Jalisco")
+        await add_farmer(db, "Oaxaca")
+        opted_out = await add_farmer(db, "Jalisco")
+        db.add(UserNotificationPreference(user_id=opted_out, in_app_marketing=False))
+        await db.commit()
+    service = NotificationService()
+
+    result = await send(service, session_factory, NotificationSegment(user_types=[UserType.BUYER]))
+    assert result == {"queued": 2, "deferred": 0}
+    assert await recipients(session_factory) == set(buyers)
+    assert wakes
+
+    async with session_factory() as db:
+        await db.execute(Notification.__table__.delete())
+        await db.commit()
+    await send(service, session_factory, NotificationSegment(farmer_state="jalisco"))
+    assert await recipients(session_factory) == {jalisco, jalisco_conventional}
+
+    async with session_factory() as db:
+        await db.execute(Notification.__table__.delete())
+        await db.commit()
+    await send(service, session_factory, NotificationSegment(farmer_state="Jalisco", organic_certified=True))
+    assert await recipients(session_factory) == {jalisco}
+
+
+async def test_joined_window_and_verification(session_factory, wakes):
+    now = datetime.utcnow()
+    async with session_factory() as db:
+        (new_verified,) = await add_users(db, 1, is_verified=True, created_at=now - timedelta(days=1))
+        await add_users(db, 1, is_verified=False, created_at=now - timedelta(days=1))
+        await add_users(db, 1, is_verified=True, created_at=now - timedelta(days=90))
+
+    await send(NotificationService(), session_factory, NotificationSegment(
+        is_verified=True, joined_after=now - timedelta(days=7)
+    ))
+    assert await recipients(session_factory) == {new_verified}
+
+
+async def test_recipients_are_written_in_committed_chunks(session_factory, wakes, monkeypatch):
+    async with session_factory() as db:
+        await add_users(db, 230)
+    service = NotificationService()
+    monkeypatch.setattr(service.settings, "notification_segment_chunk_size", 50)
+
+    with track_queries() as stats:
+        result = await send(service, session_factory, NotificationSegment())
+
+    assert result["queued"] == 230
+    inserts = sum(n for shape, n in stats.shapes.items() if shape.startswith("INSERT INTO notifications"))
+    assert inserts == 5
+    assert len(wakes) == 5  # workers start on the first chunk
+    async with session_factory() as db:
+        assert await db.scalar(
+            select(func.count()).where(Notification.status == NotificationStatus.PENDING)
+        ) == 230
+
+
+async def test_memory_benchmark(session_factory, wakes, monkeypatch):
+    """Peak memory to notify 10,000 users: an explicit id list versus a streamed segment."""
+    async with session_factory() as db:
+        user_ids = await add_users(db, 10_000)
+    service = NotificationService()
+    monkeypatch.setattr(service.settings, "notification_segment_chunk_size", 500)
+    monkeypatch.setattr(service.settings, "max_bulk_notifications", 10_000)
+
+    tracemalloc.start()
+    async with session_factory() as db:
+        await service.send_bulk_notification(
+            db, user_ids, NotificationType.IN_APP, NotificationCategory.SYSTEM, "Hi", "There"
+        )
+    _, by_ids = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    await send(service, session_factory, NotificationSegment(), NotificationCategory.SYSTEM)
+    _, streamed = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"\nPeak memory for 10k recipients: {by_ids / 2**20:.1f} MiB by ids, {streamed / 2**20:.1f} MiB streamed")
+    assert streamed < by_ids / 3
+    async with session_factory() as db:
+        assert await db.scalar(select(func.count()).select_from(Notification)) == 20_000
@@ -0,0 +1,207 @@
+"""
+Tests for the push provider's shared HTTP session and FCM multicast.
+
+A local aiohttp server stands in for FCM and records which client
+connection each request arrived on. Tokens starting with ``dead`` are
+reported as unregistered.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+
+from app.services.notification_service import PushProvider
+
+
+@pytest.fixture
+async def fcm_server():
+    """Local FCM stand-in; ``state["peers"]`` holds one entry per TCP connection."""
+    state = {"peers": set(), "requests": 0, "batches": [], "malformed": False}
+
+    async def send(request):
+        state["peers"].add(request.transport.get_extra_info("peername"))
+        state["requests"] += 1
+        body = await request.json()
+        if state["malformed"]:
+            return web.Response(text="<html>upstream hiccup</html>")
+        if request.headers["Authorization"] != "key=test-key":
+            return web.json_response({"error": "unauthorized"}, status=401)
+        tokens = body.get("registration_ids", [body.get("to")])
+        state["batches"].append(len(tokens))
+        results = [
+            {"error": "NotRegistered"} if token.startswith("dead") else {"message_id": token}
+            for token in tokens
+        ]
+        return web.json_response({"success": sum("message_id" in r for r in results), "results": results})
+
+    app = web.Application()
+    app.router.add_post("/fcm/send", send)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    state["url"] = f"http://127.0.0.1:{port}/fcm/send"
+    yield state
+    await runner.cleanup()
+
+
+def make_provider(url, **overrides):
+    settings = SimpleNamespace(
+        fcm_server_key="test-key",
+        fcm_url=url,
+        push_http_max_connections=10,
+        push_http_max_connections_per_host=4,
+        **overrides,
+    )
+    return PushProvider(settings)
+
+
+async def test_pushes_reuse_kept_alive_connections(fcm_server):
+    provider = make_provider(fcm_server["url"])
+    await provider.start()
+    try:
+        for n in range(20):
+            assert await provider.send_push_notification(f"token-{n}", "android", "Hi", "Body")
+    finally:
+        await provider.close()
+
+    assert fcm_server["requests"] == 20
+    assert len(fcm_server["peers"]) == 1
+
+
+async def test_concurrency_is_capped_by_per_host_limit(fcm_server):
+    provider = make_provider(fcm_server["url"])
+    try:
+        results = await asyncio.gather(*(
+            provider.send_push_notification(f"token-{n}", "android", "Hi", "Body")
+            for n in range(50)
+        ))
+    finally:
+        await provider.close()
+
+    assert all(results)
+    assert len(fcm_server["peers"]) <= 4
+
+
+async def test_session_is_recreated_after_close(fcm_server):
+    provider = make_provider(fcm_server["url"])
+    await provider.start()
+    await provider.close()
+
+    assert await provider.send_push_notification("token", "android", "Hi", "Body")
+    await provider.close()
+
+
+async def test_failed_push_reports_false(fcm_server):
+    provider = make_provider(fcm_server["url"])
+    provider.fcm_server_key = "wrong"
+    try:
+        assert not await provider.send_push_notification("token", "android", "Hi", "Body")
+    finally:
+        await provider.close()
+
+
+async def test_shared_session_latency_benchmark(fcm_server):
+    """Shared keep-alive session vs. a new session per push."""
+    pushes = 200
+
+    provider = make_provider(fcm_server["url"])
+    await provider.start()
+    started = time.perf_counter()
+    for n in range(pushes):
+        await provider.send_push_notification(f"t{n}", "android", "Hi", "Body")
+    shared = (time.perf_counter() - started) / pushes
+    await provider.close()
+    shared_connections = len(fcm_server["peers"])
+
+    fcm_server["peers"].clear()
+    started = time.perf_counter()
+    for n in range(pushes):
+        # What the provider used to do: a fresh session for every push
+        fresh = make_provider(fcm_server["url"])
+        await fresh.send_push_notification(f"t{n}", "android", "Hi", "Body")
+        await fresh.close()
+    per_push = (time.perf_counter() - started) / pushes
+    fresh_connections = len(fcm_server["peers"])
+
+    print(
+        f"\nFCM stand-in: shared session {shared * 1000:.2f}ms/push over "
+        f"{shared_connections} connection(s), new session {per_push * 1000:.2f}ms/push over "
+        f"{fresh_connections} connections"
+    )
+    assert shared_connections == 1
+    assert fresh_connections > pushes // 2  # ephemeral ports may repeat
+    assert shared < per_push
+
+
+async def test_multicast_splits_at_provider_limit(fcm_server):
+    provider = make_provider(fcm_server["url"], fcm_multicast_limit=100)
+    tokens = [f"token-{n}" for n in range(250)] + ["dead-1", "dead-2"]
+    try:
+        results = await provider.send_push_batch("android", tokens, "Sale", "Half price")
+    finally:
+        await provider.close()
+
+    assert sorted(fcm_server["batches"]) == [52, 100, 100]
+    assert results["dead-1"] == results["dead-2"] == "NotRegistered"
+    assert all(results[f"token-{n}"] is None for n in range(250))
+
+
+async def test_multicast_http_error_fails_every_token(fcm_server):
+    provider = make_provider(fcm_server["url"])
+    provider.fcm_server_key = "wrong"
+    try:
+        results = await provider.send_push_batch("android", ["a", "b"], "Hi", "Body")
+    finally:
+        await provider.close()
+
+    assert results == {"a": "FCM returned HTTP 401", "b": "FCM returned HTTP 401"}
+
+
+async def test_multicast_throughput_benchmark(fcm_server):
+    """One multicast request per 1000 tokens vs. one request per token."""
+    tokens = [f"token-{n}" for n in range(5000)]
+    provider = make_provider(fcm_server["url"], fcm_multicast_limit=1000)
+    try:
+        started = time.perf_counter()
+        results = await provider.send_push_batch("android", tokens, "Sale", "Half price")
+        multicast = time.perf_counter() - started
+        multicast_requests = fcm_server["requests"]
+
+        started = time.perf_counter()
+        sent = await asyncio.gather(*(
+            provider.send_push_notification(token, "android", "Sale", "Half price")
+            for token in tokens
+        ))
+        per_token = time.perf_counter() - started
+    finally:
+        await provider.close()
+
+    print(
+        f"\nFCM stand-in, {len(tokens)} devices: multicast {multicast * 1000:.0f}ms in "
+        f"{multicast_requests} requests, per-token {per_token * 1000:.0f}ms in {len(tokens)} requests"
+    )
+    assert all(error is None for error in results.values()) and all(sent)
+    assert multicast_requests == 5
+    assert multicast < per_token
+
+
+async def test_malformed_multicast_body_is_recorded_once(fcm_server):
+    """A 200 that is not JSON counts once for the breaker, as a success."""
+    fcm_server["malformed"] = True
+    provider = make_provider(fcm_server["url"])
+    outcomes = []
+    breaker = provider.breakers["fcm"]
+    record = breaker.record
+    breaker.record = lambda ok: (outcomes.append(ok), record(ok))[1]
+    try:
+        results = await provider.send_push_batch("android", ["a", "b"], "Hi", "Body")
+    finally:
+        await provider.close()
+
+    assert results == {"a": "Malformed FCM response", "b": "Malformed FCM response"}
+    assert outcomes == [True]
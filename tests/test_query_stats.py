@@ -0,0 +1,110 @@
+"""
+Tests for per-request SQL instrumentation and N+1 detection.
+"""
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.middleware import QueryStatsMiddleware
+from app.core.query_stats import (
+    fingerprint,
+    get_request_stats,
+    instrument_engine,
+    normalize_sql,
+    route_stats,
+    track_queries,
+)
+
+
+@pytest.fixture
+async def engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine.sync_engine)
+    yield engine
+    await engine.dispose()
+
+
+def test_normalize_sql_replaces_literals_and_params():
+    """Statements differing only in values share a shape."""
+    first = "SELECT * FROM users WHERE id = $1 AND email = 'a@b.com' LIMIT 10"
+    second = "SELECT *   FROM users WHERE id = $7 AND email = 'x@y.org' LIMIT 50"
+
+    assert normalize_sql(first) == "SELECT * FROM users WHERE id = ? AND email = ? LIMIT ?"
+    assert fingerprint(first) == fingerprint(second)
+
+
+def test_normalize_sql_collapses_in_lists():
+    assert normalize_sql("SELECT 1 WHERE id IN (?, ?, ?)") == (
+        "SELECT ? WHERE id IN (?...)"
+    )
+
+
+async def test_statements_outside_requests_are_ignored(engine):
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    assert get_request_stats() is None
+
+
+async def test_track_queries_counts_statements(engine):
+    with track_queries() as stats:
+        async with engine.connect() as conn:
+            for value in range(3):
+                await conn.execute(text(f"SELECT {value}"))
+            await conn.execute(text("SELECT 'other'"))
+
+    assert stats.query_count == 4
+    assert stats.db_time_ms > 0
+    assert stats.shapes["SELECT ?"] == 4
+    assert stats.repeated_shapes(threshold=3)[0]["count"] == 4
+    assert stats.repeated_shapes(threshold=4) == []
+
+
+async def test_failed_statements_leave_no_timing_state(engine):
+    """A statement that errors never reaches after_cursor_execute."""
+    with track_queries() as stats:
+        async with engine.connect() as conn:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    await conn.execute(text("SELECT * FROM missing_table"))
+            await conn.execute(text("SELECT 1"))
+            leftovers = dict(conn.sync_connection.info)
+
+    assert stats.query_count == 1
+    assert leftovers == {}
+
+
+async def test_middleware_reports_server_timing_and_n_plus_one(engine):
+    """The middleware exposes per-request stats and records route aggregates."""
+    route_stats.reset()
+    api = FastAPI()
+    api.add_middleware(QueryStatsMiddleware, n_plus_one_threshold=2)
+
+    @api.get("/items/{count}")
+    async def items(count: int):
+        async with engine.connect() as conn:
+            for item_id in range(count):
+                await conn.execute(
+                    text("SELECT :id AS id"), {"id": item_id}
+                )
+        return {"ok": True}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=api), base_url="http://testserver"
+    ) as client:
+        response = await client.get("/items/5")
+        await client.get("/items/1")
+
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+    assert 'desc="5 queries"' in response.headers["Server-Timing"]
+
+    [row] = route_stats.worst(sort_by="max_queries")
+    assert row["route"] == "GET /items/{count}"
+    assert row["requests"] == 2
+    assert row["max_queries"] == 5
+    assert row["avg_queries"] == 3
+    assert row["n_plus_one_requests"] == 1
+    assert row["last_repeated"][0]["count"] == 5
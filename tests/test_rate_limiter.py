@@ -0,0 +1,188 @@
+"""
+Tests for adaptive per-provider rate limiting.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from aiohttp import web
+
+from app.core import rate_limiter
+from app.core.rate_limiter import AdaptiveRateLimiter, limiter_from_settings
+from app.services.notification_service import EmailProvider, NotificationService, PushProvider
+from app.services.smtp_pool import SMTPResponseError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+async def test_token_bucket_spaces_requests_after_the_burst():
+    limiter = AdaptiveRateLimiter("test", rate=200, burst=10)
+    started = time.perf_counter()
+    for _ in range(50):
+        async with limiter:
+            pass
+    elapsed = time.perf_counter() - started
+    # 10 from the bucket, then 40 at 200/s
+    assert 0.18 <= elapsed < 0.5
+    assert limiter.acquired == 50
+
+
+async def test_concurrency_cap_queues_work_instead_of_failing():
+    limiter = AdaptiveRateLimiter("test", concurrency=3)
+    peak = 0
+    peak_waiting = 0
+
+    async def call():
+        nonlocal peak, peak_waiting
+        async with limiter:
+            peak = max(peak, limiter.in_flight)
+            peak_waiting = max(peak_waiting, limiter.waiting)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(20)))
+    assert peak == 3
+    assert peak_waiting >= 10  # the rest queued behind the cap
+    assert limiter.snapshot()["in_flight"] == limiter.snapshot()["waiting"] == 0
+
+
+def test_throttling_cuts_multiplicatively_and_recovers_additively(clock):
+    limiter = AdaptiveRateLimiter("test", rate=100, decrease=0.5, recovery=0.1)
+    limiter.throttle()
+    limiter.throttle()  # same burst of rejections: one cut
+    assert limiter.rate == 50
+    assert limiter.throttled == 2
+
+    clock.now += 1.5
+    limiter.throttle()
+    assert limiter.rate == 25
+
+    clock.now += 2
+    limiter._refill()
+    assert limiter.rate == pytest.approx(45)  # +10/s
+    clock.now += 60
+    limiter._refill()
+    assert limiter.rate == 100
+
+
+def test_rate_never_drops_below_the_floor(clock):
+    limiter = AdaptiveRateLimiter("test", rate=100)
+    for _ in range(20):
+        limiter.throttle()
+        clock.now += 1
+    assert limiter.rate == 1
+
+
+def test_limits_come_from_settings():
+    settings = SimpleNamespace(
+        notification_provider_limits={"fcm": {"rate": 5, "concurrency": 2}},
+        notification_rate_decrease=0.7,
+    )
+    fcm = limiter_from_settings("fcm", settings)
+    assert (fcm.max_rate, fcm.burst, fcm.concurrency, fcm.decrease) == (5, 5, 2, 0.7)
+    assert limiter_from_settings("apns", settings).max_rate == 0  # unlimited
+
+
+async def test_fcm_429_lowers_the_push_rate():
+    responses = iter([429, 200])
+
+    async def send(request):
+        body = await request.json()
+        status = next(responses)
+        if status == 429:
+            return web.json_response({}, status=429)
+        return web.json_response({"results": [{"message_id": "1"} for _ in body["registration_ids"]]})
+
+    app = web.Application()
+    app.router.add_post("/fcm/send", send)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    provider = PushProvider(SimpleNamespace(
+        fcm_server_key="test-key",
+        fcm_url=f"http://127.0.0.1:{port}/fcm/send",
+        notification_provider_limits={"fcm": {"rate": 40, "concurrency": 4}},
+    ))
+    try:
+        throttled = await provider.send_push_batch("android", ["a", "b"], "Hi", "Body")
+        sent = await provider.send_push_batch("android", ["a", "b"], "Hi", "Body")
+    finally:
+        await provider.close()
+        await runner.cleanup()
+
+    assert throttled == {"a": "FCM returned HTTP 429", "b": "FCM returned HTTP 429"}
+    assert sent == {"a": None, "b": None}
+    assert provider.limiters["fcm"].throttled == 1
+    assert provider.limiters["fcm"].rate < 40
+
+
+async def test_smtp_421_lowers_the_email_rate():
+    provider = EmailProvider(SimpleNamespace(
+        notification_provider_limits={"smtp": {"rate": 10, "concurrency": 2}},
+    ))
+    provider.pool.send_message = AsyncMock(
+        side_effect=SMTPResponseError(421, "4.7.0 Try again later", "MAIL FROM")
+    )
+    assert not await provider.send_email("buyer@example.com", "Hi", "Body")
+    assert provider.limiter.throttled == 1
+    assert provider.limiter.rate == 5
+
+
+def test_service_reports_every_provider():
+    assert set(NotificationService().delivery_limits()) == {"smtp", "fcm", "apns", "web_push"}
+
+
+async def test_fan_out_benchmark():
+    """A 500-message fan-out against a relay that accepts 4 at a time."""
+    accepted = 0
+    in_flight = 0
+
+    async def relay():
+        nonlocal accepted, in_flight
+        in_flight += 1
+        try:
+            await asyncio.sleep(0.002)
+            if in_flight > 4:
+                raise SMTPResponseError(421, "Too many connections", "MAIL FROM")
+            accepted += 1
+        finally:
+            in_flight -= 1
+
+    async def fan_out(limiter):
+        nonlocal accepted
+        accepted = 0
+        started = time.perf_counter()
+
+        async def send():
+            try:
+                async with limiter:
+                    await relay()
+            except SMTPResponseError:
+                pass
+
+        await asyncio.gather(*(send() for _ in range(500)))
+        return accepted, time.perf_counter() - started
+
+    unbounded, _ = await fan_out(AdaptiveRateLimiter("none"))
+    bounded, elapsed = await fan_out(AdaptiveRateLimiter("smtp", concurrency=4))
+
+    print(f"\nFan-out of 500: unbounded accepted {unbounded}, bounded accepted {bounded} in {elapsed:.2f}s")
+    assert bounded == 500
+    assert unbounded < 500
@@ -0,0 +1,193 @@
+"""
+Tests for read-replica routing and read-your-writes pinning.
+
+Uses two SQLite files standing in for a primary and a replica; each holds a
+marker row so the tests can tell which database served a read.
+"""
+
+import asyncio
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+import strawberry
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from strawberry.fastapi import GraphQLRouter
+
+from app.core import database
+from app.core.config import Settings
+from app.core.database import (
+    close_db,
+    get_db,
+    get_read_db,
+    init_db,
+    pin_reads_to_primary,
+    read_from_primary,
+)
+from app.core.middleware import ReadYourWritesMiddleware
+from app.graphql.schema import ReadYourWritesExtension
+
+
+def make_database(path, name: str) -> str:
+    """Create a SQLite file whose ``marker`` table identifies it."""
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE marker (name TEXT)")
+        conn.execute("INSERT INTO marker VALUES (?)", (name,))
+    return f"sqlite+aiosqlite:///{path}"
+
+
+@pytest.fixture
+async def databases(tmp_path, monkeypatch):
+    """Initialize the app database layer with one primary and two replicas."""
+    settings = Settings(
+        database_url=make_database(tmp_path / "primary.db", "primary"),
+        database_replica_urls=[
+            make_database(tmp_path / "replica1.db", "replica1"),
+            make_database(tmp_path / "replica2.db", "replica2"),
+        ],
+    )
+    monkeypatch.setattr(database, "get_settings", lambda: settings)
+    await init_db()
+    yield settings
+    await close_db()
+
+
+async def which_database(session_source) -> str:
+    sessions = session_source()
+    session = await sessions.__anext__()
+    try:
+        return await session.scalar(text("SELECT name FROM marker"))
+    finally:
+        await sessions.aclose()
+
+
+async def test_writes_use_primary(databases):
+    assert await which_database(get_db) == "primary"
+
+
+async def test_reads_round_robin_across_replicas(databases):
+    served = [await which_database(get_read_db) for _ in range(4)]
+    assert sorted(served) == ["replica1", "replica1", "replica2", "replica2"]
+    assert served[0] != served[1]
+
+
+async def test_read_from_primary_block(databases):
+    with read_from_primary():
+        assert await which_database(get_read_db) == "primary"
+    assert await which_database(get_read_db) != "primary"
+
+
+async def test_reads_fall_back_to_primary_without_replicas(tmp_path, monkeypatch):
+    settings = Settings(
+        database_url=make_database(tmp_path / "only.db", "primary"),
+        database_replica_urls=[],
+    )
+    monkeypatch.setattr(database, "get_settings", lambda: settings)
+    await init_db()
+    try:
+        assert await which_database(get_read_db) == "primary"
+    finally:
+        await close_db()
+
+
+async def test_middleware_pins_reads_after_write(databases):
+    """A client that just wrote reads from the primary until the pin expires."""
+    api = FastAPI()
+    api.add_middleware(ReadYourWritesMiddleware, window_seconds=30)
+
+    @api.post("/write")
+    async def write(db: AsyncSession = Depends(get_db)):
+        return {"ok": True}
+
+    @api.get("/read")
+    async def read(db: AsyncSession = Depends(get_read_db)):
+        return {"served_by": await db.scalar(text("SELECT name FROM marker"))}
+
+    async with AsyncClient(
+        transport=ASGITransport(app=api), base_url="http://testserver"
+    ) as client:
+        before = await client.get("/read")
+        assert before.json()["served_by"].startswith("replica")
+
+        response = await client.post("/write")
+        pinned_until = response.headers[ReadYourWritesMiddleware.HEADER_NAME]
+
+        after = await client.get(
+            "/read", headers={ReadYourWritesMiddleware.HEADER_NAME: pinned_until}
+        )
+        assert after.json()["served_by"] == "primary"
+
+        expired = await client.get(
+            "/read", headers={ReadYourWritesMiddleware.HEADER_NAME: "0"}
+        )
+        assert expired.json()["served_by"].startswith("replica")
+
+        # A client cannot pin itself to the primary with its own expiry
+        forged = await client.get(
+            "/read", headers={ReadYourWritesMiddleware.HEADER_NAME: "1e12"}
+        )
+        assert forged.json()["served_by"].startswith("replica")
+        tampered = pinned_until.replace(pinned_until.split(":")[0], "1000000000000.000")
+        forged = await client.get(
+            "/read", headers={ReadYourWritesMiddleware.HEADER_NAME: tampered}
+        )
+        assert forged.json()["served_by"].startswith("replica")
+
+
+async def test_graphql_mutation_pins_reads_after_write(databases):
+    """/graphql is exempt by method, but a mutation still sets the pin."""
+
+    @strawberry.type
+    class Query:
+        @strawberry.field
+        async def served_by(self) -> str:
+            return await which_database(get_read_db)
+
+    @strawberry.type
+    class Mutation:
+        @strawberry.field
+        def touch(self) -> bool:
+            return True
+
+    schema = strawberry.Schema(query=Query, mutation=Mutation, extensions=[ReadYourWritesExtension])
+    api = FastAPI()
+    api.add_middleware(ReadYourWritesMiddleware, window_seconds=30)
+    api.include_router(GraphQLRouter(schema), prefix="/graphql")
+
+    async with AsyncClient(
+        transport=ASGITransport(app=api), base_url="http://testserver"
+    ) as client:
+        query = await client.post("/graphql", json={"query": "{ servedBy }"})
+        assert ReadYourWritesMiddleware.HEADER_NAME not in query.headers
+        assert query.json()["data"]["servedBy"].startswith("replica")
+
+        mutation = await client.post("/graphql", json={"query": "mutation { touch }"})
+        pinned_until = mutation.headers[ReadYourWritesMiddleware.HEADER_NAME]
+
+        after = await client.post(
+            "/graphql",
+            json={"query": "{ servedBy }"},
+            headers={ReadYourWritesMiddleware.HEADER_NAME: pinned_until},
+        )
+        assert after.json()["data"]["servedBy"] == "primary"
+
+
+def test_pin_expiry_is_clamped_to_one_window():
+    middleware = ReadYourWritesMiddleware(None, window_seconds=5, secret_key="s")
+    request = SimpleNamespace(
+        headers={ReadYourWritesMiddleware.HEADER_NAME: middleware._pin(1e12)}, cookies={}
+    )
+    assert middleware._pinned_until(request) <= time.time() + 5
+
+
+async def test_pin_reads_to_primary_is_task_local(databases):
+    async def pinned() -> str:
+        pin_reads_to_primary()
+        return await which_database(get_read_db)
+
+    assert await asyncio.create_task(pinned()) == "primary"
+    assert await which_database(get_read_db) != "primary"
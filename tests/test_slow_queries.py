@@ -0,0 +1,108 @@
+"""
+Tests for the slow-query log and EXPLAIN capture.
+"""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.query_stats import instrument_engine, track_queries
+from app.core.slow_queries import SlowQueryLog, parameter_shapes, slow_query_log
+
+
+@pytest.fixture
+def slow_log():
+    """Record every statement as slow, without EXPLAIN sampling."""
+    slow_query_log.clear()
+    slow_query_log.configure(
+        threshold_ms=0.000001, explain_sample_rate=0.0, max_entries=3
+    )
+    yield slow_query_log
+    slow_query_log.configure(
+        threshold_ms=500.0, explain_sample_rate=0.1, max_entries=200
+    )
+    slow_query_log.clear()
+
+
+def test_parameter_shapes_hide_values():
+    assert parameter_shapes({"email": "a@b.com", "id": 3}) == {
+        "email": "str",
+        "id": "int",
+    }
+    assert parameter_shapes(("x", 1.5)) == ["str", "float"]
+    assert parameter_shapes([(1,), (2,)]) == {"rows": 2, "row": ["int"]}
+    assert parameter_shapes(list(range(50))) == {"count": 50, "types": ["int"]}
+
+
+async def test_slow_statements_are_recorded_with_route(slow_log):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    instrument_engine(engine.sync_engine)
+    try:
+        with track_queries("GET", "/api/farmers/search/name/"):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT :name AS name"), {"name": "Green"})
+    finally:
+        await engine.dispose()
+
+    [entry] = [e for e in slow_log.entries() if e["sql"] == "SELECT ? AS name"]
+    assert entry["route"] == "GET /api/farmers/search/name/"
+    assert entry["parameters"] == ["str"]
+    assert entry["plan"] is None  # EXPLAIN is only captured on PostgreSQL
+
+
+def test_ring_buffer_is_bounded():
+    log = SlowQueryLog(threshold_ms=1, explain_sample_rate=0, max_entries=2)
+    engine = MagicMock()
+    engine.dialect.name = "sqlite"
+    for n in range(3):
+        log.record(engine, f"SELECT {n}", None, 5.0, f"SELECT {n}", str(n), None)
+
+    assert [e["sql"] for e in log.entries()] == ["SELECT 2", "SELECT 1"]
+
+
+def test_threshold_zero_disables_log():
+    log = SlowQueryLog(threshold_ms=0)
+    assert not log.is_slow(10_000)
+
+
+@pytest.mark.parametrize(
+    "statement,expected_options",
+    [
+        ("SELECT * FROM farmers WHERE farm_name ILIKE $1", "ANALYZE, BUFFERS"),
+        ("UPDATE notifications SET status = $1", "FORMAT JSON"),
+        (
+            "WITH due AS (UPDATE notifications SET status = $1 RETURNING id) SELECT id FROM due",
+            "FORMAT JSON",
+        ),
+        (
+            "SELECT notifications.id FROM notifications WHERE status = $1 "
+            "ORDER BY id LIMIT $2 FOR UPDATE SKIP LOCKED",
+            "FORMAT JSON",
+        ),
+        ("SELECT id FROM notification_digest_items FOR NO KEY UPDATE", "FORMAT JSON"),
+        ("SELECT * FROM farmers FOR SHARE", "FORMAT JSON"),
+        ("SELECT * INTO farmers_copy FROM farmers", "FORMAT JSON"),
+    ],
+)
+async def test_capture_plan_only_analyzes_reads(statement, expected_options):
+    """Writes and locking reads are planned but never executed by EXPLAIN ANALYZE."""
+    conn = AsyncMock()
+    result = MagicMock()
+    result.scalar.return_value = '[{"Plan": {"Node Type": "Seq Scan"}}]'
+    conn.exec_driver_sql.return_value = result
+    engine = MagicMock()
+    engine.connect.return_value.__aenter__.return_value = conn
+
+    log = SlowQueryLog()
+    log._explains_in_flight = 1
+    entry = {"plan": None}
+    await log._capture_plan(engine, statement, ("x",), entry)
+
+    explain = conn.exec_driver_sql.call_args.args[0]
+    assert explain.startswith(f"EXPLAIN ({expected_options}")
+    assert explain.endswith(statement)
+    assert ("ANALYZE" in explain) == (expected_options == "ANALYZE, BUFFERS")
+    assert entry["plan"][0]["Plan"]["Node Type"] == "Seq Scan"
+    assert log._explains_in_flight == 0
@@ -0,0 +1,298 @@
+"""
+Tests for the asyncio SMTP connection pool.
+
+A minimal in-process SMTP server stands in for the mail relay; it records
+connections, commands and the raw chunks it receives so tests can check
+connection reuse and command pipelining.
+"""
+
+import asyncio
+import base64
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.notification_service import EmailProvider
+from app.services.smtp_pool import SMTPConnectionPool, SMTPResponseError
+
+MESSAGE = b"Subject: Order shipped\r\n\r\nYour order is on its way.\r\n"
+
+
+class FakeSMTPServer:
+    """Just enough ESMTP for the client: EHLO, AUTH PLAIN, MAIL/RCPT/DATA, RSET, QUIT."""
+
+    def __init__(self, pipelining=True, handshake_delay=0.0):
+        self.pipelining = pipelining
+        self.handshake_delay = handshake_delay  # stands in for TCP + TLS + AUTH cost
+        self.data_delay = 0.0  # before the end-of-data reply
+        self.connections = 0
+        self.commands = []
+        self.chunks = []
+        self.messages = []
+        self._writers = []
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self.drop_all()
+        await self._server.wait_closed()
+
+    async def drop_all(self):
+        """Close every client connection, like a server-side idle timeout."""
+        for writer in self._writers:
+            writer.close()
+        self._writers = []
+        await asyncio.sleep(0.01)
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.append(writer)
+        await asyncio.sleep(self.handshake_delay)
+
+        def reply(*lines):
+            for line in lines:
+                writer.write(line.encode() + b"\r\n")
+
+        reply("220 fake ESMTP ready")
+        buffer, data, in_data, recipients = b"", b"", False, 0
+        try:
+            while chunk := await reader.read(65536):
+                self.chunks.append(chunk)
+                buffer += chunk
+                while b"\r\n" in buffer:
+                    line, buffer = buffer.split(b"\r\n", 1)
+                    if in_data:
+                        if line == b".":
+                            in_data = False
+                            await asyncio.sleep(self.data_delay)
+                            if b"REJECT" in data:
+                                reply("554 message refused")
+                            else:
+                                self.messages.append(data)
+                                reply("250 queued")
+                            data = b""
+                        else:
+                            data += (line[1:] if line.startswith(b"..") else line) + b"\r\n"
+                        continue
+
+                    command = line.decode()
+                    self.commands.append(command)
+                    verb = command.split(" ")[0].upper()
+                    if verb == "EHLO":
+                        extensions = ["250-fake", "250-AUTH PLAIN LOGIN"]
+                        if self.pipelining:
+                            extensions.append("250-PIPELINING")
+                        reply(*extensions, "250 8BITMIME")
+                    elif verb == "AUTH":
+                        token = command.split(" ")[2]
+                        ok = base64.b64decode(token) == b"\0mailer\0secret"
+                        await asyncio.sleep(self.handshake_delay)
+                        reply("235 ok" if ok else "535 bad credentials")
+                    elif verb == "MAIL":
+                        recipients = 0
+                        reply("250 sender ok")
+                    elif verb == "RCPT":
+                        rejected = "reject" in command
+                        recipients += not rejected
+                        reply("550 no such user" if rejected else "250 rcpt ok")
+                    elif verb == "DATA":
+                        if recipients:
+                            reply("354 go ahead")
+                            in_data = True
+                        else:
+                            reply("554 no valid recipients")
+                    elif verb in ("RSET", "NOOP"):
+                        reply("250 ok")
+                    elif verb == "QUIT":
+                        reply("221 bye")
+                        break
+                    else:
+                        reply("502 not implemented")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def make_pool(server, **options):
+    options.setdefault("max_size", 1)
+    return SMTPConnectionPool(
+        host="127.0.0.1",
+        port=server.port,
+        username="mailer",
+        password="secret",
+        starttls=False,
+        timeout=5,
+        **options,
+    )
+
+
+async def test_connection_is_reused_across_messages():
+    async with FakeSMTPServer() as server:
+        pool = make_pool(server)
+        for n in range(20):
+            await pool.send_message("noreply@example.com", [f"buyer{n}@example.com"], MESSAGE)
+        await pool.close()
+
+    assert server.connections == 1
+    assert len(server.messages) == 20
+    assert sum(c.startswith("AUTH") for c in server.commands) == 1
+    assert server.commands[-1] == "QUIT"
+
+
+async def test_concurrent_sends_are_bounded_by_pool_size():
+    async with FakeSMTPServer() as server:
+        pool = make_pool(server, max_size=3)
+        await asyncio.gather(*(
+            pool.send_message("noreply@example.com", [f"u{n}@example.com"], MESSAGE)
+            for n in range(30)
+        ))
+        await pool.close()
+
+    assert server.connections <= 3
+    assert len(server.messages) == 30
+
+
+@pytest.mark.parametrize("pipelining", [True, False])
+async def test_envelope_commands_are_pipelined_when_supported(pipelining):
+    async with FakeSMTPServer(pipelining=pipelining) as server:
+        pool = make_pool(server)
+        await pool.send_message("noreply@example.com", ["a@example.com", "b@example.com"], MESSAGE)
+        await pool.close()
+
+    batched = [c for c in server.chunks if b"MAIL FROM" in c]
+    assert (b"RCPT TO:<b@example.com>\r\nDATA\r\n" in batched[0]) == pipelining
+    assert server.messages == [MESSAGE]
+
+
+async def test_idle_connections_expire():
+    async with FakeSMTPServer() as server:
+        pool = make_pool(server, idle_timeout=0.05)
+        await pool.send_message("noreply@example.com", ["a@example.com"], MESSAGE)
+        await asyncio.sleep(0.1)
+        await pool.send_message("noreply@example.com", ["a@example.com"], MESSAGE)
+        await pool.close()
+
+    assert server.connections == 2
+
+
+async def test_reconnects_when_server_dropped_idle_connection():
+    async with FakeSMTPServer() as server:
+        pool = make_pool(server)
+        await pool.send_message("noreply@example.com", ["a@example.com"], MESSAGE)
+        await server.drop_all()
+        await pool.send_message("noreply@example.com", ["b@example.com"], MESSAGE)
+        await pool.close()
+
+    assert server.connections == 2
+    assert len(server.messages) == 2
+    assert pool.messages_sent == 2
+
+
+async def test_rejected_recipient_resets_and_keeps_connection():
+    async with FakeSMTPServer() as server:
+        pool = make_pool(server)
+        with pytest.raises(SMTPResponseError) as exc_info:
+            await pool.send_message("noreply@example.com", ["reject@example.com"], MESSAGE)
+        await pool.send_message("noreply@example.com", ["ok@example.com"], MESSAGE)
+        await pool.close()
+
+    assert exc_info.value.code == 550
+    assert "RSET" in server.commands
+    assert server.connections == 1
+    assert len(server.messages) == 1
+
+
+async def test_send_cancelled_mid_data_is_not_reused():
+    """A late end-of-data reply must not be read as the next message's reply."""
+    async with FakeSMTPServer() as server:
+        pool = make_pool(server)
+        server.data_delay = 0.2
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                pool.send_message("noreply@example.com", ["a@example.com"], MESSAGE), 0.05
+            )
+        server.data_delay = 0.0
+        await pool.send_message("noreply@example.com", ["b@example.com"], MESSAGE)
+        await pool.close()
+
+    assert server.connections == 2
+    assert pool.messages_sent == 1
+    assert [c for c in server.commands if c.startswith("RCPT")][-1] == "RCPT TO:<b@example.com>"
+
+
+async def test_rejected_message_data_closes_the_session():
+    async with FakeSMTPServer() as server:
+        pool = make_pool(server)
+        with pytest.raises(SMTPResponseError) as exc_info:
+            await pool.send_message("noreply@example.com", ["a@example.com"], b"REJECT\r\n")
+        assert pool.idle_connections == 0
+        await pool.send_message("noreply@example.com", ["b@example.com"], MESSAGE)
+        await pool.close()
+
+    assert exc_info.value.code == 554
+    assert server.connections == 2
+    assert server.messages == [MESSAGE]
+
+
+async def test_leading_dots_are_stuffed():
+    body = b"Subject: dots\n\n.hidden line\n..two dots\n"
+    async with FakeSMTPServer() as server:
+        pool = make_pool(server)
+        await pool.send_message("noreply@example.com", ["a@example.com"], body)
+        await pool.close()
+
+    assert server.messages == [b"Subject: dots\r\n\r\n.hidden line\r\n..two dots\r\n"]
+
+
+async def test_email_provider_sends_through_pool():
+    async with FakeSMTPServer() as server:
+        settings = SimpleNamespace(
+            smtp_server="127.0.0.1",
+            smtp_port=server.port,
+            smtp_username="mailer",
+            smtp_password="secret",
+            from_email="noreply@example.com",
+            smtp_starttls=False,
+        )
+        provider = EmailProvider(settings)
+        assert await provider.send_email("buyer@example.com", "Hi", "<p>Hello</p>")
+        assert await provider.send_email("buyer@example.com", "Again", "<p>Hello</p>")
+        await provider.close()
+
+    assert server.connections == 1
+    assert b"Subject: Again" in server.messages[1]
+
+
+async def test_pooled_throughput_benchmark():
+    """Pooled connections vs. a new authenticated connection per message."""
+    messages, concurrency = 200, 4
+
+    async def run(idle_timeout):
+        async with FakeSMTPServer(handshake_delay=0.002) as server:
+            pool = make_pool(server, max_size=concurrency, idle_timeout=idle_timeout)
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                pool.send_message("noreply@example.com", [f"u{n}@example.com"], MESSAGE)
+                for n in range(messages)
+            ))
+            elapsed = time.perf_counter() - started
+            await pool.close()
+        return messages / elapsed, server.connections
+
+    pooled_rate, pooled_connections = await run(idle_timeout=30)
+    fresh_rate, fresh_connections = await run(idle_timeout=0)
+    print(
+        f"\nSMTP: pooled {pooled_rate:.0f} msg/s over {pooled_connections} connections, "
+        f"per-message {fresh_rate:.0f} msg/s over {fresh_connections} connections"
+    )
+
+    assert pooled_connections <= concurrency
+    assert fresh_connections == messages
+    assert pooled_rate > fresh_rate
@@ -0,0 +1,158 @@
+"""
+Tests for the in-process notification template registry.
+"""
+
+import asyncio
+import importlib
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.core.query_stats import track_queries
+from app.models.shared.notification import (
+    NotificationCategory,
+    NotificationTemplate,
+    NotificationType,
+)
+from app.services import notification_templates
+from app.services.notification_service import NotificationService
+from app.services.template_registry import NotificationTemplateRegistry
+from tests.sqlite_support import sqlite_session_factory
+
+notification_service_module = importlib.import_module("app.services.notification_service")
+
+
+@pytest.fixture
+async def session_factory(tmp_path):
+    """A file-backed SQLite database shared by several sessions, like several workers."""
+    async for factory in sqlite_session_factory(
+        tmp_path, (NotificationTemplate.__table__,), instrument=True
+    ):
+        async with factory() as db:
+            db.add_all(
+                NotificationTemplate(
+                    name=t["name"],
+                    category=t["category"],
+                    notification_type=t["notification_type"],
+                    subject_template=t["subject_template"],
+                    body_template=t["body_template"],
+                )
+                for t in notification_templates.NotificationTemplates.get_default_templates()
+            )
+            db.add(NotificationTemplate(
+                name="retired",
+                category=NotificationCategory.MARKETING,
+                notification_type=NotificationType.EMAIL,
+                body_template="gone",
+                is_active=False,
+            ))
+            await db.commit()
+        yield factory
+
+
+@pytest.fixture
+async def registry(session_factory):
+    registry = NotificationTemplateRegistry()
+    await registry.start(session_factory, interval_seconds=0)
+    yield registry
+    await registry.stop()
+
+
+async def test_active_templates_are_indexed_by_name_and_category(registry):
+    defaults = notification_templates.NotificationTemplates.get_default_templates()
+    assert registry.get("new_order_buyer").category == NotificationCategory.ORDER
+    assert registry.get("retired") is None
+    assert {t.name for t in registry.by_category(NotificationCategory.ORDER)} == {
+        t["name"] for t in defaults if t["category"] == NotificationCategory.ORDER
+    }
+
+
+async def test_service_lookups_skip_the_database(registry, session_factory, monkeypatch):
+    monkeypatch.setattr(notification_service_module, "template_registry", registry)
+    service = NotificationService()
+    async with session_factory() as db:
+        with track_queries() as stats:
+            for _ in range(20):
+                template = await service._get_template(db, "new_order_buyer")
+    assert template.name == "new_order_buyer"
+    assert stats.query_count == 0
+
+
+async def test_changes_from_another_worker_are_picked_up(registry, session_factory):
+    with track_queries() as stats:
+        assert not await registry.refresh(force=False)
+    assert stats.query_count == 1  # just the version check
+
+    async with session_factory() as db:
+        await db.execute(
+            update(NotificationTemplate)
+            .where(NotificationTemplate.name == "retired")
+            # SQLite stamps whole seconds; PostgreSQL's now() has microseconds
+            .values(is_active=True, updated_at=datetime.utcnow() + timedelta(seconds=1))
+        )
+        await db.commit()
+
+    assert await registry.refresh(force=False)
+    assert registry.get("retired") is not None
+
+
+async def test_poll_reloads_in_the_background(session_factory):
+    registry = NotificationTemplateRegistry()
+    await registry.start(session_factory, interval_seconds=0.02)
+    try:
+        async with session_factory() as db:
+            db.add(NotificationTemplate(
+                name="flash_sale",
+                category=NotificationCategory.MARKETING,
+                notification_type=NotificationType.PUSH,
+                body_template="{{ discount }}% off",
+            ))
+            await db.commit()
+        for _ in range(50):
+            if registry.get("flash_sale"):
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await registry.stop()
+
+    assert registry.get("flash_sale").body_template == "{{ discount }}% off"
+
+
+def test_category_helpers_use_a_precomputed_index(monkeypatch):
+    expected = [
+        t["name"] for t in notification_templates.NotificationTemplates.get_default_templates()
+        if t["category"] == NotificationCategory.ORDER
+    ]
+    notification_templates.get_order_templates()  # build the index
+    calls = []
+    monkeypatch.setattr(
+        notification_templates.NotificationTemplates,
+        "get_default_templates",
+        staticmethod(lambda: calls.append(1) or []),
+    )
+
+    assert [t["name"] for t in notification_templates.get_order_templates()] == expected
+    assert notification_templates.get_system_templates()
+    assert calls == []
+
+
+async def test_lookup_throughput_benchmark(registry, session_factory, monkeypatch):
+    """Registry lookups vs. one SELECT per notification."""
+    lookups = 500
+    service = NotificationService()
+    async with session_factory() as db:
+        started = time.perf_counter()
+        for _ in range(lookups):
+            await service._get_template(db, "new_order_buyer")
+        per_query = lookups / (time.perf_counter() - started)
+
+        monkeypatch.setattr(notification_service_module, "template_registry", registry)
+        started = time.perf_counter()
+        for _ in range(lookups):
+            await service._get_template(db, "new_order_buyer")
+        in_memory = lookups / (time.perf_counter() - started)
+
+    print(f"\nTemplate lookups: SELECT {per_query:.0f}/s, registry {in_memory:.0f}/s")
+    assert in_memory > per_query
@@ -0,0 +1,134 @@
+"""
+Tests for the compiled notification template cache.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from jinja2 import Template
+
+from app.models.shared.notification import (
+    NotificationCategory,
+    NotificationTemplate,
+    NotificationType,
+)
+from app.services.notification_templates import NotificationTemplates
+from app.services.template_renderer import TemplateRenderer
+
+UPDATED = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def make_template(template_id=1, updated_at=UPDATED, **fields):
+    fields.setdefault("subject_template", "Order #{{ order_id }} confirmed")
+    fields.setdefault("body_template", "Hi {{ name }}, order #{{ order_id }} totals ${{ total }}.")
+    return NotificationTemplate(
+        id=template_id,
+        updated_at=updated_at,
+        name=f"template_{template_id}",
+        category=NotificationCategory.ORDER,
+        notification_type=NotificationType.EMAIL,
+        **fields,
+    )
+
+
+def count_compiles(renderer):
+    calls = []
+    original = renderer.environment.compile
+
+    def compile(*args, **kwargs):
+        calls.append(args[1] if len(args) > 1 else kwargs.get("name"))
+        return original(*args, **kwargs)
+
+    renderer.environment.compile = compile
+    return calls
+
+
+DATA = {"order_id": 42, "name": "Ana", "total": "19.90"}
+
+
+def test_templates_compile_once_per_version():
+    renderer = TemplateRenderer()
+    compiles = count_compiles(renderer)
+    template = make_template()
+
+    for _ in range(5):
+        assert renderer.render(template, DATA) == (
+            "Order #42 confirmed",
+            "Hi Ana, order #42 totals $19.90.",
+        )
+
+    assert len(compiles) == 2  # subject and body
+
+
+def test_new_version_recompiles_and_replaces_old_one():
+    renderer = TemplateRenderer()
+    compiles = count_compiles(renderer)
+    renderer.render(make_template(), DATA)
+
+    edited = make_template(
+        updated_at=UPDATED + timedelta(seconds=1), body_template="Order {{ order_id }} is in."
+    )
+    assert renderer.render(edited, DATA)[1] == "Order 42 is in."
+
+    assert len(compiles) == 4
+    assert len(renderer.environment.cache) == 2
+    assert all(UPDATED.isoformat() not in name for name in renderer._loader.sources)
+
+
+def test_invalidate_forgets_compiled_template():
+    renderer = TemplateRenderer()
+    compiles = count_compiles(renderer)
+    renderer.render(make_template(), DATA)
+    renderer.render(make_template(template_id=2), DATA)
+
+    renderer.invalidate(1)
+    assert len(renderer.environment.cache) == 2
+    renderer.render(make_template(), DATA)
+
+    assert len(compiles) == 6
+
+
+def test_missing_subject_renders_empty():
+    renderer = TemplateRenderer()
+    assert renderer.render(make_template(subject_template=None), DATA)[0] == ""
+
+
+def test_bytecode_cache_lets_new_workers_skip_compiling(tmp_path):
+    TemplateRenderer(bytecode_dir=str(tmp_path)).render(make_template(), DATA)
+
+    fresh_worker = TemplateRenderer(bytecode_dir=str(tmp_path))
+    compiles = count_compiles(fresh_worker)
+    assert fresh_worker.render(make_template(), DATA)[0] == "Order #42 confirmed"
+    assert compiles == []
+
+
+def test_render_throughput_benchmark():
+    """Cached compiled templates vs. building ``jinja2.Template`` per notification."""
+    templates = [
+        make_template(template_id=n, subject_template=t["subject_template"], body_template=t["body_template"])
+        for n, t in enumerate(NotificationTemplates.get_default_templates(), start=1)
+    ]
+    data = {
+        "order_id": 42, "customer_name": "Ana", "total_amount": "19.90", "farmer_name": "Luis",
+        "product_name": "Tomatoes", "tracking_number": "TRK1", "reset_link": "https://x",
+    }
+    renders = 3000
+
+    started = time.perf_counter()
+    for n in range(renders):
+        template = templates[n % len(templates)]
+        Template(template.subject_template or "").render(**data)
+        Template(template.body_template).render(**data)
+    uncached = renders / (time.perf_counter() - started)
+
+    renderer = TemplateRenderer()
+    started = time.perf_counter()
+    for n in range(renders):
+        renderer.render(templates[n % len(templates)], data)
+    cached = renders / (time.perf_counter() - started)
+
+    print(
+        f"\nNotification template renders: per-call compile {uncached:.0f}/s, "
+        f"cached {cached:.0f}/s ({cached / uncached:.0f}x)"
+    )
+    assert cached > uncached * 5
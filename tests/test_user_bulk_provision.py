@@ -0,0 +1,119 @@
+"""
+Tests for bulk user provisioning.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.users.user import User, UserType
+from app.schemas.user import UserBulkStatus, UserCreate
+from app.services.auth_service import AuthService
+from tests.sqlite_support import sqlite_session
+
+
+@pytest.fixture
+async def db_session():
+    """In-memory database with only the users table."""
+    async for session in sqlite_session([User.__table__]):
+        yield session
+
+
+@pytest.fixture
+def executor():
+    """Thread pool standing in for the process pool."""
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def make_user(n: int, email: str | None = None, username: str | None = None) -> UserCreate:
+    return UserCreate(
+        username=username or f"buyer{n}",
+        email=email or f"buyer{n}@example.com",
+        password="testpassword123",
+        user_type=UserType.BUYER,
+    )
+
+
+class TestBulkCreateUsers:
+    """Tests for AuthService.bulk_create_users."""
+
+    async def test_creates_all_users_in_batches(self, db_session, executor):
+        """All new users are inserted across several batches."""
+        service = AuthService()
+        users = [make_user(n) for n in range(5)]
+
+        results = await service.bulk_create_users(
+            db_session, users, batch_size=2, executor=executor
+        )
+
+        assert [r.index for r in results] == list(range(5))
+        assert all(r.status == UserBulkStatus.CREATED for r in results)
+        assert all(r.id is not None for r in results)
+        count = await db_session.scalar(select(func.count()).select_from(User))
+        assert count == 5
+
+    async def test_existing_email_reported_as_duplicate(self, db_session, executor):
+        """Rows hitting the unique email index are reported, not raised."""
+        service = AuthService()
+        await service.bulk_create_users(
+            db_session, [make_user(0)], executor=executor
+        )
+
+        results = await service.bulk_create_users(
+            db_session, [make_user(1, "buyer0@example.com"), make_user(2)],
+            executor=executor,
+        )
+
+        assert results[0].status == UserBulkStatus.DUPLICATE
+        assert results[0].id is None
+        assert results[1].status == UserBulkStatus.CREATED
+
+    async def test_repeated_email_in_payload(self, db_session, executor):
+        """Only the first occurrence of an email in the payload is inserted."""
+        service = AuthService()
+        users = [make_user(0), make_user(1, "buyer0@example.com")]
+
+        results = await service.bulk_create_users(
+            db_session, users, executor=executor
+        )
+
+        assert results[0].status == UserBulkStatus.CREATED
+        assert results[1].status == UserBulkStatus.DUPLICATE
+        assert results[1].detail == "Email repeated in request"
+
+    async def test_username_conflicts_skip_only_their_rows(self, db_session, executor):
+        """Repeated or existing usernames do not fail the rest of the batch."""
+        service = AuthService()
+        await service.bulk_create_users(db_session, [make_user(0)], executor=executor)
+
+        users = [
+            make_user(1, username="buyer0"),  # existing username
+            make_user(2),
+            make_user(3, username="buyer2"),  # repeated in the payload
+            make_user(4),
+        ]
+        results = await service.bulk_create_users(
+            db_session, users, batch_size=10, executor=executor
+        )
+
+        assert [r.status for r in results] == [
+            UserBulkStatus.DUPLICATE,
+            UserBulkStatus.CREATED,
+            UserBulkStatus.DUPLICATE,
+            UserBulkStatus.CREATED,
+        ]
+        assert results[0].detail == "Username already taken"
+        assert results[2].detail == "Username repeated in request"
+        count = await db_session.scalar(select(func.count()).select_from(User))
+        assert count == 3
+
+    async def test_passwords_are_hashed(self, db_session, executor):
+        """Stored hashes verify against the original password."""
+        service = AuthService()
+        await service.bulk_create_users(db_session, [make_user(0)], executor=executor)
+
+        user = await db_session.scalar(select(User))
+        assert user.password_hash != "testpassword123"
+        assert service.verify_password("testpassword123", user.password_hash)
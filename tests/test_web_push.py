@@ -0,0 +1,278 @@
+"""
+Tests for web push delivery.
+
+Encryption is checked against the RFC 8291 worked example and by
+decrypting what the client sends to a local aiohttp push service
+stand-in, the way a browser would.
+"""
+
+import importlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from aiohttp import web
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from jose import jwt
+
+from fastapi import HTTPException
+
+from app.services import web_push
+from app.services.notification_service import NotificationService, PushProvider
+from app.services.web_push import (
+    VAPIDSigner,
+    WebPushClient,
+    b64url_decode,
+    b64url_encode,
+    check_endpoint,
+    encrypt_payload,
+)
+
+notification_service_module = importlib.import_module("app.services.notification_service")
+
+VAPID_KEY = b64url_encode(
+    ec.generate_private_key(ec.SECP256R1()).private_numbers().private_value.to_bytes(32, "big")
+)
+
+
+def make_subscription(endpoint):
+    """A browser-side key pair and the device token it would register."""
+    ua_key = ec.generate_private_key(ec.SECP256R1())
+    auth = os.urandom(16)
+    p256dh = ua_key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    token = json.dumps({
+        "endpoint": endpoint,
+        "keys": {"p256dh": b64url_encode(p256dh), "auth": b64url_encode(auth)},
+    })
+    return token, ua_key, auth
+
+
+def decrypt(body, ua_key, auth):
+    """Receiver side of RFC 8291."""
+    salt, record_size, key_length = body[:16], body[16:20], body[20]
+    as_public = body[21:21 + key_length]
+    ciphertext = body[21 + key_length:]
+    assert int.from_bytes(record_size, "big") == 4096
+    ua_public = ua_key.public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    shared = ua_key.exchange(
+        ec.ECDH(), ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), as_public)
+    )
+    ikm = web_push._hkdf(auth, b"WebPush: info\x00" + ua_public + as_public, 32, shared)
+    cek = web_push._hkdf(salt, b"Content-Encoding: aes128gcm\x00", 16, ikm)
+    nonce = web_push._hkdf(salt, b"Content-Encoding: nonce\x00", 12, ikm)
+    plaintext = AESGCM(cek).decrypt(nonce, ciphertext, None)
+    assert plaintext.endswith(b"\x02")
+    return plaintext[:-1]
+
+
+def test_encryption_matches_rfc8291_example():
+    """Section 5 of RFC 8291, with its fixed sender key and salt."""
+    as_private = ec.derive_private_key(
+        int.from_bytes(b64url_decode("yfWPiYE-n46HLnH0KqZOF1fJJU3MYrct3AELtAQ-oRw"), "big"),
+        ec.SECP256R1(),
+    )
+    with mock.patch.object(web_push.ec, "generate_private_key", lambda curve: as_private):
+        body = encrypt_payload(
+            b"When I grow up, I want to be a watermelon",
+            "BCVxsr7N_eNgVRqvHtD0zTZsEc6-VV-JvLexhqUzORcxaOzi6-AYWXvTBHm4bjyPjs7Vd8pZGH6SRpkNtoIAiw4",
+            "BTBZMqHH6r4Tts7J_aSIgg",
+            salt=b64url_decode("DGv6ra1nlYgDCS1FRnbzlw"),
+        )
+
+    assert b64url_encode(body) == (
+        "DGv6ra1nlYgDCS1FRnbzlwAAEABBBP4z9KsN6nGRTbVYI_c7VJSPQTBtkgcy27mlmlMoZIIgDll6e3vC"
+        "YLocInmYWAmS6TlzAC8wEqKK6PBru3jl7A_yl95bQpu6cVPTpK4Mqgkf1CXztLVBSt2Ks3oZwbuwXPXL"
+        "WyouBWLVWGNWQexSgSxsj_Qulcy4a-fN"
+    )
+
+
+def test_vapid_token_is_cached_per_origin():
+    signer = VAPIDSigner(VAPID_KEY, "mailto:ops@example.com")
+    first = signer.header("https://fcm.googleapis.com/fcm/send/abc")
+    assert signer.header("https://fcm.googleapis.com/fcm/send/def") == first
+    other = signer.header("https://updates.push.services.mozilla.com/wpush/v2/xyz")
+    assert other != first
+    assert signer.signed == 2
+
+    token = first.split("t=")[1].split(",")[0]
+    claims = jwt.get_unverified_claims(token)
+    assert claims["aud"] == "https://fcm.googleapis.com"
+    assert claims["sub"] == "mailto:ops@example.com"
+
+
+def test_vapid_token_is_renewed_before_expiry(monkeypatch):
+    signer = VAPIDSigner(VAPID_KEY, "mailto:ops@example.com", token_ttl=1000)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    first = signer.header("https://push.example.com/a")
+    monkeypatch.setattr(time, "time", lambda: now + 899)
+    assert signer.header("https://push.example.com/a") == first
+    monkeypatch.setattr(time, "time", lambda: now + 901)
+    assert signer.header("https://push.example.com/a") != first
+
+
+@pytest.fixture
+async def push_service():
+    """Local push service; ``/gone/...`` endpoints report an expired subscription."""
+    state = {"received": [], "url": None}
+
+    async def receive(request):
+        if request.path.startswith("/gone"):
+            return web.Response(status=410)
+        state["received"].append((request.headers.copy(), await request.read()))
+        return web.Response(status=201)
+
+    app = web.Application()
+    app.router.add_post("/{tail:.*}", receive)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    state["url"] = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    yield state
+    await runner.cleanup()
+
+
+@pytest.mark.parametrize("endpoint", [
+    "https://fcm.googleapis.com/fcm/send/abc",
+    "https://wns2-par02p.notify.windows.com/w/?token=abc",
+    "https://web.push.apple.com/QGk",
+])
+def test_push_service_endpoints_are_accepted(endpoint):
+    check_endpoint(endpoint)
+
+
+@pytest.mark.parametrize("endpoint", [
+    "http://fcm.googleapis.com/fcm/send/abc",  # not https
+    "https://127.0.0.1:8000/internal/db/pool/reset",
+    "https://169.254.169.254/latest/meta-data/",
+    "https://[::1]/push",
+    "https://10.0.0.5/push",
+    "https://localhost/push",
+    "https://fcm.googleapis.com.evil.example/push",
+    "https://example.com/push",
+])
+def test_unsafe_endpoints_are_rejected(endpoint):
+    with pytest.raises(ValueError):
+        check_endpoint(endpoint)
+
+
+def test_private_addresses_are_rejected_without_an_allowlist():
+    check_endpoint("https://push.example.com/abc", allowed_hosts=[])
+    with pytest.raises(ValueError):
+        check_endpoint("https://192.168.1.1/abc", allowed_hosts=[])
+
+
+async def test_registration_rejects_an_unsafe_endpoint():
+    token, _, _ = make_subscription("https://169.254.169.254/latest/meta-data/")
+    db = mock.AsyncMock()
+    with pytest.raises(HTTPException) as error:
+        await NotificationService().register_device_token(db, None, token, "web")
+    assert error.value.status_code == 400
+    db.add.assert_not_called()
+
+
+async def test_delivery_skips_an_unsafe_endpoint(push_service):
+    """Subscriptions stored before validation existed are not posted to."""
+    token, _, _ = make_subscription(f"{push_service['url']}/push/1")
+    provider = PushProvider(SimpleNamespace(vapid_private_key=VAPID_KEY))
+    try:
+        results = await provider.send_push_batch("web", [token], "Order shipped", "On its way")
+    finally:
+        await provider.close()
+    assert results == {token: "InvalidSubscription"}
+    assert push_service["received"] == []
+
+
+async def test_push_provider_encrypts_and_posts_per_subscription(push_service, monkeypatch):
+    # The local stand-in push service is plain http on loopback
+    monkeypatch.setattr(notification_service_module, "check_endpoint", lambda endpoint, hosts: None)
+    live, ua_key, auth = make_subscription(f"{push_service['url']}/push/1")
+    gone, _, _ = make_subscription(f"{push_service['url']}/gone/2")
+    provider = PushProvider(SimpleNamespace(vapid_private_key=VAPID_KEY))
+    try:
+        results = await provider.send_push_batch(
+            "web", [live, gone, "not-a-subscription"], "Order shipped", "On its way", {"order_id": 7}
+        )
+    finally:
+        await provider.close()
+
+    assert results == {
+        live: None,
+        gone: "SubscriptionGone",
+        "not-a-subscription": "InvalidSubscription",
+    }
+    assert {"SubscriptionGone", "InvalidSubscription"} <= PushProvider.INVALID_TOKEN_ERRORS
+
+    headers, body = push_service["received"][0]
+    assert headers["Content-Encoding"] == "aes128gcm"
+    assert headers["Authorization"].startswith("vapid t=")
+    assert json.loads(decrypt(body, ua_key, auth)) == {
+        "title": "Order shipped",
+        "body": "On its way",
+        "data": {"order_id": 7},
+    }
+
+
+async def test_encryption_runs_off_the_event_loop():
+    client = WebPushClient(VAPID_KEY, "mailto:ops@example.com", workers=2)
+    threads = set()
+    original = web_push.encrypt_payload
+
+    def record_thread(*args):
+        threads.add(threading.get_ident())
+        return original(*args)
+
+    token, ua_key, auth = make_subscription("https://push.example.com/1")
+    subscription = web_push.WebPushSubscription.from_token(token)
+    with mock.patch.object(web_push, "encrypt_payload", record_thread):
+        body = await client.encrypt(subscription, b"hello")
+    client.close()
+
+    assert threading.get_ident() not in threads
+    assert decrypt(body, ua_key, auth) == b"hello"
+
+
+def test_encryption_throughput_benchmark():
+    """Encryptions per second on one core and across a pool."""
+    count, workers = 600, min(os.cpu_count() or 1, 4)
+    p256dh = b64url_encode(
+        ec.generate_private_key(ec.SECP256R1()).public_key().public_bytes(
+            serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+        )
+    )
+    auth = b64url_encode(os.urandom(16))
+    payload = json.dumps({"title": "Harvest sale", "body": "Fresh produce at half price"}).encode()
+    args = ([payload] * count, [p256dh] * count, [auth] * count)
+
+    started = time.perf_counter()
+    for _ in range(count):
+        encrypt_payload(payload, p256dh, auth)
+    single = count / (time.perf_counter() - started)
+
+    rates = {}
+    for name, pool_class in (("thread", ThreadPoolExecutor), ("process", ProcessPoolExecutor)):
+        with pool_class(workers) as pool:
+            list(pool.map(encrypt_payload, *[a[:workers] for a in args]))  # warm up workers
+            started = time.perf_counter()
+            list(pool.map(encrypt_payload, *args, chunksize=16) if name == "process"
+                 else pool.map(encrypt_payload, *args))
+            rates[name] = count / (time.perf_counter() - started)
+
+    print(
+        f"\nRFC 8291 encryption: {single:.0f}/s on one core; {workers} workers: "
+        f"threads {rates['thread']:.0f}/s ({rates['thread'] / workers:.0f}/s per core), "
+        f"processes {rates['process']:.0f}/s ({rates['process'] / workers:.0f}/s per core)"
+    )
+    assert single > 0 and all(rate > 0 for rate in rates.values())